@@ -0,0 +1,410 @@
+"""Load recorded port and flow stats replies into the RRD files.
+
+Replies captured in pcap files or saved with :func:`write_record` are
+replayed through the same ``listen`` methods as live replies, with their
+original timestamps. Files are parsed in parallel and the samples of each
+file are written with multi-sample rrdtool updates by writer processes that
+own a partition of the dpids.
+
+Give the files in chronological order because RRD only accepts samples newer
+than the last one of a file. Port summaries and rollups are about the current
+traffic and are not rebuilt.
+
+Usage: python -m napps.kytos.of_stats.backfill --help
+"""
+import os
+import struct
+import sys
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from pathlib import Path
+from types import SimpleNamespace
+
+from napps.kytos.of_stats import settings
+from napps.kytos.of_stats.catalog import Catalog
+from napps.kytos.of_stats.stats import RRD, FlowStats, PortStats, Stats
+from napps.kytos.of_stats.writers import WriterPool
+
+#: OpenFlow ports of the controller, used to find the connections in pcaps.
+CONTROLLER_PORTS = (6633, 6653)
+
+#: Header of a recorded message: timestamp in seconds and dpid as integer.
+#: The OpenFlow message follows it.
+RECORD_HEADER = struct.Struct('!dQ')
+
+#: OpenFlow header: version, type, length and xid.
+OF_HEADER = struct.Struct('!BBHI')
+
+#: OFPT_FEATURES_REPLY, which has the dpid, in OpenFlow 1.0 and 1.3.
+OFPT_FEATURES_REPLY = 6
+
+#: OFPT_STATS_REPLY (1.0) and OFPT_MULTIPART_REPLY (1.3) by version.
+STATS_REPLY_TYPES = {0x01: 17, 0x04: 19}
+
+#: Stats types (OFPST_FLOW and OFPST_PORT, the same in 1.0 and 1.3) and
+#: their classes.
+LISTENERS = {1: FlowStats, 4: PortStats}
+
+_PCAP_MAGICS = {b'\xa1\xb2\xc3\xd4': ('>', 1e-6),
+                b'\xd4\xc3\xb2\xa1': ('<', 1e-6),
+                b'\xa1\xb2\x3c\x4d': ('>', 1e-9),
+                b'\x4d\x3c\xb2\xa1': ('<', 1e-9)}
+_LINKTYPE_ETHERNET = 1
+_LINKTYPE_RAW = 101
+_LINKTYPE_LINUX_SLL = 113
+_TCP_FIN, _TCP_SYN, _TCP_RST = 0x01, 0x02, 0x04
+
+
+def write_record(stream, tstamp, dpid, message):
+    """Append an OpenFlow message to a file that can be backfilled.
+
+    Args:
+        stream: File opened for binary writing.
+        tstamp (float): Unix timestamp in seconds of the message arrival.
+        dpid (str): Switch dpid, e.g. '00:00:00:00:00:00:00:01'.
+        message (bytes): Packed OpenFlow message.
+    """
+    stream.write(RECORD_HEADER.pack(tstamp, int(dpid.replace(':', ''), 16)))
+    stream.write(message)
+
+
+def read_records(stream):
+    """Yield (timestamp, dpid, message bytes) from :func:`write_record`."""
+    while True:
+        header = stream.read(RECORD_HEADER.size + OF_HEADER.size)
+        if len(header) < RECORD_HEADER.size + OF_HEADER.size:
+            return
+        tstamp, dpid = RECORD_HEADER.unpack_from(header)
+        length = OF_HEADER.unpack_from(header, RECORD_HEADER.size)[2]
+        message = header[RECORD_HEADER.size:]
+        message += stream.read(length - OF_HEADER.size)
+        if len(message) < length:
+            return
+        yield tstamp, _format_dpid(dpid.to_bytes(8, 'big')), message
+
+
+def read_pcap(stream, controller_ports=CONTROLLER_PORTS):
+    """Yield (timestamp, dpid, message bytes) sent by switches in a pcap.
+
+    TCP segments are reassembled and the dpid is read from the features
+    reply, so only connections whose start was captured are used. The
+    timestamp is the one of the packet with the end of the message.
+
+    Args:
+        stream: pcap file opened for binary reading (not pcapng).
+        controller_ports (iterable): TCP ports of the controller.
+    """
+    header = stream.read(24)
+    if header[:4] not in _PCAP_MAGICS:
+        raise ValueError('Not a pcap file.')
+    endian, resolution = _PCAP_MAGICS[header[:4]]
+    linktype = struct.unpack(endian + 'I', header[20:24])[0]
+    record = struct.Struct(endian + 'IIII')
+    connections = {}
+    while True:
+        packet_header = stream.read(record.size)
+        if len(packet_header) < record.size:
+            return
+        seconds, fraction, length, _ = record.unpack(packet_header)
+        segment = _get_tcp_segment(stream.read(length), linktype)
+        if segment is None:
+            continue
+        src, sport, dst, dport, seq, flags, payload = segment
+        if dport not in controller_ports:
+            continue
+        tstamp = seconds + fraction * resolution
+        key = (src, sport, dst, dport)
+        if flags & _TCP_SYN:
+            connections[key] = _TcpStream(seq + 1)
+            continue
+        connection = connections.get(key)
+        if connection is None:
+            continue
+        connection.add(seq, payload)
+        for message in connection.pop_messages():
+            if message[1] == OFPT_FEATURES_REPLY:
+                connection.dpid = _format_dpid(message[8:16])
+            elif connection.dpid is not None:
+                yield tstamp, connection.dpid, message
+        if flags & (_TCP_FIN | _TCP_RST):
+            del connections[key]
+
+
+def read_file(path, controller_ports=CONTROLLER_PORTS):
+    """Yield recorded messages of a pcap or :func:`write_record` file."""
+    with open(path, 'rb') as stream:
+        is_pcap = stream.read(4) in _PCAP_MAGICS
+        stream.seek(0)
+        if is_pcap:
+            yield from read_pcap(stream, controller_ports)
+        else:
+            yield from read_records(stream)
+
+
+class _TcpStream:
+    """Bytes of one direction of a TCP connection, in order."""
+
+    def __init__(self, seq):
+        self.dpid = None
+        self._next_seq = seq
+        self._buffer = bytearray()
+        #: key is sequence number, value is payload
+        self._segments = {}
+
+    def add(self, seq, payload):
+        """Add a segment, possibly out of order or retransmitted."""
+        if payload:
+            self._segments[seq] = payload
+        while self._segments:
+            for seq, payload in list(self._segments.items()):
+                offset = (self._next_seq - seq) % 2 ** 32
+                if offset >= 2 ** 31:
+                    continue  # Future segment
+                del self._segments[seq]
+                if offset < len(payload):
+                    self._buffer.extend(payload[offset:])
+                    self._next_seq = (seq + len(payload)) % 2 ** 32
+                    break
+            else:
+                return
+
+    def pop_messages(self):
+        """Return complete OpenFlow messages and remove them."""
+        messages = []
+        while len(self._buffer) >= OF_HEADER.size:
+            length = OF_HEADER.unpack_from(self._buffer)[2]
+            if length < OF_HEADER.size:  # Not OpenFlow
+                self._buffer.clear()
+                self.dpid = None
+            elif len(self._buffer) >= length:
+                messages.append(bytes(self._buffer[:length]))
+                del self._buffer[:length]
+                continue
+            break
+        return messages
+
+
+def _get_tcp_segment(frame, linktype):
+    """Return (src, sport, dst, dport, seq, flags, payload) or None."""
+    if linktype == _LINKTYPE_ETHERNET:
+        ethertype, offset = struct.unpack_from('!H', frame, 12)[0], 14
+        while ethertype in (0x8100, 0x88a8):  # VLAN tags
+            ethertype = struct.unpack_from('!H', frame, offset + 2)[0]
+            offset += 4
+    elif linktype == _LINKTYPE_LINUX_SLL:
+        ethertype, offset = struct.unpack_from('!H', frame, 14)[0], 16
+    elif linktype == _LINKTYPE_RAW:
+        ethertype = {4: 0x0800, 6: 0x86dd}.get(frame[0] >> 4)
+        offset = 0
+    else:
+        raise ValueError('Unsupported pcap link type {}.'.format(linktype))
+
+    ip_header = frame[offset:]
+    if ethertype == 0x0800 and ip_header[9] == 6:
+        src, dst = ip_header[12:16], ip_header[16:20]
+        # Ethernet frames may have padding after the IP packet
+        end = offset + struct.unpack_from('!H', ip_header, 2)[0]
+        offset += (ip_header[0] & 0x0f) * 4
+    elif ethertype == 0x86dd and ip_header[6] == 6:
+        src, dst = ip_header[8:24], ip_header[24:40]
+        end = offset + 40 + struct.unpack_from('!H', ip_header, 4)[0]
+        offset += 40
+    else:
+        return None
+    sport, dport, seq = struct.unpack_from('!HHI', frame, offset)
+    data_offset, flags = frame[offset + 12] >> 4, frame[offset + 13]
+    payload = frame[offset + data_offset * 4:end]
+    return src, sport, dst, dport, seq, flags, payload
+
+
+def _format_dpid(dpid):
+    """Return the dpid string of 8 bytes, as in Kytos."""
+    return ':'.join('{:02x}'.format(byte) for byte in dpid)
+
+
+class OfflineSwitch:
+    """What ``listen`` methods use from a switch that is not connected."""
+
+    def __init__(self, dpid, version):
+        """Set dpid and OpenFlow version.
+
+        Args:
+            dpid (str): Switch dpid.
+            version (int): OpenFlow protocol version, e.g. 0x04.
+        """
+        self.id = self.dpid = dpid  # pylint: disable=invalid-name
+        self.connection = SimpleNamespace(
+            protocol=SimpleNamespace(version=version))
+
+    @staticmethod
+    def get_interface_by_port_no(port_no):  # pylint: disable=unused-argument
+        """There are no interfaces to update."""
+        return None
+
+    @staticmethod
+    def get_flow_by_id(flow_id):  # pylint: disable=unused-argument
+        """There are no flows to update."""
+        return None
+
+
+class SampleCollector:
+    """Keep RRD updates in memory instead of writing them.
+
+    It replaces :attr:`.RRD.writers` so ``listen`` methods run unchanged.
+    """
+
+    def __init__(self):
+        """Start without samples."""
+        #: key is (app, data sources, heartbeat, index), value is a list of
+        #: (timestamp, dict of data source values)
+        self.samples = {}
+
+    def submit(self, rrd, index, tstamp=None, **ds_values):
+        """Keep an update. Same arguments as :meth:`.WriterPool.submit`."""
+        key = (rrd.app, tuple(rrd.data_sources), rrd.timeout, tuple(index))
+        self.samples.setdefault(key, []).append((tstamp, ds_values))
+
+    @staticmethod
+    def write(samples, writers):
+        """Send :attr:`samples` to *writers*, with the RRD heartbeats.
+
+        Returns:
+            int: Number of samples.
+        """
+        n_samples = 0
+        for (app, data_sources, timeout, index), rows in samples.items():
+            writers.submit_many(RRD(app, data_sources, timeout), index, rows)
+            n_samples += len(rows)
+        return n_samples
+
+
+class CatalogCollector(Catalog):
+    """Keep catalog rows in memory instead of writing them.
+
+    Only the parent process writes the catalog file, with
+    :meth:`.Catalog.add_rows`.
+    """
+
+    def __init__(self):
+        """Start without rows."""
+        super().__init__()
+        self.new = []
+        self.touched = []
+
+    def _write(self, new, touched):
+        self.new.extend(new)
+        self.touched.extend(touched)
+
+
+def replay_file(path, controller_ports=CONTROLLER_PORTS):
+    """Replay the port and flow stats replies of a recorded file.
+
+    Samples and catalog rows are collected instead of written. The RRD
+    writers and catalog of the stats classes are replaced meanwhile.
+
+    Args:
+        path (str): pcap or :func:`write_record` file.
+        controller_ports (iterable): TCP ports of the controller in pcaps.
+
+    Returns:
+        tuple: :attr:`SampleCollector.samples` and the new and touched rows
+        of the catalog (see :meth:`.Catalog.add_rows`).
+    """
+    collector = SampleCollector()
+    catalog = CatalogCollector()
+    writers, previous_catalog = RRD.writers, Stats.catalog
+    RRD.writers, Stats.catalog = collector, catalog
+    try:
+        _replay(path, controller_ports)
+    finally:
+        RRD.writers, Stats.catalog = writers, previous_catalog
+    return collector.samples, (catalog.new, catalog.touched)
+
+
+def _replay(path, controller_ports):
+    """Call ``listen`` of the stats replies of a recorded file."""
+    from pyof.utils import unpack
+
+    switches = {}
+    #: key is (dpid, xid), value is (timestamp of the first part, stats)
+    replies = {}
+    for tstamp, dpid, message in read_file(path, controller_ports):
+        version, msg_type, _, xid = OF_HEADER.unpack_from(message)
+        if msg_type != STATS_REPLY_TYPES.get(version):
+            continue
+        stats_type, flags = struct.unpack_from('!HH', message, 8)
+        if stats_type not in LISTENERS:
+            continue
+        first_tstamp, stats = replies.pop((dpid, xid), (int(tstamp), []))
+        stats.extend(unpack(message).body)
+        if flags & 1:  # Reply more
+            replies[(dpid, xid)] = (first_tstamp, stats)
+            continue
+        switch = switches.get(dpid)
+        if switch is None:
+            switch = switches[dpid] = OfflineSwitch(dpid, version)
+        LISTENERS[stats_type].listen(switch, stats, first_tstamp,
+                                     live=False)
+
+
+def backfill(paths, jobs=None, controller_ports=CONTROLLER_PORTS):
+    """Parse files in parallel and write their samples.
+
+    Args:
+        paths (list): pcap or :func:`write_record` files in chronological
+            order.
+        jobs (int): Number of parsing and writing processes each. Defaults
+            to the number of CPUs.
+        controller_ports (iterable): TCP ports of the controller in pcaps.
+
+    Returns:
+        int: Number of samples.
+    """
+    writers = WriterPool(jobs or os.cpu_count())
+    writers.start()
+    # Written only by this process
+    catalog = Catalog()
+    n_samples = 0
+    try:
+        with ProcessPoolExecutor(jobs) as executor:
+            results = executor.map(replay_file, paths,
+                                   repeat(controller_ports))
+            # map keeps the file order and each dpid has one writer queue
+            for samples, catalog_rows in results:
+                n_samples += SampleCollector.write(samples, writers)
+                catalog.add_rows(*catalog_rows)
+    finally:
+        writers.stop()
+        catalog.close()
+    return n_samples
+
+
+def main():
+    """Parse command-line arguments and backfill files."""
+    parser = ArgumentParser(
+        prog='python -m napps.kytos.of_stats.backfill',
+        description='Load recorded port and flow stats replies (pcap or '
+                    'records) into RRD files.')
+    parser.add_argument('files', nargs='+',
+                        help='files in chronological order')
+    parser.add_argument('--dir', default=str(settings.DIR),
+                        help='RRD folder (default: %(default)s)')
+    parser.add_argument('--ports',
+                        default=','.join(map(str, CONTROLLER_PORTS)),
+                        help='comma-separated controller TCP ports in pcaps '
+                             '(default: %(default)s)')
+    parser.add_argument('--jobs', type=int,
+                        help='number of processes (default: number of CPUs)')
+    args = parser.parse_args()
+
+    settings.DIR = Path(args.dir)
+    ports = tuple(int(port) for port in args.ports.split(','))
+    n_samples = backfill(args.files, args.jobs, ports)
+    print('Loaded {} samples from {} files.'.format(n_samples,
+                                                    len(args.files)))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,5 @@
+"""Throughput benchmarks for the of_stats NApp.
+
+Run ``python -m napps.kytos.of_stats.benchmarks --help`` to list the
+available options.
+"""
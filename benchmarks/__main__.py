@@ -0,0 +1,73 @@
+"""Command-line interface for the benchmarks."""
+import logging
+import sys
+from argparse import ArgumentParser
+
+from napps.kytos.of_stats.benchmarks import baseline
+from napps.kytos.of_stats.benchmarks.bench import config_name, run
+
+
+def main():
+    """Run benchmarks, print the results and compare with the baseline.
+
+    Exit with status 1 if a regression is found or if there is no baseline
+    for the parameters, unless the comparison is skipped.
+    """
+    parser = ArgumentParser(
+        prog='python -m napps.kytos.of_stats.benchmarks',
+        description='Benchmark of_stats with synthetic switches.')
+    parser.add_argument('--switches', type=int, default=4)
+    parser.add_argument('--ports', type=int, default=48)
+    parser.add_argument('--flows', type=int, default=1000)
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--of-version', type=int, choices=(1, 4), default=1)
+    parser.add_argument('--baseline', default=str(baseline.BASELINE_FILE),
+                        help='JSON file with baselines (default: %(default)s)')
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='store these results as the new baseline')
+    parser.add_argument('--no-baseline', action='store_true',
+                        help='only print the results, without comparing '
+                             'them with the baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='accepted variation ratio (default: '
+                             '%(default)s)')
+    args = parser.parse_args()
+
+    # Avoid measuring the logging of every sample
+    logging.disable(logging.WARNING)
+    results = run(args.switches, args.ports, args.flows, args.rounds,
+                  args.of_version)
+    print_results(results)
+
+    config = config_name(args)
+    if args.save_baseline:
+        baseline.save(config, results, args.baseline)
+        print('Baseline saved for', config)
+        return 0
+    if args.no_baseline:
+        return 0
+    previous = baseline.load(args.baseline).get(config)
+    if previous is None:
+        print('No baseline for {}. Save one with --save-baseline or skip '
+              'the comparison with --no-baseline.'.format(config))
+        return 1
+    regressions = baseline.compare(results, previous, args.tolerance)
+    for regression in regressions:
+        print('REGRESSION', regression)
+    return 1 if regressions else 0
+
+
+def print_results(results):
+    """Print one line per scenario."""
+    line = '{:<20} {:>8} {:>14} {:>10} {:>10}'
+    print(line.format('scenario', 'calls', 'samples/s', 'p50 ms', 'p99 ms'))
+    for name, result in sorted(results['scenarios'].items()):
+        print(line.format(name, result['calls'],
+                          '{:.1f}'.format(result['samples_per_sec']),
+                          '{:.3f}'.format(result['p50_ms']),
+                          '{:.3f}'.format(result['p99_ms'])))
+    print('Peak RSS: {} KiB'.format(results['peak_rss_kb']))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
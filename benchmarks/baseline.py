@@ -0,0 +1,61 @@
+"""Keep benchmark results and detect regressions against them."""
+import json
+from pathlib import Path
+
+#: Default file for benchmark baselines.
+BASELINE_FILE = Path(__file__).resolve().parent / 'baseline.json'
+
+
+def load(path=BASELINE_FILE):
+    """Return all baselines or an empty dict if there is no file yet."""
+    path = Path(path)
+    if not path.exists():
+        return {}
+    with path.open() as baseline_file:
+        return json.load(baseline_file)
+
+
+def save(config, results, path=BASELINE_FILE):
+    """Store *results* as the baseline for *config*.
+
+    Baselines of other configurations are kept.
+    """
+    path = Path(path)
+    baselines = load(path)
+    baselines[config] = results
+    with path.open('w') as baseline_file:
+        json.dump(baselines, baseline_file, sort_keys=True, indent=4)
+
+
+def compare(results, baseline, tolerance):
+    """Return a list of regressions found in *results*.
+
+    Throughput may not be lower and latencies or memory may not be higher
+    than the baseline by more than *tolerance* (e.g. 0.2 for 20%).
+
+    Args:
+        results (dict): Output of :func:`~.bench.run`.
+        baseline (dict): Previous output of :func:`~.bench.run`.
+        tolerance (float): Accepted variation ratio.
+
+    Returns:
+        list: Human-readable regression messages. Empty if none.
+    """
+    regressions = []
+    for name, base in baseline.get('scenarios', {}).items():
+        current = results['scenarios'].get(name)
+        if current is None:
+            continue
+        if current['samples_per_sec'] < \
+                base['samples_per_sec'] * (1 - tolerance):
+            regressions.append('{}: {:.1f} samples/s, baseline {:.1f}'.format(
+                name, current['samples_per_sec'], base['samples_per_sec']))
+        for latency in ('p50_ms', 'p99_ms'):
+            if current[latency] > base[latency] * (1 + tolerance):
+                regressions.append('{}: {} {:.3f}, baseline {:.3f}'.format(
+                    name, latency, current[latency], base[latency]))
+    base_rss = baseline.get('peak_rss_kb')
+    if base_rss and results['peak_rss_kb'] > base_rss * (1 + tolerance):
+        regressions.append('peak RSS {} KiB, baseline {} KiB'.format(
+            results['peak_rss_kb'], base_rss))
+    return regressions
@@ -0,0 +1,153 @@
+"""Measure ingest and REST API throughput with synthetic switches.
+
+RRD files are written by the real rrdtool library to a temporary
+:data:`settings.DIR`, so the numbers include disk I/O.
+"""
+import resource
+import statistics
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from flask import Flask
+
+from napps.kytos.of_stats import settings
+from napps.kytos.of_stats.benchmarks import synthetic
+from napps.kytos.of_stats.main import Main
+from napps.kytos.of_stats.stats import FlowStats, PortStats
+from napps.kytos.of_stats.stats_api import FlowStatsAPI, PortStatsAPI
+
+
+class Scenario:
+    """Latencies and number of samples of one benchmarked operation."""
+
+    def __init__(self):
+        """Start without measurements."""
+        self.latencies = []
+        self.samples = 0
+
+    @contextmanager
+    def measure(self, n_samples):
+        """Time the block, which processes *n_samples* samples."""
+        start = time.perf_counter()
+        yield
+        self.latencies.append(time.perf_counter() - start)
+        self.samples += n_samples
+
+    def as_dict(self):
+        """Return throughput and latency percentiles."""
+        total = sum(self.latencies)
+        ordered = sorted(self.latencies)
+        p99_index = min(len(ordered) - 1, int(len(ordered) * 0.99))
+        return {
+            'calls': len(ordered),
+            'samples_per_sec': self.samples / total if total else 0.0,
+            'p50_ms': statistics.median(ordered) * 1000,
+            'p99_ms': ordered[p99_index] * 1000}
+
+
+def config_name(args):
+    """Return the key used to compare results with the same setup."""
+    return '{}sw-{}p-{}f-{}r-v{}'.format(args.switches, args.ports,
+                                         args.flows, args.rounds,
+                                         args.of_version)
+
+
+def run(n_switches, n_ports, n_flows, n_rounds, of_version=0x01):
+    """Run all scenarios against a temporary RRD folder.
+
+    Returns:
+        dict: ``scenarios`` with the result of each :class:`Scenario` and
+        ``peak_rss_kb`` with the peak resident memory of this process.
+    """
+    with TemporaryDirectory() as rrd_dir, \
+            patch.object(settings, 'DIR', Path(rrd_dir)):
+        switches = synthetic.create_switches(n_switches, n_ports, n_flows,
+                                             of_version)
+        controller = synthetic.SyntheticController(switches)
+        main = _create_main(controller)
+        scenarios = {}
+        _bench_ingest(main, switches, n_flows, n_rounds, scenarios)
+        _bench_api(switches, n_rounds, scenarios)
+        main.shutdown()
+    return {
+        'scenarios': {name: scenario.as_dict()
+                      for name, scenario in scenarios.items()},
+        'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}
+
+
+def _create_main(controller):
+    """Return a Main instance set up as Kytos would do, except the loop."""
+    main = Main.__new__(Main)
+    main.controller = controller
+    with patch.object(Main, 'execute_as_loop'):
+        main.setup()
+    return main
+
+
+def _bench_ingest(main, switches, n_flows, n_rounds, scenarios):
+    """Feed replies to Main._listen and to the stats classes directly."""
+    names = ('main_listen_ports', 'main_listen_flows', 'port_listen',
+             'flow_listen')
+    for name in names:
+        scenarios[name] = Scenario()
+    port_stats = PortStats(main.controller.buffers.msg_out)
+    flow_stats = FlowStats(main.controller.buffers.msg_out)
+    counter = 0
+    for _ in range(n_rounds):
+        for switch in switches:
+            counter += 1000
+            msg = synthetic.port_stats_reply(switch, counter)
+            with scenarios['main_listen_ports'].measure(len(msg.body)):
+                main._listen(_event(switch, msg), _stats_type(msg))
+            msg = synthetic.flow_stats_reply(switch, n_flows, counter)
+            with scenarios['main_listen_flows'].measure(len(msg.body)):
+                main._listen(_event(switch, msg), _stats_type(msg))
+
+            counter += 1000
+            msg = synthetic.port_stats_reply(switch, counter)
+            with scenarios['port_listen'].measure(len(msg.body)):
+                port_stats.listen(switch, msg.body)
+            msg = synthetic.flow_stats_reply(switch, n_flows, counter)
+            with scenarios['flow_listen'].measure(len(msg.body)):
+                flow_stats.listen(switch, msg.body)
+
+
+def _bench_api(switches, n_rounds, scenarios):
+    """Call the REST handlers inside a Flask request context."""
+    names = ('api_ports_list', 'api_port_stats', 'api_flow_list',
+             'api_flow_stats')
+    for name in names:
+        scenarios[name] = Scenario()
+    app = Flask(__name__)
+    for _ in range(n_rounds):
+        for switch in switches:
+            with app.test_request_context('/'):
+                with scenarios['api_ports_list'].measure(
+                        len(switch.interfaces)):
+                    PortStatsAPI.get_ports_list(switch.dpid)
+                port_no = min(switch.interfaces)
+                with scenarios['api_port_stats'].measure(1):
+                    PortStatsAPI.get_port_stats(switch.dpid, port_no)
+                with scenarios['api_flow_list'].measure(len(switch.flows)):
+                    FlowStatsAPI.get_flow_list(switch.dpid)
+                if switch.flows:
+                    with scenarios['api_flow_stats'].measure(1):
+                        FlowStatsAPI.get_flow_stats(switch.dpid,
+                                                    switch.flows[0].id)
+
+
+def _event(switch, msg):
+    """Return an object with the KytosEvent attributes used by Main."""
+    return SimpleNamespace(content={'message': msg},
+                           source=SimpleNamespace(switch=switch))
+
+
+def _stats_type(msg):
+    """Return v0x01 ``body_type`` or v0x04 ``multipart_type``."""
+    if hasattr(msg, 'body_type'):
+        return msg.body_type
+    return msg.multipart_type
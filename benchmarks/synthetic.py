@@ -0,0 +1,153 @@
+"""Synthetic switches and OpenFlow stats replies for benchmarking."""
+from types import SimpleNamespace
+
+from kytos.core.interface import Interface
+from kytos.core.switch import Switch
+from napps.kytos.of_core.flow import FlowFactory
+from pyof.foundation.basic_types import FixedTypeList
+from pyof.utils import unpack
+from pyof.v0x01.common.action import ActionOutput as ActionOutput01
+from pyof.v0x01.common.action import ListOfActions as ListOfActions01
+from pyof.v0x01.controller2switch import common as common01
+from pyof.v0x01.controller2switch.stats_reply import StatsReply
+from pyof.v0x01.controller2switch.stats_request import StatsType
+from pyof.v0x04.common.flow_match import Match as Match04
+from pyof.v0x04.controller2switch import multipart_reply as reply04
+from pyof.v0x04.controller2switch.common import MultipartType
+from pyof.v0x04.controller2switch.multipart_reply import MultipartReply
+
+
+class SyntheticController:
+    """Minimal controller exposing what of_stats uses."""
+
+    def __init__(self, switches):
+        """Index switches by dpid.
+
+        Args:
+            switches (iterable): :class:`~kytos.core.switch.Switch` objects.
+        """
+        self.switches = {switch.dpid: switch for switch in switches}
+        self.buffers = SimpleNamespace(msg_out=_DiscardBuffer())
+
+    def get_switch_by_dpid(self, dpid):
+        """Return a switch or None if not found."""
+        return self.switches.get(dpid)
+
+
+class _DiscardBuffer:
+    """Drop all stats requests and only count them."""
+
+    def __init__(self):
+        self.count = 0
+
+    def put(self, event):  # pylint: disable=unused-argument
+        """Discard *event*."""
+        self.count += 1
+
+
+def create_switches(n_switches, n_ports, n_flows, of_version=0x01):
+    """Create connected switches with interfaces and flows.
+
+    Args:
+        n_switches (int): Number of switches.
+        n_ports (int): Number of ports per switch.
+        n_flows (int): Number of flows per switch.
+        of_version (int): OpenFlow version (0x01 or 0x04).
+
+    Returns:
+        list: :class:`~kytos.core.switch.Switch` objects.
+    """
+    switches = []
+    for sw_number in range(1, n_switches + 1):
+        dpid = ':'.join('{:02x}'.format(byte)
+                        for byte in sw_number.to_bytes(8, 'big'))
+        switch = Switch(dpid)
+        switch.connection = SimpleNamespace(
+            protocol=SimpleNamespace(version=of_version),
+            switch=switch,
+            is_alive=lambda: True)
+        for port_no in range(1, n_ports + 1):
+            iface = Interface('eth{}'.format(port_no), port_no, switch,
+                              address='00:00:00:00:00:{:02x}'.format(
+                                  port_no % 256))
+            switch.update_interface(iface)
+        flow_class = FlowFactory.get_class(switch)
+        reply = flow_stats_reply(switch, n_flows, 0)
+        switch.flows = [flow_class.from_of_flow_stats(fs, switch)
+                        for fs in reply.body]
+        switches.append(switch)
+    return switches
+
+
+def port_stats_reply(switch, counter):
+    """Return an unpacked port stats reply with increasing counters.
+
+    The message is packed and unpacked so the body has the same types as the
+    ones received from a real switch.
+
+    Args:
+        switch (Switch): Switch whose interfaces are reported.
+        counter (int): Base value for all counters. Increase it between
+            rounds so rates are positive.
+    """
+    version = switch.connection.protocol.version
+    ports = sorted(switch.interfaces)
+    if version == 0x01:
+        body = [common01.PortStats(
+            port_no=port_no, rx_packets=counter, tx_packets=counter,
+            rx_bytes=counter * port_no, tx_bytes=counter * port_no,
+            rx_dropped=0, tx_dropped=0, rx_errors=0, tx_errors=0,
+            rx_frame_err=0, rx_over_err=0, rx_crc_err=0, collisions=0)
+                for port_no in ports]
+        msg = StatsReply(body_type=StatsType.OFPST_PORT, flags=0,
+                         body=FixedTypeList(common01.PortStats, body))
+    else:
+        body = [reply04.PortStats(
+            port_no=port_no, rx_packets=counter, tx_packets=counter,
+            rx_bytes=counter * port_no, tx_bytes=counter * port_no,
+            rx_dropped=0, tx_dropped=0, rx_errors=0, tx_errors=0,
+            rx_frame_err=0, rx_over_err=0, rx_crc_err=0, collisions=0,
+            duration_sec=0, duration_nsec=0)
+                for port_no in ports]
+        msg = MultipartReply(multipart_type=MultipartType.OFPMP_PORT_STATS,
+                             flags=0,
+                             body=FixedTypeList(reply04.PortStats, body))
+    return unpack(msg.pack())
+
+
+def flow_stats_reply(switch, n_flows, counter):
+    """Return an unpacked flow stats reply with increasing counters.
+
+    Args:
+        switch (Switch): Switch that "sent" the reply.
+        n_flows (int): Number of flows in the reply.
+        counter (int): Base value for all counters.
+    """
+    body = flow_stats_body(switch, n_flows, counter)
+    if switch.connection.protocol.version == 0x01:
+        msg = StatsReply(body_type=StatsType.OFPST_FLOW, flags=0,
+                         body=FixedTypeList(common01.FlowStats, body))
+    else:
+        msg = MultipartReply(multipart_type=MultipartType.OFPMP_FLOW,
+                             flags=0,
+                             body=FixedTypeList(reply04.FlowStats, body))
+    return unpack(msg.pack())
+
+
+def flow_stats_body(switch, n_flows, counter):
+    """Return packable pyof FlowStats, one for each synthetic flow.
+
+    Flows differ by cookie so they all have different ids.
+    """
+    if switch.connection.protocol.version == 0x01:
+        return [common01.FlowStats(
+            table_id=0, match=common01.Match(), duration_sec=0,
+            duration_nsec=0, priority=1000, idle_timeout=0, hard_timeout=0,
+            cookie=cookie, packet_count=counter, byte_count=counter * 64,
+            actions=ListOfActions01([ActionOutput01(port=cookie % 48 + 1)]))
+                for cookie in range(n_flows)]
+    return [reply04.FlowStats(
+        table_id=0, duration_sec=0, duration_nsec=0, priority=1000,
+        idle_timeout=0, hard_timeout=0, flags=0, cookie=cookie,
+        packet_count=counter, byte_count=counter * 64, match=Match04())
+            for cookie in range(n_flows)]
@@ -0,0 +1,286 @@
+"""On-disk catalog of all stored series.
+
+Series of disconnected switches or removed flows are not in the controller
+anymore, but their history is still in the RRD files. This catalog lists
+them without walking the RRD folder.
+"""
+import json
+import sqlite3
+import time
+from collections import OrderedDict
+from threading import Lock
+
+from kytos.core import log
+
+from napps.kytos.of_stats import settings
+from napps.kytos.of_stats.memory import evict_items, get_size
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS series (
+    dpid TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    series_id TEXT NOT NULL,
+    table_id INTEGER,
+    cookie INTEGER,
+    match TEXT,
+    first_seen INTEGER NOT NULL,
+    last_seen INTEGER NOT NULL,
+    PRIMARY KEY (dpid, kind, series_id)
+);
+CREATE INDEX IF NOT EXISTS series_kind_last_seen ON series (kind, last_seen);
+CREATE INDEX IF NOT EXISTS series_cookie ON series (cookie);
+'''
+
+#: SQLite integers are signed
+_INT64_OFFSET = 2 ** 64
+_INT64_MAX = 2 ** 63 - 1
+
+#: Columns returned by :meth:`Catalog.search`
+_COLUMNS = ('dpid', 'kind', 'series_id', 'table_id', 'cookie', 'match',
+            'first_seen', 'last_seen')
+
+
+class Catalog:
+    """SQLite catalog with dpid, id, first/last seen and flow metadata.
+
+    To avoid writing every sample, ``last_seen`` is updated at most every
+    :data:`settings.CATALOG_TOUCH_INTERVAL` seconds.
+    """
+
+    def __init__(self, path=None):
+        """Specify the database file, which is opened on first use.
+
+        Args:
+            path (Path): SQLite file. Defaults to ``catalog.sqlite`` in
+                :data:`settings.DIR`.
+        """
+        self._path = path
+        self._conn = None
+        self._lock = Lock()
+        #: key is (dpid, kind, series id), value is the last_seen written.
+        #: Series seen first come first.
+        self._touched = OrderedDict()
+        #: Rows of new series not written because the database was locked
+        #: (e.g. by another instance sharing :data:`settings.DIR`). Key is
+        #: (dpid, kind, series id).
+        self._unwritten_new = {}
+        #: key is (dpid, kind, series id), value is the last_seen not written
+        self._unwritten_touched = {}
+
+    def add_ports(self, dpid, port_numbers, tstamp=None):
+        """Add new port series and touch the existing ones.
+
+        Args:
+            dpid (str): Switch dpid.
+            port_numbers (iterable): Port numbers.
+            tstamp (int): Unix timestamp in seconds. Defaults to now.
+        """
+        self._add(dpid, 'port', ((port_no, None) for port_no in port_numbers),
+                  tstamp)
+
+    def add_flows(self, dpid, flows, tstamp=None):
+        """Add new flow series and touch the existing ones.
+
+        Args:
+            dpid (str): Switch dpid.
+            flows (iterable): Flows with ``id``, ``table_id``, ``cookie`` and
+                ``match`` attributes. The match, if any, is only read for new
+                flows.
+            tstamp (int): Unix timestamp in seconds. Defaults to now.
+        """
+        self._add(dpid, 'flow', ((flow.id, flow) for flow in flows), tstamp)
+
+    def _add(self, dpid, kind, items, tstamp):
+        if tstamp is None:
+            tstamp = int(time.time())
+        with self._lock:
+            new, touched = self._touch(dpid, kind, items, tstamp)
+            self._write_or_keep(new, touched)
+
+    def add_rows(self, new, touched):
+        """Write rows of new and touched series found by another catalog.
+
+        Args:
+            new (list): Rows of new series.
+            touched (list): (last seen, dpid, kind, series id) of existing
+                series.
+        """
+        with self._lock:
+            self._write(new, touched)
+
+    def _write(self, new, touched):
+        """Insert new series and update last_seen of touched ones.
+
+        It must be called with the lock.
+        """
+        conn = self._connect()
+        with conn:
+            conn.executemany('INSERT OR IGNORE INTO series VALUES '
+                             '(?, ?, ?, ?, ?, ?, ?, ?)', new)
+            # Series already in the file before this process started
+            conn.executemany(
+                'UPDATE series SET last_seen = MAX(last_seen, ?) '
+                'WHERE dpid = ? AND kind = ? AND series_id = ?',
+                [(row[-1],) + row[:3] for row in new] + touched)
+
+    def _write_or_keep(self, new, touched):
+        """Write rows along with the ones not written before.
+
+        If the database is locked, the rows are kept to be written with the
+        next ones instead of failing the stats reply. It must be called with
+        the lock.
+        """
+        if self._unwritten_new or self._unwritten_touched:
+            self._keep(new, touched)
+            new = list(self._unwritten_new.values())
+            touched = [(last_seen,) + key for key, last_seen in
+                       self._unwritten_touched.items()]
+        if not new and not touched:
+            return
+        try:
+            self._write(new, touched)
+        except sqlite3.OperationalError as error:
+            self._keep(new, touched)
+            log.warning('%d catalog rows will be written later: %s',
+                        len(self._unwritten_new) +
+                        len(self._unwritten_touched), error)
+            return
+        self._unwritten_new.clear()
+        self._unwritten_touched.clear()
+
+    def _keep(self, new, touched):
+        """Keep rows not written, one per series."""
+        for row in new:
+            self._unwritten_new[row[:3]] = row
+        for row in touched:
+            key = row[1:]
+            self._unwritten_touched[key] = max(
+                row[0], self._unwritten_touched.get(key, row[0]))
+
+    def _touch(self, dpid, kind, items, tstamp):
+        """Return rows of new series and of series to touch in the file.
+
+        It must be called with the lock.
+        """
+        min_touched = tstamp - settings.CATALOG_TOUCH_INTERVAL
+        new, touched = [], []
+        for series_id, flow in items:
+            key = (dpid, kind, str(series_id))
+            last_touched = self._touched.get(key)
+            if last_touched is None:
+                if flow is None:
+                    new.append(key + (None, None, None, tstamp, tstamp))
+                else:
+                    # Samples of memoized flow ids have no match
+                    match = flow.match and json.dumps(flow.match.as_dict())
+                    new.append(key + (flow.table_id, _to_signed(flow.cookie),
+                                      match, tstamp, tstamp))
+            elif last_touched < min_touched:
+                touched.append((tstamp,) + key)
+            else:
+                continue
+            self._touched[key] = tstamp
+        return new, touched
+
+    def search(self, dpid=None, kind=None, series_id=None, table_id=None,
+               cookie=None, seen_after=None, seen_before=None, match=None,
+               limit=None, offset=0):
+        """Return series that satisfy all the given filters.
+
+        Args:
+            dpid (str): Switch dpid.
+            kind (str): 'port' or 'flow'.
+            series_id (str): Port number or flow id.
+            table_id (int): Flow table id.
+            cookie (int): Flow cookie.
+            seen_after (int): Minimum last seen Unix timestamp.
+            seen_before (int): Maximum first seen Unix timestamp.
+            match (dict): Flow match fields and their values.
+            limit (int): Maximum number of series.
+            offset (int): Number of series to skip.
+
+        Returns:
+            list: A dict for each series, sorted by dpid, kind and id.
+        """
+        filters = [('dpid = ?', dpid), ('kind = ?', kind),
+                   ('series_id = ?', series_id), ('table_id = ?', table_id),
+                   ('cookie = ?', _to_signed(cookie)),
+                   ('last_seen >= ?', seen_after),
+                   ('first_seen <= ?', seen_before)]
+        for field, value in (match or {}).items():
+            filters.append(("json_extract(match, '$.' || ?) = ?",
+                            (field, value)))
+        where, params = [], []
+        for condition, value in filters:
+            if value is not None:
+                where.append(condition)
+                params.extend(value if isinstance(value, tuple) else (value,))
+        query = 'SELECT {} FROM series'.format(', '.join(_COLUMNS))
+        if where:
+            query += ' WHERE ' + ' AND '.join(where)
+        query += ' ORDER BY dpid, kind, series_id LIMIT ? OFFSET ?'
+        params.extend((-1 if limit is None else limit, offset))
+        with self._lock:
+            rows = self._connect().execute(query, params).fetchall()
+        return [self._as_dict(row) for row in rows]
+
+    @staticmethod
+    def _as_dict(row):
+        dct = dict(zip(_COLUMNS, row))
+        dct['id'] = dct.pop('series_id')
+        if dct['kind'] == 'port':
+            dct['id'] = int(dct['id'])
+            for flow_col in ('table_id', 'cookie', 'match'):
+                del dct[flow_col]
+        else:
+            if dct['cookie'] is not None and dct['cookie'] < 0:
+                dct['cookie'] += _INT64_OFFSET
+            if dct['match'] is not None:
+                dct['match'] = json.loads(dct['match'])
+        return dct
+
+    def _connect(self):
+        """Return the connection, creating the database if needed."""
+        if self._conn is None:
+            path = self._path or settings.DIR / 'catalog.sqlite'
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(path), check_same_thread=False)
+            self._conn.executescript(_SCHEMA)
+        return self._conn
+
+    def __len__(self):
+        """Return the number of series touched by this process."""
+        return len(self._touched)
+
+    def get_nbytes(self):
+        """Return an estimate of the bytes of the touched series."""
+        with self._lock:
+            return get_size(self._touched) + get_size(
+                self._unwritten_new) + get_size(self._unwritten_touched)
+
+    def evict(self, nbytes):
+        """Forget the series seen first.
+
+        They are added again (and ignored as existing) when seen next.
+
+        Returns:
+            int: Estimate of the bytes freed.
+        """
+        with self._lock:
+            return evict_items(nbytes, get_size(self._touched),
+                               len(self._touched),
+                               lambda: self._touched.popitem(last=False))
+
+    def close(self):
+        """Close the database connection."""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def _to_signed(cookie):
+    """Convert an unsigned 64-bit cookie to a value SQLite can store."""
+    if cookie is not None and cookie > _INT64_MAX:
+        return cookie - _INT64_OFFSET
+    return cookie
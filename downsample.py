@@ -0,0 +1,58 @@
+"""Reduce the number of points of a series keeping its visual shape."""
+
+
+def lttb(tstamps, columns, n_points):
+    """Select points with Largest-Triangle-Three-Buckets.
+
+    The first and last points are always kept. The others are split into
+    buckets and, in each bucket, the point that forms the largest triangle
+    with the previously selected point and the average of the next bucket is
+    kept. Thus, spikes are kept while flat regions are thinned.
+
+    With several columns sharing the same timestamps, the area of each column
+    is normalized by its value range and summed, so the same rows are kept
+    for all columns. ``None`` values count as zero when choosing points.
+
+    Args:
+        tstamps (list): Timestamps in ascending order.
+        columns (list): Lists of values with the same length as *tstamps*.
+        n_points (int): Number of points to keep.
+
+    Returns:
+        list: Indexes of the selected points in ascending order.
+    """
+    length = len(tstamps)
+    if n_points >= length:
+        return list(range(length))
+    if n_points < 3:
+        return [0, length - 1][-n_points:] if n_points > 0 else []
+
+    values = [[0.0 if value is None else value for value in column]
+              for column in columns]
+    scales = [(max(column) - min(column)) or 1 for column in values]
+    every = (length - 2) / (n_points - 2)
+    selected = [0]
+    previous = 0
+    for bucket in range(n_points - 2):
+        start = int(bucket * every) + 1
+        end = int((bucket + 1) * every) + 1
+        next_start, next_end = end, min(int((bucket + 2) * every) + 1, length)
+        n_next = next_end - next_start
+        avg_tstamp = sum(tstamps[next_start:next_end]) / n_next
+        avg_values = [sum(column[next_start:next_end]) / n_next
+                      for column in values]
+
+        best, best_area = start, -1
+        for i in range(start, end):
+            dt_prev = tstamps[previous] - avg_tstamp
+            dt_curr = tstamps[previous] - tstamps[i]
+            area = 0
+            for column, avg, scale in zip(values, avg_values, scales):
+                area += abs(dt_prev * (column[i] - column[previous]) -
+                            dt_curr * (avg - column[previous])) / scale
+            if area > best_area:
+                best, best_area = i, area
+        selected.append(best)
+        previous = best
+    selected.append(length - 1)
+    return selected
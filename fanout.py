@@ -0,0 +1,135 @@
+"""Concurrent fetches of the series of list endpoints, with a deadline.
+
+Lists of ports and flows read the latest values of one series per item. They
+are fetched by a pool of :data:`settings.API_WORKERS` threads, so a slow read
+doesn't hold the others back, and a response takes at most
+:data:`settings.API_DEADLINE` seconds: items not fetched by then are
+returned as stale.
+"""
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from threading import Lock
+
+from kytos.core import log
+
+from napps.kytos.of_stats import settings
+
+#: Result of the items not fetched before the deadline
+STALE = object()
+
+
+class FanOut:
+    """Bounded thread pool shared by all REST API requests."""
+
+    def __init__(self, workers=None):
+        """Create the threads when first needed.
+
+        Args:
+            workers (int): Number of threads. Defaults to
+                :data:`settings.API_WORKERS`. With 0, items are fetched
+                sequentially by the request thread, still with a deadline.
+        """
+        self._workers = workers
+        self._executor = None
+        self._lock = Lock()
+
+    @property
+    def workers(self):
+        """Number of threads."""
+        if self._workers is None:
+            return settings.API_WORKERS
+        return self._workers
+
+    def map(self, function, items, deadline=None, name='series'):
+        """Return a generator of items and their results, in order.
+
+        At most :attr:`workers` items of a request are being fetched at a
+        time, so a long list doesn't fill the queue of the pool. Items whose
+        results are not ready at the deadline have :data:`STALE` as result.
+
+        Args:
+            function (callable): Called with each item.
+            items (iterable): Items to fetch.
+            deadline (float): Seconds from now. Defaults to
+                :data:`settings.API_DEADLINE`.
+            name (str): Request description for the log.
+        """
+        if deadline is None:
+            deadline = settings.API_DEADLINE
+        start = time.perf_counter()
+        return self._map(function, items, start, start + deadline, name)
+
+    def shutdown(self):
+        """Stop the threads. New requests create them again."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def _map(self, function, items, start, end, name):
+        count, stale = 0, 0
+        timed = _timed(function)
+        for item, result in self._get_results(timed, iter(items), end):
+            count += 1
+            if result is STALE:
+                stale += 1
+            yield item, result
+        elapsed = time.perf_counter() - start
+        if stale:
+            log.warning('Fetched %s in %.3f s, %d of %d stale.', name,
+                        elapsed, stale, count)
+        else:
+            log.debug('Fetched %s in %.3f s, %d items.', name, elapsed, count)
+
+    def _get_results(self, function, items, end):
+        """Yield (item, result) keeping a window of submitted items."""
+        executor = self._get_executor()
+        if executor is None:
+            for item in items:
+                if time.perf_counter() >= end:
+                    yield item, STALE
+                else:
+                    yield item, function(item)
+            return
+        pending = deque()
+        for item in items:
+            if len(pending) >= self.workers:
+                yield self._get_result(*pending.popleft(), end)
+            if time.perf_counter() < end:
+                pending.append((item, executor.submit(function, item)))
+            else:
+                pending.append((item, None))
+        while pending:
+            yield self._get_result(*pending.popleft(), end)
+
+    @staticmethod
+    def _get_result(item, future, end):
+        if future is None:
+            return item, STALE
+        try:
+            return item, future.result(max(0, end - time.perf_counter()))
+        except FutureTimeout:
+            future.cancel()
+            return item, STALE
+
+    def _get_executor(self):
+        if self.workers < 1:
+            return None
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    self.workers, thread_name_prefix='of_stats_api')
+            return self._executor
+
+
+def _timed(function):
+    """Log the latency of each call."""
+    def wrapper(item):
+        start = time.perf_counter()
+        result = function(item)
+        log.debug('Fetched %s in %.3f s.', item,
+                  time.perf_counter() - start)
+        return result
+    return wrapper
@@ -0,0 +1,176 @@
+"""Index of the flows of each switch port, updated at ingest.
+
+Answers which flows send traffic through a port (e.g. a saturated one)
+without listing and matching all flows of the switch.
+"""
+import heapq
+import time
+from collections import OrderedDict
+from threading import Lock
+
+from napps.kytos.of_stats import settings
+from napps.kytos.of_stats.memory import evict_items, get_size
+
+
+class _IndexedFlow:
+    """Ports and current rates of a flow."""
+
+    __slots__ = ('in_port', 'out_ports', 'packet_count', 'byte_count',
+                 'tstamp', 'bps', 'pps')
+
+    def __init__(self, in_port, out_ports):
+        self.in_port = in_port
+        self.out_ports = out_ports
+        self.packet_count = None
+        self.byte_count = None
+        self.tstamp = None
+        self.bps = 0.0
+        self.pps = 0.0
+
+    def get_ports(self):
+        """Return all ports of the flow."""
+        if self.in_port is None:
+            return self.out_ports
+        return self.out_ports | {self.in_port}
+
+    def update(self, sample, tstamp):
+        """Calculate rates since the previous sample."""
+        if self.tstamp is not None and tstamp > self.tstamp:
+            interval = tstamp - self.tstamp
+            self.bps = _get_delta(self.byte_count, sample.byte_count) / \
+                interval
+            self.pps = _get_delta(self.packet_count, sample.packet_count) / \
+                interval
+        self.packet_count = sample.packet_count
+        self.byte_count = sample.byte_count
+        self.tstamp = tstamp
+
+
+class PortFlowIndex:
+    """Flows that match a port as in_port or output to it, with their rates.
+
+    Ports of a flow are read once, when its id is first seen, as the id
+    changes with the match and actions. Flows not seen for two
+    :data:`settings.STATS_INTERVAL` are removed.
+    """
+
+    def __init__(self):
+        """Start empty."""
+        #: key is switch id, value is a dict of flows by id. Least recently
+        #: updated switches first.
+        self._flows = OrderedDict()
+        #: key is (switch id, port number), value is a set of flow ids
+        self._ports = {}
+        #: key is switch id, value is the time of the last removal
+        self._pruned = {}
+        self._lock = Lock()
+
+    def update(self, switch_id, samples, tstamp=None):
+        """Index new flows and update rates.
+
+        Args:
+            switch_id (str): Switch id.
+            samples (list): :class:`~.flow_sample.FlowSample` of a reply.
+            tstamp (int): Unix timestamp in seconds. Defaults to now.
+        """
+        if tstamp is None:
+            tstamp = time.time()
+        with self._lock:
+            flows = self._flows.setdefault(switch_id, {})
+            self._flows.move_to_end(switch_id)
+            for sample in samples:
+                flow = flows.get(sample.id)
+                if flow is None:
+                    flow = flows[sample.id] = _IndexedFlow(*sample.get_ports())
+                    for port in flow.get_ports():
+                        self._ports.setdefault((switch_id, port),
+                                               set()).add(sample.id)
+                flow.update(sample, tstamp)
+            if tstamp - self._pruned.get(switch_id, 0) >= \
+                    settings.STATS_INTERVAL:
+                self._prune(switch_id, flows, tstamp)
+
+    def get_flows(self, switch_id, port, direction=None, limit=None):
+        """Return the flows of a port, highest byte rates first.
+
+        Args:
+            switch_id (str): Switch id.
+            port (int): Port number.
+            direction (str): 'in' for flows matching the port as in_port,
+                'out' for flows with output to it or None for both.
+            limit (int): Maximum number of flows.
+
+        Returns:
+            list: Dicts with flow id, rates (Bps and pps) and whether the port
+            is the in_port and an output port of the flow.
+        """
+        with self._lock:
+            flows = self._flows.get(switch_id, {})
+            items = []
+            for flow_id in self._ports.get((switch_id, port), ()):
+                flow = flows[flow_id]
+                is_in = flow.in_port == port
+                is_out = port in flow.out_ports
+                if direction == 'in' and not is_in or \
+                        direction == 'out' and not is_out:
+                    continue
+                items.append({'id': flow_id, 'Bps': flow.bps,
+                              'pps': flow.pps, 'in_port': is_in,
+                              'output': is_out})
+
+        def key(item):
+            return -item['Bps'], item['id']
+
+        if limit is None:
+            return sorted(items, key=key)
+        return heapq.nsmallest(limit, items, key=key)
+
+    def __len__(self):
+        """Return the number of indexed flows."""
+        with self._lock:
+            return sum(len(flows) for flows in self._flows.values())
+
+    def get_nbytes(self):
+        """Return an estimate of the bytes of the index."""
+        with self._lock:
+            return self._get_nbytes()
+
+    def evict(self, nbytes):
+        """Remove the switches updated least recently.
+
+        Their flows are indexed again with their next reply.
+
+        Returns:
+            int: Estimate of the bytes freed.
+        """
+        with self._lock:
+            return evict_items(nbytes, self._get_nbytes(), len(self._flows),
+                               self._pop_switch)
+
+    def _get_nbytes(self):
+        return get_size(self._flows) + get_size(self._ports)
+
+    def _pop_switch(self):
+        """Remove the flows of the least recently updated switch."""
+        switch_id, flows = self._flows.popitem(last=False)
+        self._pruned.pop(switch_id, None)
+        for flow in flows.values():
+            for port in flow.get_ports():
+                self._ports.pop((switch_id, port), None)
+
+    def _prune(self, switch_id, flows, tstamp):
+        """Remove flows not seen recently."""
+        self._pruned[switch_id] = tstamp
+        min_tstamp = tstamp - 2 * settings.STATS_INTERVAL
+        for flow_id in [flow_id for flow_id, flow in flows.items()
+                        if flow.tstamp < min_tstamp]:
+            for port in flows.pop(flow_id).get_ports():
+                flow_ids = self._ports[(switch_id, port)]
+                flow_ids.discard(flow_id)
+                if not flow_ids:
+                    del self._ports[(switch_id, port)]
+
+
+def _get_delta(previous, current):
+    """Return the counter increment, the new value if it was reset."""
+    return current - previous if current >= previous else current
@@ -0,0 +1,224 @@
+"""Lean representation of flow stats for the ingest path.
+
+Building an of_core ``Flow`` (match, actions and instructions objects) and
+hashing it for every flow of every reply only to read its id and counters is
+the main ingest cost of big flow tables. Here, flow ids are memoized by the
+fields that identify a flow and samples keep only what is stored.
+"""
+import marshal
+from collections import OrderedDict
+from enum import Enum
+from threading import Lock
+
+from pyof.foundation.base import GenericStruct, GenericType
+
+from napps.kytos.of_stats import settings
+from napps.kytos.of_stats.lazy import LazyModule
+from napps.kytos.of_stats.memory import evict_items, get_size
+
+of_core_flow = LazyModule('napps.kytos.of_core.flow')
+
+#: OpenFlow 1.0 wildcard of the input port (OFPFW_IN_PORT)
+_WILDCARD_IN_PORT = 1
+#: OXM field of the input port (OFPXMT_OFB_IN_PORT)
+_OXM_IN_PORT = 0
+#: Type of output actions (OFPAT_OUTPUT)
+_OUTPUT = 0
+#: By OpenFlow version, maximum physical port number (OFPP_MAX) and output to
+#: the input port (OFPP_IN_PORT).
+_PORTS = {False: (0xff00, 0xfff8), True: (0xffffff00, 0xfffffff8)}
+#: Types of the values in flow id keys
+_MARSHALED = (int, bool, str, bytes, float, type(None))
+
+
+class FlowSample:
+    """Id, table, cookie, counters and ports of a flow stats entry.
+
+    Only the fields that are stored or indexed are kept, not the pyof entry.
+    The of_core match is only kept for flows whose id was not memoized: the
+    of_core flow is built anyway to calculate their id and new flows need it
+    in the catalog.
+    """
+
+    __slots__ = ('id', 'table_id', 'cookie', 'packet_count', 'byte_count',
+                 'duration_sec', 'duration_nsec', 'in_port', 'out_ports',
+                 'match')
+
+    def __init__(self, flow_id, flow_stats, match=None):
+        """Read the fields from a pyof flow stats entry.
+
+        Args:
+            flow_id (str): of_core flow id.
+            flow_stats: pyof FlowStats of OpenFlow 1.0 or 1.3.
+            match: of_core match of the flow, if available.
+        """
+        # pylint: disable=invalid-name
+        self.id = flow_id
+        self.table_id = flow_stats.table_id.value
+        self.cookie = flow_stats.cookie.value
+        self.packet_count = flow_stats.packet_count.value
+        self.byte_count = flow_stats.byte_count.value
+        self.duration_sec = flow_stats.duration_sec.value
+        self.duration_nsec = flow_stats.duration_nsec.value
+        self.in_port, self.out_ports = _get_ports(flow_stats)
+        self.match = match
+
+    def get_ports(self):
+        """Return the input port the flow matches and its output ports.
+
+        Returns:
+            A tuple with the input port, None if not matched, and a set of
+            physical output ports, including the input port if the flow
+            outputs to it.
+        """
+        return self.in_port, self.out_ports
+
+    def update_flow_stats(self, flow):
+        """Copy the counters to the stats of an of_core flow.
+
+        Args:
+            flow: of_core flow with the same id, e.g. from the controller.
+        """
+        stats = flow.stats
+        if stats is None:
+            stats = flow.stats = of_core_flow.FlowStats()
+        stats.packet_count = self.packet_count
+        stats.byte_count = self.byte_count
+        stats.duration_sec = self.duration_sec
+        stats.duration_nsec = self.duration_nsec
+
+
+def _get_ports(flow_stats):
+    """Return the input port and the physical output ports of a flow.
+
+    See :meth:`FlowSample.get_ports`.
+    """
+    instructions = getattr(flow_stats, 'instructions', None)
+    if instructions is None:
+        match = flow_stats.match
+        in_port = None
+        if not match.wildcards.value & _WILDCARD_IN_PORT:
+            in_port = match.in_port.value
+        actions = flow_stats.actions
+    else:
+        in_port = None
+        for field in flow_stats.match.oxm_match_fields:
+            if field.oxm_field == _OXM_IN_PORT and not field.oxm_hasmask:
+                in_port = int.from_bytes(field.oxm_value, 'big')
+        actions = [action for instruction in instructions
+                   for action in getattr(instruction, 'actions', ())]
+    max_port, output_in_port = _PORTS[instructions is not None]
+    out_ports = set()
+    for action in actions:
+        if action.action_type.value != _OUTPUT:
+            continue
+        port = action.port.value
+        if port == output_in_port and in_port is not None:
+            out_ports.add(in_port)
+        elif port <= max_port:
+            out_ports.add(port)
+    return in_port, out_ports
+
+
+def _get_values(obj):
+    """Return the field values of a pyof struct or list as nested tuples.
+
+    They identify the struct like its packed bytes, without validating and
+    packing it.
+    """
+    if isinstance(obj, GenericType):
+        obj = obj.value
+    elif isinstance(obj, list):
+        return tuple(map(_get_values, obj))
+    elif isinstance(obj, GenericStruct):
+        return tuple(map(_get_values, vars(obj).values()))
+    if isinstance(obj, Enum):
+        obj = obj.value
+    if type(obj) in _MARSHALED:
+        return obj
+    return str(obj)
+
+
+class FlowIdCache:
+    """Least-recently-used memo of flow ids.
+
+    The key has every field of a flow stats entry but the counters and
+    durations: switch, table, priority, timeouts, cookie and the field
+    values of the match and actions (OpenFlow 1.0) or instructions (1.3),
+    serialized with :mod:`marshal`, which is much faster than packing them
+    and almost as compact. Thus, a hit has the same id that of_core would
+    calculate.
+    """
+
+    def __init__(self, size=None):
+        """Start empty.
+
+        Args:
+            size (int): Maximum number of ids. Defaults to
+                :data:`settings.FLOW_ID_CACHE_SIZE`.
+        """
+        self._size = size or settings.FLOW_ID_CACHE_SIZE
+        self._ids = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_samples(self, switch, flows_stats, flow_class):
+        """Return a :class:`FlowSample` for each flow stats entry.
+
+        Args:
+            switch (Switch): Switch that sent the stats.
+            flows_stats (iterable): pyof FlowStats.
+            flow_class (type): of_core Flow class for the switch version.
+        """
+        samples = []
+        for flow_stats in flows_stats:
+            key = self.get_key(switch.id, flow_stats)
+            with self._lock:
+                flow_id = self._ids.get(key)
+                if flow_id is not None:
+                    self._ids.move_to_end(key)
+                    self.hits += 1
+            match = None
+            if flow_id is None:
+                flow = flow_class.from_of_flow_stats(flow_stats, switch)
+                flow_id, match = flow.id, flow.match
+                with self._lock:
+                    self.misses += 1
+                    self._ids[key] = flow_id
+                    if len(self._ids) > self._size:
+                        self._ids.popitem(last=False)
+            samples.append(FlowSample(flow_id, flow_stats, match))
+        return samples
+
+    @staticmethod
+    def get_key(switch_id, flow_stats):
+        """Return the fields that identify a flow."""
+        actions = getattr(flow_stats, 'instructions', None)
+        if actions is None:
+            actions = flow_stats.actions
+        return (switch_id, flow_stats.table_id.value,
+                flow_stats.priority.value, flow_stats.idle_timeout.value,
+                flow_stats.hard_timeout.value, flow_stats.cookie.value,
+                # Version 2 has no references, which depend on refcounts
+                marshal.dumps((_get_values(flow_stats.match),
+                               _get_values(actions)), 2))
+
+    def __len__(self):
+        """Return the number of memoized ids."""
+        return len(self._ids)
+
+    def get_nbytes(self):
+        """Return an estimate of the bytes of the memoized ids."""
+        with self._lock:
+            return get_size(self._ids)
+
+    def evict(self, nbytes):
+        """Forget the least recently used ids.
+
+        Returns:
+            int: Estimate of the bytes freed.
+        """
+        with self._lock:
+            return evict_items(nbytes, get_size(self._ids), len(self._ids),
+                               lambda: self._ids.popitem(last=False))
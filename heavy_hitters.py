@@ -0,0 +1,234 @@
+"""Heavy-hitter-aware flow sampling.
+
+Flow traffic is very skewed: a few flows carry most of the bytes. With
+:data:`settings.FLOW_SAMPLING` set to 'heavy_hitters', the flows with the
+highest recent byte rates are stored every cycle. The long tail is stored
+every :data:`settings.FLOW_TAIL_INTERVAL` seconds and as an aggregate series
+per switch, so storage grows with traffic instead of flow table size.
+"""
+import heapq
+import time
+from collections import OrderedDict
+from threading import Lock
+
+from napps.kytos.of_stats import settings
+from napps.kytos.of_stats.memory import evict_items, get_size
+
+#: Flow id of the aggregate of the tail flows of a switch in the flows RRD.
+TAIL_ID = 'tail'
+
+
+def get_flow_timeout():
+    """Return the heartbeat of new flow RRDs.
+
+    With 'heavy_hitters' flow sampling, tail flows are written every
+    :data:`settings.FLOW_TAIL_INTERVAL` seconds, so the heartbeat is at least
+    that plus :data:`settings.TIMEOUT` for their rates to be interpolated
+    between writes instead of unknown.
+    """
+    timeout = settings.FLOW_TIMEOUT
+    if settings.FLOW_SAMPLING == 'heavy_hitters' and \
+            settings.FLOW_TAIL_INTERVAL > 0:
+        timeout = max(timeout,
+                      settings.FLOW_TAIL_INTERVAL + settings.TIMEOUT)
+    return timeout
+
+
+class _SwitchFlows:
+    """Sampling state of the flows of a switch."""
+
+    __slots__ = ('flows', 'cycle', 'tail', 'pending')
+
+    def __init__(self, tail):
+        #: key is flow id, value is [packet count, byte count, cycle
+        #: timestamp when seen, timestamp when written, decayed byte count]
+        self.flows = {}
+        #: Timestamp of the current cycle
+        self.cycle = None
+        #: Totals of the tail flows: [packet count, byte count]
+        self.tail = tail
+        #: Whether the tail totals of the current cycle were not written
+        self.pending = False
+
+
+class HeavyHitterSampler:
+    """Choose which flow samples to store at each polling cycle.
+
+    Byte increments of each flow are summed into a count that decays by half
+    each cycle. The :data:`settings.HEAVY_HITTERS` flows of each switch with
+    the highest counts are stored every cycle, like new flows. The counters
+    of each flow are needed anyway to calculate increments, so there is no
+    sketch; the state of the switches is bounded by the memory budget. The
+    other ones (the tail) are stored every :data:`settings.FLOW_TAIL_INTERVAL`
+    seconds, if greater than zero, and their increments are summed into
+    monotonic counters stored as flow :data:`TAIL_ID`. As in
+    :class:`~.rollups.RollupStore`, those totals are written when the next
+    cycle starts.
+    """
+
+    #: Decay factor of the flow byte counts at each cycle
+    DECAY = 0.5
+
+    def __init__(self, rrd, n_heavy=None, tail_interval=None):
+        """Store the tail aggregates in *rrd*.
+
+        Args:
+            rrd (RRD): Flows database.
+            n_heavy (int): Flows of each switch stored every cycle. Defaults
+                to :data:`settings.HEAVY_HITTERS`.
+            tail_interval (int): Seconds between writes of tail flows.
+                Defaults to :data:`settings.FLOW_TAIL_INTERVAL`.
+        """
+        self.rrd = rrd
+        self._n_heavy = n_heavy
+        self._tail_interval = tail_interval
+        #: key is switch id, value is :class:`_SwitchFlows`, least recently
+        #: updated first
+        self._switches = OrderedDict()
+        self._lock = Lock()
+
+    @property
+    def n_heavy(self):
+        """Number of flows of each switch stored every cycle."""
+        return self._n_heavy or settings.HEAVY_HITTERS
+
+    @property
+    def tail_interval(self):
+        """Seconds between writes of tail flows. Zero for never."""
+        if self._tail_interval is None:
+            return settings.FLOW_TAIL_INTERVAL
+        return self._tail_interval
+
+    def select(self, switch_id, samples, tstamp=None):
+        """Return the samples to be stored now.
+
+        Args:
+            switch_id (str): Switch id.
+            samples (list): :class:`~.flow_sample.FlowSample` of a reply.
+            tstamp (int): Unix timestamp in seconds of the polling cycle.
+                Defaults to now.
+        """
+        if tstamp is None:
+            tstamp = int(time.time())
+        with self._lock:
+            state = self._switches.get(switch_id)
+            if state is None:
+                tail = self._load_tail(switch_id)
+                state = _SwitchFlows(tail)
+                self._switches[switch_id] = state
+            self._switches.move_to_end(switch_id)
+            writes = self._start_cycle(switch_id, state, tstamp)
+            selected = self._select(state, samples, tstamp)
+        self._write(writes)
+        return selected
+
+    def flush(self):
+        """Write all tail totals not written yet."""
+        with self._lock:
+            writes = [self._pop_tail(switch_id, state) for switch_id, state
+                      in self._switches.items() if state.pending]
+        self._write(writes)
+
+    def __len__(self):
+        """Return the number of switches."""
+        return len(self._switches)
+
+    def get_nbytes(self):
+        """Return an estimate of the bytes of the sampling state."""
+        with self._lock:
+            return get_size(self._switches)
+
+    def evict(self, nbytes):
+        """Forget the switches that replied least recently.
+
+        Their tail totals are written first and loaded again with the next
+        reply. Their heavy hitters are found again from scratch.
+
+        Returns:
+            int: Estimate of the bytes freed.
+        """
+        evicted = []
+        with self._lock:
+            freed = evict_items(
+                nbytes, get_size(self._switches), len(self._switches),
+                lambda: evicted.append(self._switches.popitem(last=False)))
+        self._write([self._pop_tail(switch_id, state)
+                     for switch_id, state in evicted if state.pending])
+        return freed
+
+    def _select(self, state, samples, tstamp):
+        """Update flow counters, then choose the samples."""
+        deltas = {}
+        for sample in samples:
+            flow = state.flows.get(sample.id)
+            if flow is None:
+                state.flows[sample.id] = [sample.packet_count,
+                                          sample.byte_count, tstamp, None, 0]
+                continue
+            delta = deltas[sample.id] = (
+                _get_delta(flow[0], sample.packet_count),
+                _get_delta(flow[1], sample.byte_count))
+            flow[0], flow[1], flow[2] = (sample.packet_count,
+                                         sample.byte_count, tstamp)
+            flow[4] += delta[1]
+        top = heapq.nlargest(self.n_heavy, deltas,
+                             key=lambda flow_id: state.flows[flow_id][4])
+        heavy = {flow_id for flow_id in top if state.flows[flow_id][4] > 0}
+        selected = []
+        for sample in samples:
+            flow = state.flows[sample.id]
+            delta = deltas.get(sample.id)
+            if delta is not None and sample.id not in heavy:
+                state.tail[0] += delta[0]
+                state.tail[1] += delta[1]
+                state.pending = True
+                if not self._is_tail_due(flow[3], tstamp):
+                    continue
+            flow[3] = tstamp
+            selected.append(sample)
+        return selected
+
+    def _is_tail_due(self, written, tstamp):
+        """Return whether a tail flow last written at *written* is due."""
+        interval = self.tail_interval
+        return interval > 0 and tstamp - written >= interval
+
+    def _start_cycle(self, switch_id, state, tstamp):
+        """Return the tail write of the previous cycle if *tstamp* is newer.
+
+        Flows not seen in the previous cycle are forgotten.
+        """
+        if state.cycle is not None and tstamp <= state.cycle:
+            return []
+        writes = []
+        if state.cycle is not None:
+            if state.pending:
+                writes.append(self._pop_tail(switch_id, state))
+            state.flows = {flow_id: flow for flow_id, flow
+                           in state.flows.items() if flow[2] >= state.cycle}
+            for flow in state.flows.values():
+                flow[4] *= self.DECAY
+        state.cycle = tstamp
+        return writes
+
+    @staticmethod
+    def _pop_tail(switch_id, state):
+        """Return the write of the tail totals of *state*."""
+        state.pending = False
+        return ((switch_id, TAIL_ID), state.cycle,
+                {'packet_count': state.tail[0], 'byte_count': state.tail[1]})
+
+    def _write(self, writes):
+        for index, tstamp, totals in writes:
+            self.rrd.update(index, tstamp, **totals)
+
+    def _load_tail(self, switch_id):
+        """Continue from the last written totals to avoid counter resets."""
+        last = self.rrd.fetch_last_update((switch_id, TAIL_ID))
+        return [int(last.get('packet_count') or 0),
+                int(last.get('byte_count') or 0)]
+
+
+def _get_delta(previous, current):
+    """Return the counter increment, the new value if it was reset."""
+    return current - previous if current >= previous else current
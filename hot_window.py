@@ -0,0 +1,224 @@
+"""Full-resolution in-memory window of the latest statistics.
+
+Most REST API requests ask for recent data. Rates of the last
+:data:`settings.HOT_WINDOW` seconds are computed at ingest as rrdtool does
+for COUNTER data sources and kept in ring buffers, so recent full-resolution
+fetches are answered from memory. Older rows, if requested, are still read
+from disk by :meth:`.RRD.fetch`.
+"""
+import math
+import time
+from array import array
+from collections import OrderedDict
+from threading import Lock
+
+from napps.kytos.of_stats import settings
+from napps.kytos.of_stats.memory import evict_items, get_size
+
+NAN = float('nan')
+
+
+class HotSeries:
+    """Ring buffer of the primary data points (PDPs) of a series."""
+
+    __slots__ = ('rows', 'first', 'end', 'last_tstamp', 'last_values',
+                 'pdp_end', 'pdp_values', 'pdp_unknown')
+
+    def __init__(self, n_ds, n_rows, tstamp, values, step):
+        """Start after the first update, whose rate is unknown.
+
+        Args:
+            n_ds (int): Number of data sources.
+            n_rows (int): Number of PDPs kept.
+            tstamp (float): Unix timestamp of the first update.
+            values (list): Counter of each data source.
+            step (int): Seconds of a PDP.
+        """
+        self.rows = array('d', [NAN]) * (n_ds * n_rows)
+        #: Timestamp of the PDP being filled, the first one after tstamp
+        self.pdp_end = int(tstamp - tstamp % step + step)
+        #: Timestamp of the first complete PDP. Older ones are on disk only.
+        self.first = self.pdp_end + step
+        #: Timestamp of the latest complete PDP
+        self.end = None
+        self.last_tstamp = tstamp
+        self.last_values = values
+        self.pdp_values = [0.0] * n_ds
+        self.pdp_unknown = [0.0] * n_ds
+
+
+class HotWindow:
+    """Latest full-resolution rates of all series of an RRD.
+
+    As in rrdtool, the rate between two updates is spread over the PDPs of
+    :data:`settings.STATS_INTERVAL` seconds it spans. It is unknown if the
+    updates are further apart than the heartbeat or if the rate is out of
+    :data:`settings.MIN` and :data:`settings.MAX`. A PDP is unknown if more
+    than half of it is unknown. Counters that decrease are taken as wrapped.
+    """
+
+    def __init__(self, data_sources, window=None, timeout=None):
+        """Keep *window* seconds of each series.
+
+        Args:
+            data_sources (iterable): Data source names.
+            window (int): Seconds to keep. Defaults to
+                :data:`settings.HOT_WINDOW`.
+            timeout (int): Heartbeat in seconds. Defaults to
+                :data:`settings.TIMEOUT`.
+        """
+        self._ds = tuple(data_sources)
+        self._step = settings.STATS_INTERVAL
+        self._n_rows = max(1, (window or settings.HOT_WINDOW) // self._step)
+        self._timeout = timeout or settings.TIMEOUT
+        #: key is index, value is :class:`HotSeries`, least recently updated
+        #: first
+        self._series = OrderedDict()
+        self._lock = Lock()
+
+    @property
+    def step(self):
+        """Seconds of each row."""
+        return self._step
+
+    def update(self, index, tstamp=None, **ds_values):
+        """Add an update as :meth:`.RRD.update` does.
+
+        Updates not newer than the previous one are ignored, as rrdtool
+        refuses them.
+        """
+        if tstamp is None:
+            tstamp = time.time()
+        values = [ds_values[ds] for ds in self._ds]
+        index = tuple(index)
+        with self._lock:
+            series = self._series.get(index)
+            if series is None:
+                self._series[index] = HotSeries(len(self._ds), self._n_rows,
+                                                tstamp, values, self._step)
+            else:
+                self._series.move_to_end(index)
+                if tstamp > series.last_tstamp:
+                    self._add(series, tstamp, values)
+
+    def fetch(self, index, start, end):
+        """Return the rows of the window in an rrdtool fetch range.
+
+        Args:
+            index (iterable): RRD index.
+            start (int): rrdtool fetch start.
+            end (int): rrdtool fetch end.
+
+        Returns:
+            A tuple with the range of timestamps and the list of rows, which
+            start later than requested if the older ones are not in memory,
+            or None if no row is in memory.
+        """
+        step = self._step
+        stop = end + step - end % step
+        with self._lock:
+            series = self._series.get(tuple(index))
+            if series is None or series.end is None:
+                return None
+            oldest = max(series.first,
+                         series.end - (self._n_rows - 1) * step)
+            first = max(start - start % step + step, oldest)
+            if first > stop:
+                return None
+            rows = [self._get_row(series, tstamp)
+                    for tstamp in range(first, stop + 1, step)]
+        return range(first, stop + 1, step), rows
+
+    def __contains__(self, index):
+        """Return whether there are rows for *index*."""
+        return tuple(index) in self._series
+
+    def __len__(self):
+        """Return the number of series."""
+        return len(self._series)
+
+    def get_nbytes(self):
+        """Return an estimate of the bytes of all series."""
+        with self._lock:
+            return get_size(self._series)
+
+    def evict(self, nbytes):
+        """Remove the least recently updated series.
+
+        Their rows are read from disk afterwards. A removed series starts
+        again with its next update.
+
+        Returns:
+            int: Estimate of the bytes freed.
+        """
+        with self._lock:
+            return evict_items(nbytes, get_size(self._series),
+                               len(self._series),
+                               lambda: self._series.popitem(last=False))
+
+    def _get_row(self, series, tstamp):
+        """Return the values of a PDP with None if unknown."""
+        if tstamp > series.end:
+            return (None,) * len(self._ds)
+        position = (tstamp // self._step) % self._n_rows * len(self._ds)
+        return tuple(None if math.isnan(value) else value for value in
+                     series.rows[position:position + len(self._ds)])
+
+    def _add(self, series, tstamp, values):
+        """Spread the rates since the last update over PDPs."""
+        interval = tstamp - series.last_tstamp
+        rates = [self._get_rate(previous, value, interval)
+                 for previous, value in zip(series.last_values, values)]
+        position = series.last_tstamp
+        series.last_tstamp, series.last_values = tstamp, values
+        # PDPs that would be overwritten in this update are skipped
+        skipped = int((tstamp - series.pdp_end) // self._step) - self._n_rows
+        if skipped > 0:
+            self._add_rates(series, rates, series.pdp_end - position)
+            self._finish_pdp(series)
+            series.pdp_end += skipped * self._step
+            position = series.pdp_end - self._step
+        while position < tstamp:
+            segment_end = min(tstamp, series.pdp_end)
+            self._add_rates(series, rates, segment_end - position)
+            position = segment_end
+            if position == series.pdp_end:
+                self._finish_pdp(series)
+
+    @staticmethod
+    def _add_rates(series, rates, duration):
+        for i, rate in enumerate(rates):
+            if rate is None:
+                series.pdp_unknown[i] += duration
+            else:
+                series.pdp_values[i] += rate * duration
+
+    def _get_rate(self, previous, value, interval):
+        """Return the per-second rate of a counter or None if unknown."""
+        if interval > self._timeout:
+            return None
+        delta = value - previous
+        if delta < 0:
+            delta += 2 ** 32
+            if delta < 0:
+                delta += 2 ** 64 - 2 ** 32
+        rate = delta / interval
+        if rate < settings.MIN or rate > settings.MAX:
+            return None
+        return rate
+
+    def _finish_pdp(self, series):
+        """Store the PDP being filled and start the next one."""
+        step = self._step
+        n_ds = len(self._ds)
+        position = (series.pdp_end // step) % self._n_rows * n_ds
+        for i in range(n_ds):
+            known = step - series.pdp_unknown[i]
+            if known < step / 2:
+                series.rows[position + i] = NAN
+            else:
+                series.rows[position + i] = series.pdp_values[i] / known
+            series.pdp_values[i] = 0.0
+            series.pdp_unknown[i] = 0.0
+        series.end = series.pdp_end
+        series.pdp_end += step
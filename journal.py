@@ -0,0 +1,393 @@
+"""Append-only journal of RRD updates.
+
+With :data:`settings.JOURNAL`, each update is appended to a segment file as a
+compact binary record before :meth:`.RRD.update` returns. RRD files are
+written later by a background thread, in large batches with one rrdtool call
+per file (:meth:`.RRD.update_many`), so ingest doesn't wait for them. A
+controller crash loses no accepted sample: segments left by the previous run
+are replayed at setup. Replaying rows that were already written is harmless
+because rows not newer than the last update of a file are skipped.
+"""
+import os
+import struct
+import time
+import zlib
+from pathlib import Path
+from threading import Event, Lock, Thread
+
+from kytos.core import log
+
+from napps.kytos.of_stats import settings
+from napps.kytos.of_stats.memory import get_size
+from napps.kytos.of_stats.stats import RRD
+
+#: CRC32 and length of the record payload
+RECORD_HEADER = struct.Struct('!IH')
+#: Timestamp and number of index parts
+_RECORD_START = struct.Struct('!IB')
+#: Unsigned integer of index parts and data source values
+_INTEGER = struct.Struct('!Q')
+#: Length in bytes of app names and string index parts
+_STRING_LENGTH = struct.Struct('!H')
+
+
+def pack_record(app, index, tstamp, values):
+    """Return the binary record of an RRD update.
+
+    Args:
+        app (str): RRD app folder.
+        index (iterable): RRD index of strings and non-negative integers.
+        tstamp (int): Unix timestamp in seconds.
+        values (iterable): Non-negative integer of each data source.
+    """
+    parts = [_pack_string(app), _RECORD_START.pack(int(tstamp), len(index))]
+    for part in index:
+        if isinstance(part, int):
+            parts.append(b'i' + _INTEGER.pack(part))
+        else:
+            parts.append(b's' + _pack_string(part))
+    values = [int(value) for value in values]
+    parts.append(struct.pack('!B{}Q'.format(len(values)), len(values),
+                             *values))
+    payload = b''.join(parts)
+    if len(payload) > 0xffff:
+        raise ValueError('Journal records are limited to 65535 bytes, not '
+                         '{}.'.format(len(payload)))
+    return RECORD_HEADER.pack(zlib.crc32(payload), len(payload)) + payload
+
+
+def unpack_record(payload):
+    """Return (app, index, timestamp, values) of a record payload."""
+    app, offset = _unpack_string(payload, 0)
+    tstamp, n_parts = _RECORD_START.unpack_from(payload, offset)
+    offset += _RECORD_START.size
+    index = []
+    for _ in range(n_parts):
+        kind = payload[offset:offset + 1]
+        offset += 1
+        if kind == b'i':
+            index.append(_INTEGER.unpack_from(payload, offset)[0])
+            offset += _INTEGER.size
+        else:
+            part, offset = _unpack_string(payload, offset)
+            index.append(part)
+    n_values = payload[offset]
+    values = struct.unpack_from('!{}Q'.format(n_values), payload, offset + 1)
+    return app, tuple(index), tstamp, values
+
+
+def read_segment(path):
+    """Yield (app, index, timestamp, values) of each record of a segment.
+
+    Reading stops at the first truncated or corrupted record, which is
+    expected if the controller crashed while appending it.
+    """
+    data = Path(path).read_bytes()
+    offset = 0
+    while offset < len(data):
+        end = offset + RECORD_HEADER.size
+        if end > len(data):
+            log.warning('Truncated record at byte %d of journal %s.', offset,
+                        path)
+            return
+        crc, length = RECORD_HEADER.unpack_from(data, offset)
+        payload = data[end:end + length]
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            log.warning('Corrupted record at byte %d of journal %s.', offset,
+                        path)
+            return
+        yield unpack_record(payload)
+        offset = end + length
+
+
+def _pack_string(string):
+    encoded = str(string).encode()
+    if len(encoded) > 0xffff:
+        raise ValueError('Journal strings are limited to 65535 bytes, not '
+                         '{}.'.format(len(encoded)))
+    return _STRING_LENGTH.pack(len(encoded)) + encoded
+
+
+def _unpack_string(data, offset):
+    length = _STRING_LENGTH.unpack_from(data, offset)[0]
+    start = offset + _STRING_LENGTH.size
+    return data[start:start + length].decode(), start + length
+
+
+class Journal:
+    """Segment files of RRD updates not written yet.
+
+    Records are appended to the current segment, which is rotated when it
+    reaches :data:`settings.JOURNAL_SEGMENT_SIZE`. When
+    :data:`settings.JOURNAL_BATCH_SIZE` updates are pending or
+    :data:`settings.JOURNAL_FLUSH_INTERVAL` seconds have passed, a flusher
+    thread starts a new segment, writes the pending updates and deletes older
+    segments. With :attr:`.RRD.writers`, segments are deleted once the writer
+    processes confirm their updates were written. Segments with updates that
+    failed to be written are kept and replayed at the next setup.
+    """
+
+    def __init__(self, folder=None):
+        """Use segment files in *folder*, created if needed.
+
+        Args:
+            folder (Path): Defaults to ``journal`` in :data:`settings.DIR`.
+        """
+        self._folder = Path(folder or settings.DIR / 'journal')
+        self._folder.mkdir(parents=True, exist_ok=True)
+        self._segment = None
+        self._segment_number = None
+        self._segment_size = 0
+        #: key is (RRD, index), value is a list of (timestamp, values)
+        self._pending = {}
+        self._n_pending = 0
+        self._last_flush = time.time()
+        self._last_sync = time.time()
+        #: Segments not to delete in the next flushes: their updates failed
+        #: or wait for confirmation
+        self._kept = set()
+        #: (writer pool, sync token, segments) waiting for confirmation
+        self._unconfirmed = []
+        self._lock = Lock()
+        self._flush_lock = Lock()
+        #: Set to wake the flusher thread up, started by the first append
+        self._flush_event = Event()
+        self._flusher = None
+        self._closed = False
+
+    @property
+    def folder(self):
+        """Folder of the segment files."""
+        return self._folder
+
+    def append(self, rrd, index, tstamp=None, **ds_values):
+        """Record an update of *rrd* and signal the flusher if it's time.
+
+        Args:
+            rrd (RRD): RRD that would write the update.
+            index (list): RRD index.
+            tstamp (int): Unix timestamp in seconds. Defaults to now.
+            ds_values: Value of each data source.
+        """
+        if tstamp is None:
+            tstamp = int(time.time())
+        tstamp = int(tstamp)
+        values = [ds_values[ds] for ds in rrd.data_sources]
+        record = pack_record(rrd.app, index, tstamp, values)
+        with self._lock:
+            if self._flusher is None:
+                self._flusher = Thread(target=self._flush_loop,
+                                       name='of_stats journal', daemon=True)
+                self._flusher.start()
+            if self._segment is None or \
+                    self._segment_size >= settings.JOURNAL_SEGMENT_SIZE:
+                self._rotate()
+            self._segment.write(record)
+            self._segment_size += len(record)
+            self._sync()
+            rows = self._pending.setdefault((rrd, tuple(index)), [])
+            rows.append((tstamp, dict(zip(rrd.data_sources, values))))
+            self._n_pending += 1
+            due = self._n_pending >= settings.JOURNAL_BATCH_SIZE or \
+                time.time() - self._last_flush >= \
+                settings.JOURNAL_FLUSH_INTERVAL
+        if due:
+            self._flush_event.set()
+
+    def flush(self):
+        """Write all pending updates and delete their segments when done."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                self._n_pending = 0
+                self._last_flush = time.time()
+                self._rotate()
+                done = [path for path in self._get_segments()
+                        if self._get_number(path) < self._segment_number and
+                        path not in self._kept]
+            self._commit(pending, done)
+
+    def replay(self, rrds):
+        """Write the updates of segments left by a previous run.
+
+        It must be called before :meth:`append`.
+
+        Args:
+            rrds (iterable): RRDs whose updates are replayed, found by their
+                app folder.
+
+        Returns:
+            int: Number of replayed updates.
+        """
+        by_app = {rrd.app: rrd for rrd in rrds}
+        segments = self._get_segments()
+        pending = {}
+        count = 0
+        for path in segments:
+            for app, index, tstamp, values in read_segment(path):
+                rrd = by_app.get(app)
+                if rrd is None:
+                    continue
+                rows = pending.setdefault((rrd, index), [])
+                rows.append((tstamp, dict(zip(rrd.data_sources, values))))
+                count += 1
+        with self._flush_lock:
+            self._commit(pending, segments)
+        if count:
+            log.info('Replayed %d journaled updates.', count)
+        return count
+
+    def __len__(self):
+        """Return the number of pending updates."""
+        return self._n_pending
+
+    def get_nbytes(self):
+        """Return an estimate of the bytes of the pending updates."""
+        with self._lock:
+            return get_size(self._pending)
+
+    def evict(self, nbytes):
+        """Write all pending updates, the only way to free them.
+
+        Returns:
+            int: Estimate of the bytes freed.
+        """
+        size = self.get_nbytes()
+        if not self._n_pending:
+            return 0
+        self.flush()
+        return size
+
+    def close(self):
+        """Stop the flusher, write pending updates and close the segment.
+
+        It waits up to :data:`settings.JOURNAL_CONFIRM_TIMEOUT` seconds for
+        writer processes to confirm the updates. Segments not confirmed are
+        kept to be replayed at the next setup.
+        """
+        self._closed = True
+        self._flush_event.set()
+        if self._flusher is not None:
+            self._flusher.join()
+        self.flush()
+        with self._flush_lock:
+            self._confirm(settings.JOURNAL_CONFIRM_TIMEOUT)
+        with self._lock:
+            if self._segment is not None:
+                self._segment.close()
+                self._segment = None
+                if not self._segment_size:
+                    self._get_segment_path(self._segment_number).unlink()
+
+    def _flush_loop(self):
+        """Flush when signaled or every JOURNAL_FLUSH_INTERVAL seconds."""
+        while True:
+            self._flush_event.wait(settings.JOURNAL_FLUSH_INTERVAL)
+            self._flush_event.clear()
+            if self._n_pending or self._unconfirmed:
+                try:
+                    self.flush()
+                except Exception:  # pylint: disable=broad-except
+                    log.exception('Error flushing the journal.')
+            if self._closed:
+                return
+
+    def _rotate(self):
+        """Close the current segment, if any, and start a new one."""
+        if self._segment is not None:
+            self._segment.close()
+        numbers = [self._get_number(path) for path in self._get_segments()]
+        self._segment_number = max(numbers, default=0) + 1
+        path = self._get_segment_path(self._segment_number)
+        # Unbuffered: each record reaches the OS before the update returns
+        self._segment = path.open('ab', buffering=0)
+        self._segment_size = 0
+
+    def _sync(self):
+        """Flush the segment to disk every JOURNAL_SYNC_INTERVAL seconds."""
+        interval = settings.JOURNAL_SYNC_INTERVAL
+        if interval is not None and time.time() - self._last_sync >= interval:
+            os.fsync(self._segment.fileno())
+            self._last_sync = time.time()
+
+    def _commit(self, pending, segments):
+        """Write *pending* updates and delete their *segments* when done.
+
+        It must be called with the flush lock.
+        """
+        writers = next((rrd.writers for rrd, _ in pending
+                        if rrd.writers is not None), None)
+        if not self._write(pending):
+            self._keep(segments)
+        elif writers is not None:
+            self._kept.update(segments)
+            self._unconfirmed.append((writers, writers.sync(), segments))
+        else:
+            self._delete(segments)
+        self._confirm()
+
+    def _confirm(self, timeout=0):
+        """Delete segments whose updates the writer processes confirmed.
+
+        It must be called with the flush lock.
+
+        Args:
+            timeout (float): Seconds to wait for all confirmations.
+        """
+        deadline = time.monotonic() + timeout
+        unconfirmed = []
+        for item in self._unconfirmed:
+            writers, token, segments = item
+            written = writers.get_sync(token,
+                                       max(0, deadline - time.monotonic()))
+            if written is None:
+                unconfirmed.append(item)
+            elif written:
+                self._kept.difference_update(segments)
+                self._delete(segments)
+            else:
+                self._keep(segments)
+        self._unconfirmed = unconfirmed
+
+    def _keep(self, segments):
+        """Keep segments with failed updates to replay them at setup."""
+        self._kept.update(segments)
+        if segments:
+            log.warning('Keeping %d journal segments with failed updates to '
+                        'replay them at the next setup.', len(segments))
+
+    @staticmethod
+    def _delete(segments):
+        for path in segments:
+            path.unlink()
+
+    @staticmethod
+    def _write(pending):
+        """Write rows with one call per RRD file (or message per writer).
+
+        Returns:
+            bool: Whether all rows were written (or sent) without errors.
+        """
+        written = True
+        with RRD.batch():
+            for (rrd, index), rows in pending.items():
+                try:
+                    if rrd.writers is not None:
+                        rrd.writers.submit_many(rrd, index, rows)
+                    else:
+                        rrd.update_many(index, rows)
+                except Exception:  # pylint: disable=broad-except
+                    log.exception('Error writing journaled %s for index %s.',
+                                  rrd.app, index)
+                    written = False
+        return written
+
+    def _get_segments(self):
+        return sorted(self._folder.glob('*.journal'))
+
+    def _get_segment_path(self, number):
+        return self._folder / '{:010d}.journal'.format(number)
+
+    @staticmethod
+    def _get_number(path):
+        return int(path.stem)
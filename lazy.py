@@ -0,0 +1,31 @@
+"""Defer slow imports until they are needed."""
+from importlib import import_module
+
+
+class LazyModule:
+    """Module that is imported when one of its attributes is first used.
+
+    Example:
+        >>> rrdtool = LazyModule('rrdtool')  # Not imported yet
+        >>> rrdtool.update  # doctest: +SKIP
+    """
+
+    def __init__(self, name):
+        """Store the module name.
+
+        Args:
+            name (str): Absolute module name.
+        """
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        """Import the module if needed and return its attribute."""
+        if self._module is None:
+            self._module = import_module(self._name)
+        return getattr(self._module, attr)
+
+    @property
+    def is_loaded(self):
+        """Whether the module was already imported."""
+        return self._module is not None
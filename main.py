@@ -1,11 +1,22 @@
 """Statistics application."""
+from threading import Thread
+
 from kytos.core import KytosNApp, log, rest
 from kytos.core.helpers import listen_to
 from pyof.v0x01.controller2switch.stats_request import StatsType
+from pyof.v0x04.controller2switch.multipart_reply import MultipartReplyFlags
 
 from napps.kytos.of_stats import settings
-from napps.kytos.of_stats.stats import FlowStats, PortStats
-from napps.kytos.of_stats.stats_api import FlowStatsAPI, PortStatsAPI, StatsAPI
+from napps.kytos.of_stats.hot_window import HotWindow
+from napps.kytos.of_stats.journal import Journal
+from napps.kytos.of_stats.multipart import MultipartBuffer
+from napps.kytos.of_stats.partition import Partition
+from napps.kytos.of_stats.stats import RRD, FlowStats, PortStats, Stats
+from napps.kytos.of_stats.stats_api import (CatalogAPI, FlowStatsAPI,
+                                            MemoryAPI, PortStatsAPI,
+                                            RequestsAPI, RollupStatsAPI,
+                                            StatsAPI, routed)
+from napps.kytos.of_stats.writers import WriterPool
 
 
 class Main(KytosNApp):
@@ -13,30 +24,114 @@ class Main(KytosNApp):
 
     def setup(self):
         """Initialize all statistics and set their loop interval."""
-        self.execute_as_loop(settings.STATS_INTERVAL)
-
         # Initialize statistics
         msg_out = self.controller.buffers.msg_out
         self._stats = {StatsType.OFPST_PORT.value: PortStats(msg_out),
                        StatsType.OFPST_FLOW.value: FlowStats(msg_out)}
+        self._multipart = MultipartBuffer()
+
+        if settings.WRITER_PROCESSES:
+            writers = WriterPool(settings.WRITER_PROCESSES)
+            writers.start()
+            RRD.writers = writers
+
+        self._partition = None
+        journal_folder = None
+        if settings.PARTITION_MEMBERS:
+            self._partition = Partition()
+            PortStats.rollups.owns = self._partition.owns
+            journal_folder = settings.DIR / 'journal' / self._partition.name
+
+        if settings.JOURNAL:
+            journal = Journal(journal_folder)
+            journal.replay((PortStats.rrd, FlowStats.rrd,
+                            PortStats.rollups.rrd))
+            RRD.journal = journal
+
+        # Latest rows in memory for the REST API
+        for stats, window in ((PortStats, settings.HOT_WINDOW),
+                              (FlowStats, settings.FLOW_HOT_WINDOW)):
+            if window:
+                stats.rrd.hot = HotWindow(stats.rrd.data_sources, window,
+                                          stats.rrd.timeout)
+
+        self._register_memory()
+
+        # Stats split into shards are requested along the interval
+        self._slots = max(stats.slots for stats in self._stats.values())
+        self._slot = 0
+        self.execute_as_loop(settings.STATS_INTERVAL / self._slots)
 
         StatsAPI.controller = self.controller
+        StatsAPI.partition = self._partition
+        RequestsAPI.stats_list = tuple(self._stats.values())
+
+        # Avoid opening cold RRD files in the first polls and API requests
+        Thread(target=self._warm_up, name='of_stats warm-up',
+               daemon=True).start()
 
     def execute(self):
         """Query all switches sequentially and then sleep before repeating."""
+        slot = self._slot
+        self._slot = (slot + 1) % self._slots
         switches = list(self.controller.switches.values())
         for switch in switches:
-            if switch.is_connected():
-                self._update_stats(switch)
+            if switch.is_connected() and self._owns(switch.id):
+                self._update_stats(switch, slot)
 
     def shutdown(self):
         """End of the application."""
         log.debug('Shutting down...')
+        PortStats.summaries.save_all()
+        PortStats.rollups.flush()
+        FlowStats.sampler.flush()
+        if RRD.journal is not None:
+            RRD.journal.close()
+            RRD.journal = None
+        Stats.catalog.close()
+        PortStats.rrd.hot = FlowStats.rrd.hot = None
+        Stats.memory.clear()
+        StatsAPI.fan_out.shutdown()
+        if RRD.writers is not None:
+            RRD.writers.stop()
+            RRD.writers = None
+
+    def _register_memory(self):
+        """Account caches and buffers, cheapest to rebuild evicted first."""
+        for name, component, priority in (
+                ('port_rrd', PortStats.rrd, 0),
+                ('flow_rrd', FlowStats.rrd, 0),
+                ('rollup_rrd', PortStats.rollups.rrd, 0),
+                ('catalog', Stats.catalog, 0),
+                ('flow_ids', FlowStats.flow_ids, 1),
+                ('port_flows', FlowStats.port_flows, 1),
+                ('port_hot', PortStats.rrd.hot, 2),
+                ('flow_hot', FlowStats.rrd.hot, 2),
+                ('summaries', PortStats.summaries, 3),
+                ('flow_sampler', FlowStats.sampler, 3),
+                # Flushing the journal writes many files
+                ('journal', RRD.journal, 4),
+                # Not evicted
+                ('rollups', PortStats.rollups, 5),
+                ('multipart', self._multipart, 5)):
+            if component is not None:
+                Stats.memory.register(name, component, priority)
+
+    def _owns(self, dpid):
+        """Return whether this instance polls and stores *dpid*."""
+        return self._partition is None or self._partition.owns(dpid)
+
+    @staticmethod
+    def _warm_up():
+        """Index RRD files and load latest values, ports first."""
+        for stats in (PortStats, FlowStats):
+            stats.rrd.warm_up()
+        log.debug('RRD files warmed up.')
 
-    def _update_stats(self, switch):
+    def _update_stats(self, switch, slot=0):
         for stats in self._stats.values():
-            if switch.connection is not None:
-                stats.request(switch.connection)
+            if switch.connection is not None and slot < stats.slots:
+                stats.request(switch.connection, slot)
 
     @listen_to('kytos/of_core.v0x01.messages.in.ofpt_stats_reply')
     def listen_v0x01(self, event):
@@ -58,42 +153,125 @@ class Main(KytosNApp):
         Note: v0x01 ``body_type`` and v0x04 ``multipart_type`` have the same
         values.  Besides, both ``msg.body`` have the fields/attributes we use.
         Thus, we can treat them the same way and reuse the code.
+
+        Replies split into several messages are reassembled and the stats are
+        processed only when the last part arrives, all with the same
+        timestamp. v0x01 ``OFPSF_REPLY_MORE`` and v0x04
+        ``OFPMPF_REPLY_MORE`` flags also have the same value. The last part
+        also allows the next request of that type to be sent.
         """
         msg = event.content['message']
+        switch = event.source.switch
+        if not self._owns(switch.id):
+            return
         if stats_type.value in self._stats:
             stats = self._stats[stats_type.value]
-            stats_list = msg.body
-            stats.listen(event.source.switch, stats_list)
+            xid = msg.header.xid.value
+            flags = msg.flags.value
+            more = flags & MultipartReplyFlags.OFPMPF_REPLY_MORE.value
+            reply = self._multipart.add(switch.id, xid, msg.body, more)
+            if reply is not None:
+                self._finish_request(stats, switch, xid)
+                tstamp, stats_list = reply
+                tstamp = stats.get_tstamp(xid, tstamp)
+                # One message per writer process for the whole reply
+                with RRD.batch():
+                    stats.listen(switch, stats_list, tstamp)
+                Stats.memory.check()
         else:
             log.debug('No listener for %s = %s in %s.', stats_type.name,
                       stats_type.value, list(self._stats.keys()))
 
+    @staticmethod
+    def _finish_request(stats, switch, xid):
+        """Allow the next request and log the reply latency."""
+        latency = stats.outstanding.remove(switch.id, xid)
+        if latency is not None:
+            log.debug('%s reply latency of switch %s: %.3f s.',
+                      type(stats).__name__, switch.id, latency)
+
     # REST API
 
+    @rest('v1/<dpid>/requests')
+    @staticmethod
+    @routed
+    def get_requests_status(dpid):
+        """Return pending requests and reply latency of ``dpid``."""
+        return RequestsAPI.get_status(dpid)
+
     @rest('v1/<dpid>/ports/<int:port>')
     @staticmethod
+    @routed
     def get_port_stats(dpid, port):
         """Return statistics for ``dpid`` and ``port``."""
         return PortStatsAPI.get_port_stats(dpid, port)
 
+    @rest('v1/<dpid>/ports/<int:port>/summary')
+    @staticmethod
+    @routed
+    def get_port_summary(dpid, port):
+        """Return rolling aggregates for ``dpid`` and ``port``."""
+        return PortStatsAPI.get_port_summary(dpid, port)
+
+    @rest('v1/<dpid>/ports/<int:port>/flows')
+    @staticmethod
+    @routed
+    def get_port_flows(dpid, port):
+        """Return flows of ``dpid`` through ``port`` by their byte rates."""
+        return FlowStatsAPI.get_port_flows(dpid, port)
+
     @rest('v1/<dpid>/ports')
     @staticmethod
+    @routed
     def get_ports_list(dpid):
         """Return ports of ``dpid``."""
         return PortStatsAPI.get_ports_list(dpid)
 
     @rest('v1/<dpid>/flows/<flow_hash>')
     @staticmethod
+    @routed
     def get_flow_stats(dpid, flow_hash):
         """Return statistics of a flow in ``dpid``."""
         return FlowStatsAPI.get_flow_stats(dpid, flow_hash)
 
     @rest('v1/<dpid>/flows')
     @staticmethod
+    @routed
     def get_flow_list(dpid):
         """Return all flows of ``dpid``."""
         return FlowStatsAPI.get_flow_list(dpid)
 
+    @rest('v1/rollups')
+    @staticmethod
+    def get_rollups_list():
+        """Return switch, link and port group rollups."""
+        return RollupStatsAPI.get_rollups_list()
+
+    @rest('v1/rollups/<kind>/<rollup_id>')
+    @staticmethod
+    def get_rollup_stats(kind, rollup_id):
+        """Return statistics of a switch, link or port group total."""
+        return RollupStatsAPI.get_rollup_stats(kind, rollup_id)
+
+    @rest('v1/series')
+    @staticmethod
+    def search_series():
+        """Search the catalog of all series, including old ones."""
+        return CatalogAPI.search()
+
+    @rest('v1/<dpid>/series')
+    @staticmethod
+    @routed
+    def search_switch_series(dpid):
+        """Search the catalog of all series of ``dpid``."""
+        return CatalogAPI.search(dpid)
+
+    @rest('v1/memory')
+    @staticmethod
+    def get_memory_usage():
+        """Return memory used by caches and buffers of this instance."""
+        return MemoryAPI.get_usage()
+
     @rest('v1/<dpid>/ports/<int:port>/random')
     @staticmethod
     def get_random_interface_stats(dpid, port):
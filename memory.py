@@ -0,0 +1,223 @@
+"""Memory accounting of the caches and buffers of the NApp.
+
+Latest values, hot windows, flow ids and indexes grow with the number of
+series, while the controller shares the host with other NApps. Each of them
+is registered in a :class:`MemoryBudget` that keeps their total size under
+:data:`settings.MEMORY_BUDGET` by evicting their least recently used items,
+lowest priority components first.
+
+A component has a ``get_nbytes()`` method returning an estimate of its size,
+``evict(nbytes)`` to free about *nbytes* and return how many bytes it freed
+(0 if nothing can be evicted) and ``__len__`` for its number of items.
+"""
+import functools
+import itertools
+import math
+import sys
+import time
+from array import array
+from collections import deque
+from threading import Lock
+
+from kytos.core import log
+
+from napps.kytos.of_stats import settings
+
+#: Items of a container whose size is measured to estimate the others
+SAMPLE = 32
+
+_SEQUENCES = (list, tuple, set, frozenset, deque)
+#: Immutable objects whose size doesn't depend on what they refer to
+_ATOMS = (str, bytes, int, float, bool, type(None), array)
+
+
+def get_size(obj, sample=SAMPLE):
+    """Return an estimate of the bytes of *obj* and the objects it holds.
+
+    Built-in containers and objects with ``__slots__`` are measured
+    recursively. The size of containers with more than *sample* items is
+    extrapolated from their first items (a quarter of *sample* for nested
+    containers, whose items are usually alike). Other objects, like the ones
+    with a ``__dict__`` (e.g. an RRD), are referred to, not owned, so only
+    the reference is counted. Shared objects are counted each time, so the
+    estimate errs on the high side.
+    """
+    size = sys.getsizeof(obj)
+    if isinstance(obj, _ATOMS):
+        return size
+    if not isinstance(obj, (dict,) + _SEQUENCES):
+        for slot in _get_slots(type(obj)):
+            value = getattr(obj, slot, None)
+            if value is not None:
+                size += get_size(value, sample)
+        return size
+    if not obj:
+        return size
+    inner = max(1, sample // 4)
+    total = 0
+    if isinstance(obj, dict):
+        measured = list(itertools.islice(obj.items(), sample))
+        for key, value in measured:
+            total += get_size(key, inner) + get_size(value, inner)
+    else:
+        measured = list(itertools.islice(obj, sample))
+        for item in measured:
+            total += get_size(item, inner)
+    return size + total * len(obj) // len(measured)
+
+
+def evict_items(nbytes, size, n_items, pop):
+    """Remove the items that hold about *nbytes*.
+
+    Args:
+        nbytes (int): Bytes to free.
+        size (int): Bytes of all items.
+        n_items (int): Number of items.
+        pop (callable): Removes the next item to evict, raising
+            ``KeyError`` if there is none.
+
+    Returns:
+        int: Estimate of the bytes freed.
+    """
+    if not n_items or size <= 0 or nbytes <= 0:
+        return 0
+    count = min(n_items, math.ceil(nbytes * n_items / size))
+    for evicted in range(count):
+        try:
+            pop()
+        except KeyError:
+            count = evicted
+            break
+    return size * count // n_items
+
+
+@functools.lru_cache(maxsize=None)
+def _get_slots(cls):
+    """Return the slots of *cls* and its bases, empty if it has a dict."""
+    if '__dict__' in dir(cls):
+        return ()
+    slots = []
+    for klass in cls.__mro__:
+        names = klass.__dict__.get('__slots__', ())
+        slots.extend((names,) if isinstance(names, str) else names)
+    return tuple(slots)
+
+
+class _Component:
+    """Registered component and its eviction stats."""
+
+    __slots__ = ('component', 'priority', 'evicted')
+
+    def __init__(self, component, priority):
+        self.component = component
+        self.priority = priority
+        #: Bytes evicted since registration
+        self.evicted = 0
+
+
+class MemoryBudget:
+    """Total size of the registered components under a budget.
+
+    When the total is over the budget, components are asked to evict items,
+    lowest priority first and, with the same priority, the biggest first,
+    until the total is under :attr:`LOW_WATER` of the budget. Thus, checks
+    after the next updates don't evict again right away.
+    """
+
+    #: Fraction of the budget used after an eviction
+    LOW_WATER = 0.9
+
+    def __init__(self, budget=None):
+        """Start without components.
+
+        Args:
+            budget (int): Maximum bytes. Defaults to
+                :data:`settings.MEMORY_BUDGET`. None for no limit.
+        """
+        self._budget = budget
+        #: key is component name, value is :class:`_Component`
+        self._components = {}
+        self._last_check = 0
+        self._lock = Lock()
+
+    @property
+    def budget(self):
+        """Maximum bytes or None for no limit."""
+        if self._budget is None:
+            return settings.MEMORY_BUDGET
+        return self._budget
+
+    def register(self, name, component, priority=0):
+        """Account the memory of *component*.
+
+        Args:
+            name (str): Name in the usage report.
+            component: Object with ``get_nbytes``, ``evict`` and
+                ``__len__``.
+            priority (int): Components with lower priority are evicted first.
+        """
+        with self._lock:
+            self._components[name] = _Component(component, priority)
+
+    def unregister(self, name):
+        """Stop accounting component *name*."""
+        with self._lock:
+            self._components.pop(name, None)
+
+    def clear(self):
+        """Stop accounting all components."""
+        with self._lock:
+            self._components.clear()
+
+    def get_usage(self):
+        """Return bytes, items, priority and evicted bytes of each component.
+
+        Sizes are estimates (see :func:`get_size`).
+        """
+        with self._lock:
+            components = dict(self._components)
+        return {name: {'bytes': entry.component.get_nbytes(),
+                       'items': len(entry.component),
+                       'priority': entry.priority,
+                       'evicted': entry.evicted}
+                for name, entry in components.items()}
+
+    def check(self, force=False):
+        """Evict items if the total size is over the budget.
+
+        Args:
+            force (bool): Check even if the last check was less than
+                :data:`settings.MEMORY_CHECK_INTERVAL` seconds ago.
+
+        Returns:
+            int: Bytes evicted.
+        """
+        budget = self.budget
+        if budget is None:
+            return 0
+        now = time.monotonic()
+        with self._lock:
+            if not force and \
+                    now - self._last_check < settings.MEMORY_CHECK_INTERVAL:
+                return 0
+            self._last_check = now
+            sizes = [(entry.priority, -entry.component.get_nbytes(), name)
+                     for name, entry in self._components.items()]
+            total = -sum(size for _, size, _ in sizes)
+            if total <= budget:
+                return 0
+            excess = total - int(budget * self.LOW_WATER)
+            evicted = 0
+            for _, _, name in sorted(sizes):
+                entry = self._components[name]
+                freed = entry.component.evict(excess - evicted)
+                entry.evicted += freed
+                evicted += freed
+                if freed:
+                    log.debug('Evicted %d bytes of %s.', freed, name)
+                if evicted >= excess:
+                    break
+        if total - evicted > budget:
+            log.warning('Memory use of %d bytes is over the budget of %d '
+                        'bytes.', total - evicted, budget)
+        return evicted
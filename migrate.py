@@ -0,0 +1,151 @@
+"""Migrate existing RRD files to another retention profile.
+
+Stop the NApp before migrating so no updates are lost. Each file is
+recreated with the archives of the new profile, prefilled with the data of
+the old file (``rrdtool create --source``) and then replaces the old one.
+
+Usage: python -m napps.kytos.of_stats.migrate --help
+"""
+import math
+import os
+import re
+import sys
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import rrdtool
+
+from napps.kytos.of_stats import settings
+from napps.kytos.of_stats.stats import RRD
+
+
+def find_rrds(folder):
+    """Return all RRD files below *folder*, sorted."""
+    return sorted(str(path) for path in Path(folder).glob('**/*.rrd'))
+
+
+def get_data_sources(rrd):
+    """Return data source names of an RRD file in their original order."""
+    return _get_data_sources(rrdtool.info(rrd))
+
+
+def get_ds_definitions(rrd):
+    """Return the ``DS:...`` arguments to create a file like *rrd*.
+
+    Type, heartbeat, minimum and maximum of each data source are kept.
+    """
+    info = rrdtool.info(rrd)
+    definitions = []
+    for ds in _get_data_sources(info):
+        prefix = 'ds[{}].'.format(ds)
+        definitions.append('DS:{}:{}:{}:{}:{}'.format(
+            ds, info[prefix + 'type'], info[prefix + 'minimal_heartbeat'],
+            _format_limit(info[prefix + 'min']),
+            _format_limit(info[prefix + 'max'])))
+    return definitions
+
+
+def _get_data_sources(info):
+    indexes = {}
+    for key, value in info.items():
+        match = re.fullmatch(r'ds\[(.+)\]\.index', key)
+        if match:
+            indexes[match.group(1)] = value
+    return sorted(indexes, key=indexes.get)
+
+
+def _format_limit(value):
+    """Return a DS minimum or maximum, 'U' if unknown."""
+    if value is None or math.isnan(value):
+        return 'U'
+    return repr(value)
+
+
+def migrate_file(rrd, profile, consolidations, keep_backup=False):
+    """Recreate *rrd* with the archives of *profile* keeping its data.
+
+    Data source definitions, including heartbeats, are kept.
+
+    Args:
+        rrd (str): RRD file path.
+        profile (str): Retention profile name.
+        consolidations (iterable): Consolidation functions.
+        keep_backup (bool): Keep the old file with the ``.bak`` suffix.
+
+    Returns:
+        str: Error message or None if the file was migrated.
+    """
+    new_rrd = rrd + '.migrating'
+    try:
+        definitions = get_ds_definitions(rrd)
+        RRD('', ()).create_rrd(new_rrd, profile=profile,
+                               consolidations=consolidations, source=rrd,
+                               ds_definitions=definitions)
+        if keep_backup:
+            os.replace(rrd, rrd + '.bak')
+        os.replace(new_rrd, rrd)
+    except (OSError, rrdtool.OperationalError) as error:
+        if os.path.exists(new_rrd):
+            os.remove(new_rrd)
+        return str(error)
+    return None
+
+
+def migrate(folder, profile, consolidations, jobs=None, keep_backup=False):
+    """Migrate all RRD files below *folder* in parallel.
+
+    Args:
+        folder (str): Usually :data:`settings.DIR`.
+        profile (str): Retention profile name.
+        consolidations (iterable): Consolidation functions.
+        jobs (int): Number of processes. Defaults to the number of CPUs.
+        keep_backup (bool): Keep old files with the ``.bak`` suffix.
+
+    Returns:
+        dict: Error message by file path of the files not migrated.
+    """
+    rrds = find_rrds(folder)
+    n_rrds = len(rrds)
+    with ProcessPoolExecutor(jobs) as executor:
+        results = executor.map(migrate_file, rrds,
+                               [profile] * n_rrds,
+                               [consolidations] * n_rrds,
+                               [keep_backup] * n_rrds,
+                               chunksize=max(1, n_rrds // 100))
+        errors = {rrd: error for rrd, error in zip(rrds, results) if error}
+    return errors
+
+
+def main():
+    """Parse command-line arguments and migrate files."""
+    parser = ArgumentParser(
+        prog='python -m napps.kytos.of_stats.migrate',
+        description='Change the retention profile of existing RRD files.')
+    parser.add_argument('profile', choices=sorted(settings.RETENTION_PROFILES))
+    parser.add_argument('--dir', default=str(settings.DIR),
+                        help='RRD folder (default: %(default)s)')
+    parser.add_argument('--consolidations',
+                        default=','.join(settings.CONSOLIDATIONS),
+                        help='comma-separated consolidation functions '
+                             '(default: %(default)s)')
+    parser.add_argument('--jobs', type=int,
+                        help='number of processes (default: number of CPUs)')
+    parser.add_argument('--keep-backup', action='store_true',
+                        help='keep old files with the .bak suffix')
+    args = parser.parse_args()
+
+    consolidations = args.consolidations.upper().split(',')
+    errors = migrate(args.dir, args.profile, consolidations, args.jobs,
+                     args.keep_backup)
+    for rrd, error in sorted(errors.items()):
+        print('Error migrating {}: {}'.format(rrd, error), file=sys.stderr)
+    print('Migrated {} files, {} errors. Set RETENTION_PROFILE = {!r} in '
+          'settings.py for new files.'.format(
+              len(find_rrds(args.dir)) - len(errors), len(errors),
+              args.profile))
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
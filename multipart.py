@@ -0,0 +1,78 @@
+"""Reassemble stats replies that are split into several messages."""
+import time
+from threading import Lock
+
+from kytos.core import log
+
+from napps.kytos.of_stats import settings
+from napps.kytos.of_stats.memory import get_size
+
+
+class MultipartBuffer:
+    """Keep the parts of a stats reply until the last one arrives.
+
+    A big reply (e.g. a flow dump) may be split into many messages with the
+    same xid. All but the last one have the *reply more* flag set. Replies
+    are identified by switch and xid.
+    """
+
+    def __init__(self, timeout=None):
+        """Start without parts.
+
+        Args:
+            timeout (int): Seconds to wait for the last part before dropping
+                the incomplete reply. Defaults to
+                :data:`settings.MULTIPART_TIMEOUT`.
+        """
+        self._timeout = timeout or settings.MULTIPART_TIMEOUT
+        #: key is (switch id, xid), value is (tstamp, list of stats)
+        self._replies = {}
+        self._lock = Lock()
+
+    def add(self, switch_id, xid, stats, more):
+        """Store a part and return the whole reply if it is the last one.
+
+        Args:
+            switch_id (str): Switch that sent the reply.
+            xid (int): Message transaction id.
+            stats (iterable): Stats in the message body.
+            more (bool): Whether there are parts still to come.
+
+        Returns:
+            tuple: (timestamp, stats list) when the reply is complete. The
+            timestamp is the one of the first part, in seconds. ``None``
+            if more parts are expected.
+        """
+        key = (switch_id, xid)
+        now = int(time.time())
+        with self._lock:
+            self._remove_expired(now)
+            tstamp, parts = self._replies.pop(key, (now, []))
+            parts.extend(stats)
+            if more:
+                self._replies[key] = (tstamp, parts)
+                return None
+        return tstamp, parts
+
+    def _remove_expired(self, now):
+        """Drop replies whose last part did not arrive in time."""
+        expired = [key for key, (tstamp, _) in self._replies.items()
+                   if now - tstamp > self._timeout]
+        for switch_id, xid in expired:
+            self._replies.pop((switch_id, xid))
+            log.warning('Dropping incomplete stats reply %s of switch %s.',
+                        xid, switch_id)
+
+    def __len__(self):
+        """Return the number of incomplete replies."""
+        return len(self._replies)
+
+    def get_nbytes(self):
+        """Return an estimate of the bytes of the incomplete replies."""
+        with self._lock:
+            return get_size(self._replies)
+
+    @staticmethod
+    def evict(nbytes):
+        """Keep incomplete replies, which expire by themselves."""
+        return 0
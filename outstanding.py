@@ -0,0 +1,99 @@
+"""Track stats requests that were not replied yet."""
+import time
+from threading import Lock
+
+from kytos.core import log
+
+from napps.kytos.of_stats import settings
+
+
+class OutstandingRequests:
+    """Pending requests of a statistics type and reply latency by switch.
+
+    While a request is pending, the next one for the same switch and shard
+    is skipped, so a slow switch doesn't receive overlapping requests (e.g.
+    flow dumps) that would increase its load even more. A request is pending
+    until the last part of its reply arrives or it times out.
+    """
+
+    #: Weight of the newest latency in the moving average
+    LATENCY_WEIGHT = 0.2
+
+    def __init__(self, timeout=None):
+        """Start without pending requests.
+
+        Args:
+            timeout (int): Seconds to wait for a reply before sending a new
+                request. Defaults to :data:`settings.REQUEST_TIMEOUT`.
+        """
+        self._timeout = timeout or settings.REQUEST_TIMEOUT
+        #: key is (switch id, shard), value is (xid, time sent)
+        self._pending = {}
+        #: key is (switch id, xid), value is shard
+        self._shards = {}
+        #: key is switch id, value is latency moving average in seconds
+        self._latencies = {}
+        #: key is switch id, value is the number of timed out requests
+        self._timeouts = {}
+        self._lock = Lock()
+
+    def add(self, switch_id, xid, shard=0):
+        """Register a request if there is no pending one for its shard.
+
+        Args:
+            switch_id (str): Switch that will receive the request.
+            xid (int): Request transaction id.
+            shard (int): Which part of the statistics is requested.
+
+        Returns:
+            bool: Whether the request should be sent.
+        """
+        key = (switch_id, shard)
+        now = time.time()
+        with self._lock:
+            if key in self._pending:
+                old_xid, sent = self._pending[key]
+                if now - sent < self._timeout:
+                    return False
+                log.warning('Stats request %s of switch %s timed out.',
+                            old_xid, switch_id)
+                self._timeouts[switch_id] = self._timeouts.get(switch_id,
+                                                               0) + 1
+                self._shards.pop((switch_id, old_xid), None)
+            self._pending[key] = (xid, now)
+            self._shards[(switch_id, xid)] = shard
+        return True
+
+    def remove(self, switch_id, xid):
+        """Finish request *xid* and update the latency of the switch.
+
+        Args:
+            switch_id (str): Switch that sent the last reply part.
+            xid (int): Transaction id of the reply.
+
+        Returns:
+            float: Reply latency in seconds or ``None`` if the request is not
+            pending (e.g. sent by another NApp or timed out).
+        """
+        with self._lock:
+            shard = self._shards.pop((switch_id, xid), None)
+            if shard is None:
+                return None
+            _, sent = self._pending.pop((switch_id, shard))
+            latency = time.time() - sent
+            average = self._latencies.get(switch_id, latency)
+            self._latencies[switch_id] = average + self.LATENCY_WEIGHT * (
+                latency - average)
+        return latency
+
+    def is_pending(self, switch_id, shard=0):
+        """Return whether a request of *shard* was not replied yet."""
+        return (switch_id, shard) in self._pending
+
+    def get_status(self, switch_id):
+        """Return pending shards, latency average and number of timeouts."""
+        with self._lock:
+            return {'pending': sorted(shard for sw_id, shard in self._pending
+                                      if sw_id == switch_id),
+                    'latency': self._latencies.get(switch_id),
+                    'timeouts': self._timeouts.get(switch_id, 0)}
@@ -0,0 +1,138 @@
+"""Split switches among several collector instances.
+
+With :data:`settings.PARTITION_MEMBERS`, each instance polls and stores only
+the dpids it owns in a consistent-hash ring, so ingest scales with the number
+of instances and adding or removing one only moves the dpids of its slice.
+REST API requests for other dpids are redirected or proxied to their owners.
+"""
+import bisect
+import hashlib
+import json
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+from flask import Response, redirect, request
+from kytos.core import log
+
+from napps.kytos.of_stats import settings
+
+#: Header of requests routed by another instance, which are always answered
+#: locally to avoid loops if members disagree about the owner.
+ROUTED_HEADER = 'X-Of-Stats-Routed'
+#: Query argument with the same meaning, added to redirects because clients
+#: don't send custom headers to the new location.
+ROUTED_ARG = 'routed_by'
+
+
+def get_hash(key):
+    """Return a 64-bit hash of *key*, the same in every process."""
+    digest = hashlib.md5(str(key).encode()).digest()
+    return int.from_bytes(digest[:8], 'big')
+
+
+class HashRing:
+    """Consistent-hash ring of weighted members."""
+
+    #: Ring points per unit of weight
+    POINTS = 64
+
+    def __init__(self, weights):
+        """Place the points of each member in the ring.
+
+        Args:
+            weights (dict): Weight by member name. Members own slices
+                proportional to their weights, none if zero.
+        """
+        points = []
+        for name, weight in weights.items():
+            for number in range(round(self.POINTS * weight)):
+                points.append((get_hash('{}#{}'.format(name, number)), name))
+        if not points:
+            raise ValueError('No member with positive weight.')
+        points.sort()
+        self._hashes = [point[0] for point in points]
+        self._names = [point[1] for point in points]
+
+    def get_owner(self, key):
+        """Return the name of the member that owns *key*."""
+        position = bisect.bisect(self._hashes, get_hash(key))
+        return self._names[position % len(self._names)]
+
+
+class Partition:
+    """Slice of the dpids owned by this instance."""
+
+    def __init__(self, members=None, name=None):
+        """Build the ring of all members.
+
+        Args:
+            members (dict): Key is the member name. Value is a dict with the
+                base URL of its Kytos REST API (``url``, e.g.
+                ``http://10.0.0.2:8181``) and an optional ``weight`` (default
+                1). Defaults to :data:`settings.PARTITION_MEMBERS`.
+            name (str): Name of this instance in *members*. Defaults to
+                :data:`settings.PARTITION_NAME`.
+        """
+        self._members = members or settings.PARTITION_MEMBERS
+        self.name = name or settings.PARTITION_NAME
+        if self.name not in self._members:
+            raise ValueError('Partition member {} is not in {}.'.format(
+                self.name, list(self._members)))
+        self._ring = HashRing({member: options.get('weight', 1)
+                               for member, options in self._members.items()})
+        #: key is dpid, value is its owner
+        self._owners = {}
+
+    def get_owner(self, dpid):
+        """Return the name of the member that owns *dpid*."""
+        owner = self._owners.get(dpid)
+        if owner is None:
+            owner = self._owners[dpid] = self._ring.get_owner(dpid)
+        return owner
+
+    def owns(self, dpid):
+        """Return whether this instance polls and stores *dpid*.
+
+        Also used for rollups, whose owner is given by their id.
+        """
+        return self.get_owner(dpid) == self.name
+
+    def is_local(self, dpid):
+        """Return whether the current request for *dpid* is answered here."""
+        return (self.owns(dpid) or ROUTED_HEADER in request.headers
+                or ROUTED_ARG in request.args)
+
+    def route(self, dpid):
+        """Return a response for *dpid* from its owner.
+
+        Depending on :data:`settings.PARTITION_ROUTING`, it is a temporary
+        redirect (307) or the proxied response of the owner. Redirects add
+        :data:`ROUTED_ARG` to the query, so they are not redirected again.
+        """
+        url = self._members[self.get_owner(dpid)]['url'].rstrip('/')
+        url += request.full_path.rstrip('?')
+        if settings.PARTITION_ROUTING == 'redirect':
+            url += '&' if request.query_string else '?'
+            url += urlencode({ROUTED_ARG: self.name})
+            return redirect(url, code=307)
+        return self._proxy(url)
+
+    def _proxy(self, url):
+        """Return the response of the owner for *url*."""
+        proxied = Request(url, headers={ROUTED_HEADER: self.name})
+        try:
+            with urlopen(proxied,
+                         timeout=settings.PARTITION_PROXY_TIMEOUT) as reply:
+                return Response(reply.read(), status=reply.status,
+                                content_type=reply.headers['Content-Type'])
+        except HTTPError as error:
+            return Response(error.read(), status=error.code,
+                            content_type=error.headers['Content-Type'])
+        except (URLError, OSError) as error:
+            log.warning('Error proxying %s: %s', url, error)
+            data = {'errors': {'status': '502',
+                               'title': 'Partition member not available.',
+                               'detail': str(error)}}
+            return Response(json.dumps(data, sort_keys=True, indent=4),
+                            status=502, mimetype='application/json')
@@ -0,0 +1,230 @@
+"""Aggregated series of several ports computed at ingest.
+
+Switch totals, links and user-defined groups of ports are stored as their own
+RRD series, so charting them is a single fetch instead of one per port.
+"""
+import hashlib
+import time
+from threading import Lock
+
+from kytos.core import log
+
+from napps.kytos.of_stats import settings
+from napps.kytos.of_stats.memory import get_size
+
+#: OFPP_LOCAL of OpenFlow 1.0 and 1.3, not counted in switch totals.
+LOCAL_PORTS = (0xfffe, 0xfffffffe)
+
+#: Rollup kinds, also the first part of their RRD index.
+KINDS = ('switches', 'links', 'groups')
+
+
+class RollupStore:
+    """Keep switch, link and port group totals of port counters.
+
+    Each rollup is a monotonic counter that accumulates the increments of its
+    member ports. Thus, rates are correct even if a member counter is reset,
+    a port is added or members are polled at different times. Timestamps are
+    those of the switch replies: the totals are written with the timestamp of
+    the first reply that changed them, when a reply with a newer timestamp
+    arrives. Replies of other members with older or equal timestamps are
+    added to the same row.
+
+    A link is identified by its interface ids. ``tx_*`` is the direction from
+    the lowest interface id (endpoint A) to the other one (endpoint B) and
+    ``rx_*`` the opposite. Bytes are counted at endpoint A only, while drops
+    and errors are summed from both endpoints.
+    """
+
+    def __init__(self, rrd):
+        """Store rollups in *rrd*, which has the port data sources.
+
+        Args:
+            rrd (RRD): Database for the rollups.
+        """
+        self.rrd = rrd
+        #: key is (dpid, port), value is the last counters of the port
+        self._counters = {}
+        #: key is (kind, rollup id), value is the total of each data source
+        self._totals = {}
+        #: key is (kind, rollup id), value is the timestamp of the totals not
+        #: written yet
+        self._pending = {}
+        #: key is (kind, rollup id), value is a set of member interface ids
+        self._members = {}
+        #: With partitioned collection, tells whether this instance owns a
+        #: dpid or group name. Links are owned by the owner of endpoint A.
+        self.owns = None
+        #: Whether writer processes confirmed the updates submitted before
+        #: totals were first loaded
+        self._synced = False
+        self._lock = Lock()
+
+    def update(self, switch, ports_stats, tstamp=None):
+        """Add the increments of the ports of *switch* and write rollups.
+
+        Args:
+            switch (Switch): Switch that sent the stats.
+            ports_stats (iterable): Port stats of the reply.
+            tstamp (int): Unix timestamp in seconds. Defaults to now.
+        """
+        if tstamp is None:
+            tstamp = int(time.time())
+        groups = self._get_port_groups()
+        writes = []
+        with self._lock:
+            for ps in ports_stats:
+                port_no = ps.port_no.value
+                deltas = self._get_deltas(switch.id, port_no, ps)
+                for key, swap in self._get_rollups(switch, port_no, groups):
+                    writes.extend(self._get_writes(key, tstamp))
+                    self._add(key, deltas, swap)
+                    self._members[key].add('{}:{}'.format(switch.id,
+                                                          port_no))
+        self._write(writes)
+
+    def flush(self):
+        """Write all totals not written yet."""
+        with self._lock:
+            writes = [(key, self._pending.pop(key), dict(self._totals[key]))
+                      for key in list(self._pending)]
+        self._write(writes)
+
+    def get_rollups(self):
+        """Return all rollups seen since the start, sorted by kind and id."""
+        with self._lock:
+            return [{'kind': kind, 'id': rollup_id,
+                     'members': sorted(self._members[(kind, rollup_id)])}
+                    for kind, rollup_id in sorted(self._members)]
+
+    def __len__(self):
+        """Return the number of rollups."""
+        return len(self._totals)
+
+    def get_nbytes(self):
+        """Return an estimate of the bytes of counters and totals."""
+        with self._lock:
+            return sum(get_size(dct) for dct in (
+                self._counters, self._totals, self._pending, self._members))
+
+    @staticmethod
+    def evict(nbytes):
+        """Keep all counters, needed to add the next increments."""
+        return 0
+
+    @staticmethod
+    def get_link_id(iface_a, iface_b):
+        """Return a link id that doesn't change among restarts.
+
+        Args:
+            iface_a (str): Interface id (dpid:port) of one endpoint.
+            iface_b (str): Interface id of the other endpoint.
+        """
+        ids = '-'.join(sorted((iface_a, iface_b)))
+        return hashlib.md5(ids.encode()).hexdigest()
+
+    def _write(self, writes):
+        for key, tstamp, totals in writes:
+            self.rrd.update(key, tstamp, **totals)
+
+    def _get_writes(self, key, tstamp):
+        """Return the pending write of *key* if *tstamp* is newer.
+
+        Replies of other switches may still have the pending timestamp, so
+        the totals are written only when a newer reply arrives. Replies with
+        older timestamps are added to the pending write.
+        """
+        pending = self._pending.get(key)
+        if pending is None or pending >= tstamp:
+            self._pending[key] = pending or tstamp
+            return []
+        self._pending[key] = tstamp
+        return [(key, pending, dict(self._totals[key]))]
+
+    def _get_deltas(self, dpid, port_no, port_stats):
+        """Return counter increments since the previous reply.
+
+        The first reply of a port is the baseline and a decrease means the
+        counter was reset, so the new value is the increment.
+        """
+        current = {ds: getattr(port_stats, ds).value
+                   for ds in self.rrd.data_sources}
+        previous = self._counters.get((dpid, port_no))
+        self._counters[(dpid, port_no)] = current
+        if previous is None:
+            return dict.fromkeys(current, 0)
+        return {ds: value - previous[ds] if value >= previous[ds] else value
+                for ds, value in current.items()}
+
+    def _get_rollups(self, switch, port_no, groups):
+        """Yield (rollup key, whether to swap rx and tx) of a port."""
+        if port_no not in LOCAL_PORTS:
+            yield ('switches', switch.id), False
+        iface = switch.get_interface_by_port_no(port_no)
+        link = getattr(iface, 'link', None)
+        if link is not None:
+            endpoint_a, endpoint_b = sorted((link.endpoint_a,
+                                             link.endpoint_b),
+                                            key=lambda endpoint: endpoint.id)
+            if self._owns(endpoint_a.switch.id):
+                link_id = self.get_link_id(endpoint_a.id, endpoint_b.id)
+                yield ('links', link_id), iface.id != endpoint_a.id
+        for name in groups.get((switch.id, port_no), ()):
+            if self._owns(name):
+                yield ('groups', name), False
+
+    def _owns(self, key):
+        return self.owns is None or self.owns(key)
+
+    def _add(self, key, deltas, swap):
+        """Add *deltas* to the totals of rollup *key*.
+
+        Args:
+            key (tuple): Rollup kind and id.
+            deltas (dict): Increment of each data source.
+            swap (bool): Whether the port is link endpoint B. Its rx is the
+                link tx and vice-versa. Its bytes are not counted.
+        """
+        if key not in self._totals:
+            self._totals[key] = self._load_totals(key)
+            self._members[key] = set()
+        totals = self._totals[key]
+        for ds, delta in deltas.items():
+            if swap:
+                if ds.endswith('bytes'):
+                    continue
+                ds = ('tx' if ds.startswith('rx') else 'rx') + ds[2:]
+            totals[ds] += delta
+
+    def _load_totals(self, key):
+        """Continue from the last written values to avoid counter resets.
+
+        Updates sent to writer processes before (e.g. replayed from the
+        journal) are confirmed first. Otherwise, the last update of the file
+        may be older and the totals would decrease.
+        """
+        if not self._synced:
+            self._sync_writers()
+            self._synced = True
+        last = self.rrd.fetch_last_update(key)
+        return {ds: int(last.get(ds) or 0) for ds in self.rrd.data_sources}
+
+    def _sync_writers(self):
+        """Wait for writer processes to write the updates submitted so far."""
+        writers = self.rrd.writers
+        if writers is None:
+            return
+        written = writers.get_sync(writers.sync(),
+                                   settings.ROLLUP_SYNC_TIMEOUT)
+        if not written:
+            log.warning('Rollup totals may restart from older values: writer '
+                        'processes did not confirm previous updates.')
+
+    @staticmethod
+    def _get_port_groups():
+        """Return group names by (dpid, port) from settings."""
+        groups = {}
+        for name, ports in settings.PORT_GROUPS.items():
+            for dpid, port_no in ports:
+                groups.setdefault((dpid, port_no), []).append(name)
+        return groups
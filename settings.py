@@ -10,6 +10,142 @@ STATS_INTERVAL = 60
 #: Avoid segmentation fault
 rrd_lock = Lock()
 
+#: Seconds to wait for the last part of a multipart stats reply. Incomplete
+#: replies are dropped after that.
+MULTIPART_TIMEOUT = STATS_INTERVAL
+
+#: Seconds to wait for a stats reply. Meanwhile, new requests of the same
+#: type (and shard) are not sent to the switch.
+REQUEST_TIMEOUT = 2 * STATS_INTERVAL
+
+#: Number of processes that write RRD files. Each one owns a partition of the
+#: dpids. With 0, files are written by the controller process. Processes are
+#: spawned, not forked, and get the RRD settings (``writers.WORKER_SETTINGS``)
+#: when they start.
+WRITER_PROCESSES = 0
+
+#: Whether RRD updates are appended to a journal (``journal`` in :data:`DIR`)
+#: and written to RRD files later, in batches. Updates not written before a
+#: crash are replayed at setup. Latest values in the REST API may lag up to
+#: :data:`JOURNAL_FLUSH_INTERVAL`.
+JOURNAL = False
+
+#: Maximum size in bytes of a journal segment file.
+JOURNAL_SEGMENT_SIZE = 16 * 2 ** 20
+
+#: Journaled updates are written when there are this many of them...
+JOURNAL_BATCH_SIZE = 100_000
+
+#: ...or after this many seconds since the last write.
+JOURNAL_FLUSH_INTERVAL = 5 * STATS_INTERVAL
+
+#: Seconds between fsync calls of the journal. Without fsync (None), records
+#: survive a controller crash, but not a host crash.
+JOURNAL_SYNC_INTERVAL = 1
+
+#: Seconds to wait, when the NApp stops, for writer processes to confirm
+#: journaled updates. Segments not confirmed are replayed at the next setup.
+JOURNAL_CONFIRM_TIMEOUT = 60
+
+#: Collector instances that split the switches among them. Key is the
+#: instance name and value has the base URL of its Kytos REST API and an
+#: optional weight (default 1). Example:
+#: ``{'a': {'url': 'http://10.0.0.1:8181'},
+#: 'b': {'url': 'http://10.0.0.2:8181', 'weight': 2}}``.
+#: Each instance polls and stores only the dpids it owns in a
+#: consistent-hash ring. Empty to poll all switches.
+PARTITION_MEMBERS = {}
+
+#: Name of this instance in :data:`PARTITION_MEMBERS`.
+PARTITION_NAME = None
+
+#: How REST API requests for dpids of other instances are answered:
+#: 'redirect' (HTTP 307 to the owner) or 'proxy'.
+PARTITION_ROUTING = 'redirect'
+
+#: Seconds to wait for the owner of a proxied request.
+PARTITION_PROXY_TIMEOUT = 10
+
+#: Threads that fetch the latest values of the ports and flows listed by the
+#: REST API. With 0, each request fetches them sequentially.
+API_WORKERS = 8
+
+#: Seconds a list request waits for latest values. Items not fetched by then
+#: are returned with null values and marked stale.
+API_DEADLINE = 5
+
+#: Seconds between updates of the last time a series was seen in the catalog
+#: (``catalog.sqlite`` in :data:`DIR`).
+CATALOG_TOUCH_INTERVAL = 10 * STATS_INTERVAL
+
+#: Groups of ports whose traffic is summed into a single series. Key is the
+#: group name and value is a list of (dpid, port number). Example:
+#: ``{'uplinks': [('00:00:00:00:00:00:00:01', 1),
+#: ('00:00:00:00:00:00:00:02', 1)]}``
+PORT_GROUPS = {}
+
+#: Seconds to wait, when rollups are first updated, for writer processes to
+#: confirm the updates submitted so far (e.g. replayed from the journal).
+#: Totals continue from the last values in the RRD files.
+ROLLUP_SYNC_TIMEOUT = 30
+
+# Flow polling
+
+#: How flow stats are requested:
+#:
+#: - 'all': all flows of all tables at once;
+#: - 'table': one request per table in :data:`FLOW_SHARD_TABLES`;
+#: - 'cookie': one request per (cookie, mask) in :data:`FLOW_SHARD_COOKIES`
+#:   (OpenFlow 1.3 only, OpenFlow 1.0 switches get all flows at once).
+#:
+#: Shards are requested round-robin along :data:`STATS_INTERVAL` so the
+#: switch doesn't dump its whole flow table in one burst. All shards of the
+#: same cycle are stored with the timestamp of the cycle start.
+FLOW_POLLING = 'all'
+
+#: Table ids for 'table' flow polling.
+FLOW_SHARD_TABLES = (0,)
+
+#: (cookie, cookie mask) pairs for 'cookie' flow polling.
+FLOW_SHARD_COOKIES = ((0, 0),)
+
+#: Maximum number of memoized flow ids. Ids of flows not in the cache are
+#: calculated by of_core, which is much slower.
+FLOW_ID_CACHE_SIZE = 200_000
+
+#: Which flows are stored at each polling cycle:
+#:
+#: - 'all': every flow;
+#: - 'heavy_hitters': the :data:`HEAVY_HITTERS` flows of each switch with the
+#:   highest byte rates and new flows. The other ones are stored every
+#:   :data:`FLOW_TAIL_INTERVAL` seconds and summed into flow id 'tail'.
+FLOW_SAMPLING = 'all'
+
+#: Number of flows of each switch stored every cycle with 'heavy_hitters'
+#: flow sampling.
+HEAVY_HITTERS = 500
+
+#: Seconds between writes of each flow out of the heavy hitters. With 0, they
+#: are only stored in the 'tail' aggregate.
+FLOW_TAIL_INTERVAL = 10 * STATS_INTERVAL
+
+#: Heartbeat of new flow RRDs. With 'heavy_hitters' flow sampling, it is at
+#: least ``FLOW_TAIL_INTERVAL + TIMEOUT`` so rates between writes of tail
+#: flows are interpolated instead of unknown.
+FLOW_TIMEOUT = 2 * STATS_INTERVAL
+
+# Port summaries
+
+#: Relative error of the percentiles in port summaries.
+SUMMARY_ACCURACY = 0.01
+
+#: Time constant in seconds of the exponentially weighted moving average
+#: (EWMA) of port rates.
+SUMMARY_EWMA_WINDOW = 5 * STATS_INTERVAL
+
+#: Seconds between saves of the summaries of a switch.
+SUMMARY_SAVE_INTERVAL = 5 * STATS_INTERVAL
+
 # RRD Tool Settings
 
 DIR = Path(__file__).resolve().parent / 'rrd'
@@ -35,3 +171,40 @@ XFF = '0.5'
 # d (days), w (weeks), M (months), and y (years).
 # Must be a multiple of consolidation steps.
 PERIOD = '30d'
+
+#: Retention profiles. Each one is a list of (consolidation step, how long to
+#: keep) archives. Same units as :data:`PERIOD`.
+RETENTION_PROFILES = {
+    # One month for each step
+    'legacy': [(step, PERIOD) for step in (
+        '1m', '2m', '4m', '8m', '15m', '30m', '1h', '2h', '4h', '8h', '12h',
+        '1d', '2d', '3d', '6d', '10d', '15d')],
+    # Fewer and longer archives, for smaller files and faster updates
+    'tiered': [('1m', '2d'), ('1h', '90d'), ('1d', '2y')],
+}
+
+#: Retention profile of new RRDs. Use the migration tool to change existing
+#: ones: python -m napps.kytos.of_stats.migrate --help
+RETENTION_PROFILE = 'legacy'
+
+#: Consolidation functions of each archive. AVERAGE is used by the REST API.
+#: MIN and MAX are optional.
+CONSOLIDATIONS = ('AVERAGE',)
+
+#: Seconds of the latest port statistics kept in memory at full resolution.
+#: REST API requests within this window don't read RRD files. Each hour
+#: takes about 3 KB per port. 0 to disable.
+HOT_WINDOW = 3600
+
+#: Same as :data:`HOT_WINDOW` for flow statistics (about 1 KB per flow and
+#: hour).
+FLOW_HOT_WINDOW = 0
+
+#: Maximum bytes of the caches and buffers of the NApp (latest values, hot
+#: windows, flow ids, journal, etc.). Least recently used items are evicted
+#: above it, caches first. None for no limit.
+MEMORY_BUDGET = 2 ** 30
+
+#: Minimum seconds between checks of :data:`MEMORY_BUDGET`, which run after
+#: stats replies.
+MEMORY_CHECK_INTERVAL = 1
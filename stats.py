@@ -1,23 +1,29 @@
 """Module with Classes to handle statistics."""
 import time
 from abc import ABCMeta, abstractmethod
+from collections import OrderedDict
+from contextlib import contextmanager
 from pathlib import Path
+from threading import Lock
 
-import pyof.v0x01.controller2switch.common as v0x01
-import rrdtool
 from kytos.core import KytosEvent, log
-from napps.kytos.of_core.flow import PortStats as OFCorePortStats
-# v0x01 and v0x04 PortStats are version independent
-from napps.kytos.of_core.flow import FlowFactory
-# Disable warning about ungrouped pyof imports due to isort
-from pyof.v0x01.common.phy_port import Port  # pylint: disable=C0412
-from pyof.v0x01.controller2switch.common import AggregateStatsRequest
-from pyof.v0x01.controller2switch.stats_request import StatsRequest, StatsType
-from pyof.v0x04.controller2switch import multipart_request as v0x04
-from pyof.v0x04.controller2switch.common import MultipartType
-from pyof.v0x04.controller2switch.multipart_request import MultipartRequest
 
 from . import settings
+from .catalog import Catalog
+from .flow_index import PortFlowIndex
+from .flow_sample import FlowIdCache
+from .heavy_hitters import HeavyHitterSampler, get_flow_timeout
+from .lazy import LazyModule
+from .memory import MemoryBudget, evict_items, get_size
+from .outstanding import OutstandingRequests
+from .rollups import RollupStore
+from .summary import SummaryStore
+
+# Slow imports not needed before the first request or reply. pyof modules are
+# imported inside the methods that build requests.
+rrdtool = LazyModule('rrdtool')
+# v0x01 and v0x04 PortStats are version independent
+of_core_flow = LazyModule('napps.kytos.of_core.flow')
 
 
 class Stats(metaclass=ABCMeta):
@@ -25,6 +31,15 @@ class Stats(metaclass=ABCMeta):
 
     rrd = None
 
+    #: Catalog of all series, shared by all statistics types
+    catalog = Catalog()
+    #: Accounts the memory of caches and buffers and keeps it under budget
+    memory = MemoryBudget()
+
+    #: Number of requests along :data:`settings.STATS_INTERVAL`, each one
+    #: asking for a different part of the statistics.
+    slots = 1
+
     def __init__(self, msg_out_buffer):
         """Store a reference to the controller's msg_out buffer.
 
@@ -32,22 +47,61 @@ class Stats(metaclass=ABCMeta):
             msg_out_buffer: Where to send events.
         """
         self._buffer = msg_out_buffer
+        #: Requests not replied yet
+        self.outstanding = OutstandingRequests()
 
     @abstractmethod
-    def request(self, conn):
-        """Request statistics."""
+    def request(self, conn, slot=0):
+        """Request statistics.
+
+        Args:
+            conn: Switch connection.
+            slot (int): Which part of the statistics to request, from 0 to
+                ``slots - 1``.
+        """
         pass
 
     @abstractmethod
-    def listen(self, switch, stats):
-        """Listen statistic replies."""
+    def listen(self, switch, stats, tstamp=None, live=True):
+        """Listen statistic replies.
+
+        Args:
+            switch (Switch): Switch that sent the reply.
+            stats (iterable): All stats of the reply, even if it was split
+                into several messages.
+            tstamp (int): Unix timestamp in seconds for all the stats.
+                Defaults to now.
+            live (bool): Whether the reply was just received. Aggregates of
+                the current traffic, like summaries and rollups, are not
+                updated when replaying recorded replies.
+        """
         pass
 
-    def _send_event(self, req, conn):
+    def get_tstamp(self, xid, tstamp):  # pylint: disable=unused-argument
+        """Return the timestamp for the stats of the reply *xid*.
+
+        Args:
+            xid (int): Transaction id of the reply.
+            tstamp (int): Default timestamp.
+        """
+        return tstamp
+
+    def _send_event(self, req, conn, slot=0):
+        """Send a request unless the previous one is still pending.
+
+        Returns:
+            bool: Whether the request was sent.
+        """
+        if not self.outstanding.add(conn.switch.id, req.header.xid, slot):
+            log.debug('Skipping %s request for switch %s, the previous one'
+                      ' was not replied yet.', type(self).__name__,
+                      conn.switch.id)
+            return False
         event = KytosEvent(
             name='kytos/of_stats.messages.out.ofpt_stats_request',
             content={'message': req, 'destination': conn})
         self._buffer.put(event)
+        return True
 
 
 class RRD:
@@ -56,16 +110,71 @@ class RRD:
     It store statistics every :data:`STATS_INTERVAL`.
     """
 
-    def __init__(self, app_folder, data_sources):
+    #: :class:`~.writers.WriterPool` to write in other processes. If None,
+    #: write in this process.
+    writers = None
+
+    #: :class:`~.journal.Journal` that records updates to write them later in
+    #: batches. If None, updates are written right away.
+    journal = None
+
+    def __init__(self, app_folder, data_sources, timeout=None):
         """Specify a folder to store RRDs.
 
         Args:
             app_folder (str): Parent folder for dpids folders.
             data_sources (iterable): Data source names (e.g. tx_bytes,
                 rx_bytes).
+            timeout (int): Heartbeat of the data sources of new RRDs.
+                Defaults to :data:`settings.TIMEOUT`.
         """
         self._app = app_folder
         self._ds = data_sources
+        self._timeout = timeout
+        #: :class:`~.hot_window.HotWindow` with the latest rows of all
+        #: series. If None, all rows are read from disk.
+        self.hot = None
+        #: Paths of files known to exist
+        self._known = set()
+        #: key is path, value is (time cached, :meth:`fetch_latest` result),
+        #: least recently used first. The result is None if an update of the
+        #: given time was sent to :attr:`writers` and may not be written yet.
+        self._latest = OrderedDict()
+        #: key is path, value is a token of a fetch in progress, removed if
+        #: the file is written meanwhile
+        self._fetching = {}
+        #: Guards :attr:`_known`, :attr:`_latest` and :attr:`_fetching`, also
+        #: used by REST API threads and memory checks
+        self._lock = Lock()
+
+    @classmethod
+    @contextmanager
+    def batch(cls):
+        """Send the updates of the block to :attr:`writers` at its end.
+
+        See :meth:`.WriterPool.batch`. Without writer processes, updates are
+        handled as usual.
+        """
+        if cls.writers is None:
+            yield
+        else:
+            with cls.writers.batch():
+                yield
+
+    @property
+    def app(self):
+        """Parent folder for dpids folders."""
+        return self._app
+
+    @property
+    def data_sources(self):
+        """Data source names."""
+        return self._ds
+
+    @property
+    def timeout(self):
+        """Seconds without updates before values become unknown."""
+        return self._timeout or settings.TIMEOUT
 
     def update(self, index, tstamp=None, **ds_values):
         """Add a row to rrd file of *dpid* and *_id*.
@@ -76,14 +185,60 @@ class RRD:
                 [dpid], [dpid, port_no], [dpid, table id, flow hash].
             tstamp (str, int): Unix timestamp in seconds. Defaults to now.
 
-        Create rrd if necessary.
+        Create rrd if necessary. If :attr:`journal` is set, the update is
+        written later along with other ones. If :attr:`writers` is set, the
+        update is written later by a worker process. Cached latest values are
+        discarded when the update is written.
         """
+        if self.hot is not None:
+            self.hot.update(index, tstamp, **ds_values)
+        if self.journal is not None:
+            self.journal.append(self, index, tstamp, **ds_values)
+            return
+        if self.writers is not None:
+            self.writers.submit(self, index, tstamp, **ds_values)
+            return
         if tstamp is None:
             tstamp = 'N'
-        rrd = self.get_or_create_rrd(index)
+            rrd = self.get_or_create_rrd(index)
+        else:
+            # RRD start must be older than the first update
+            rrd = self.get_or_create_rrd(index, int(tstamp) - 1)
         data = ':'.join(str(ds_values[ds]) for ds in self._ds)
         with settings.rrd_lock:
             rrdtool.update(rrd, '{}:{}'.format(tstamp, data))
+        self._uncache(rrd)
+
+    def update_many(self, index, rows, batch_size=1000):
+        """Add several rows to an RRD with few rrdtool calls.
+
+        Rows not newer than the last update of the file are skipped because
+        RRD only accepts increasing timestamps.
+
+        Args:
+            index (list of str): Index for the RRD database.
+            rows (iterable): (Unix timestamp in seconds, dict of data source
+                values) tuples.
+            batch_size (int): Maximum number of rows of an rrdtool call.
+        """
+        rows = sorted(rows, key=lambda row: row[0])
+        if not rows:
+            return
+        rrd = self.get_or_create_rrd(index, int(rows[0][0]) - 1)
+        with settings.rrd_lock:
+            last = rrdtool.last(rrd)
+        # Only the last row of a timestamp is kept
+        values = {}
+        for tstamp, ds_values in rows:
+            if tstamp > last:
+                values[int(tstamp)] = ':'.join(str(ds_values[ds])
+                                               for ds in self._ds)
+        args = ['{}:{}'.format(tstamp, data) for tstamp, data in
+                values.items()]
+        for start in range(0, len(args), batch_size):
+            with settings.rrd_lock:
+                rrdtool.update(rrd, *args[start:start + batch_size])
+        self._uncache(rrd)
 
     def get_rrd(self, index):
         """Return path of the RRD file for *dpid* with *basename*.
@@ -120,6 +275,8 @@ class RRD:
             tstamp = 'N'
 
         rrd = self.get_rrd(index)
+        if rrd in self._known:
+            return rrd
         if not Path(rrd).exists():
             log.debug('Creating rrd for app %s, index %s.', self._app, index)
             parent = Path(rrd).parent
@@ -127,27 +284,44 @@ class RRD:
                 # We may have concurrency problems creating a folder
                 parent.mkdir(parents=True, exist_ok=True)
             self.create_rrd(rrd, tstamp)
+        with self._lock:
+            self._known.add(rrd)
         return rrd
 
-    def create_rrd(self, rrd, tstamp=None):
+    def create_rrd(self, rrd, tstamp=None, profile=None, consolidations=None,
+                   source=None, ds_definitions=None):
         """Create an RRD file.
 
         Args:
             rrd (str): Path of RRD file to be created.
             tstamp (str, int): Unix timestamp in seconds for RRD creation.
-                Defaults to now.
+                Defaults to now or, if *source* is given, to its last update.
+            profile (str): Retention profile name. Defaults to
+                :data:`settings.RETENTION_PROFILE`.
+            consolidations (iterable): Consolidation functions. Defaults to
+                :data:`settings.CONSOLIDATIONS`.
+            source (str): Path of an existing RRD file to prefill the new one
+                with its data.
+            ds_definitions (list): ``DS:...`` arguments of rrdtool create,
+                e.g. the ones of *source*. Defaults to COUNTER data sources
+                with :attr:`timeout` as heartbeat.
         """
         def get_counter(ds):
             """Return a DS for rrd creation."""
-            return 'DS:{}:COUNTER:{}:{}:{}'.format(ds, settings.TIMEOUT,
+            return 'DS:{}:COUNTER:{}:{}:{}'.format(ds, self.timeout,
                                                    settings.MIN, settings.MAX)
 
-        if tstamp is None:
-            tstamp = 'N'
-        options = [rrd, '--start', str(tstamp), '--step',
-                   str(settings.STATS_INTERVAL)]
-        options.extend([get_counter(ds) for ds in self._ds])
-        options.extend(self._get_archives())
+        options = [rrd, '--step', str(settings.STATS_INTERVAL)]
+        if source is not None:
+            options.extend(['--source', source])
+        if tstamp is not None:
+            options.extend(['--start', str(tstamp)])
+        elif source is None:
+            options.extend(['--start', 'N'])
+        if ds_definitions is None:
+            ds_definitions = [get_counter(ds) for ds in self._ds]
+        options.extend(ds_definitions)
+        options.extend(self._get_archives(profile, consolidations))
         with settings.rrd_lock:
             rrdtool.create(*options)
 
@@ -176,22 +350,34 @@ class RRD:
 
         """
         rrd = self.get_rrd(index)
-        if not Path(rrd).exists():
-            msg = 'RRD for app {} and index {} not found'.format(self._app,
-                                                                 index)
-            raise FileNotFoundError(msg)
+        exists = Path(rrd).exists()
+        if not exists and (self.hot is None or index not in self.hot
+                           or start == 'first'):
+            self._raise_not_found(index)
 
         # Use integers to calculate resolution
         start, end = self._calc_start_end(start, end, n_points, rrd)
 
         # Find the best matching resolution for returning n_points.
         res_args = []
+        resolution = 0
         if n_points is not None and isinstance(start, int) \
                 and isinstance(end, int):
             resolution = (end - start) // n_points
             if resolution > 0:
                 res_args.extend(['-a', '-r', '{}s'.format(resolution)])
 
+        # Full resolution rows may be in memory
+        if self.hot is not None and isinstance(start, int) \
+                and isinstance(end, int) \
+                and resolution <= settings.STATS_INTERVAL:
+            fetched = self._fetch_hot(rrd, index, start, end, exists)
+            if fetched is not None:
+                return fetched
+        # Memory could not answer
+        if not exists:
+            self._raise_not_found(index)
+
         args = [rrd, 'AVERAGE', '--start', str(start), '--end', str(end)]
         args.extend(res_args)
         with settings.rrd_lock:
@@ -200,6 +386,44 @@ class RRD:
         # rrdtool range is different from Python's.
         return range(start + step, stop + 1, step), cols, rows
 
+    def _raise_not_found(self, index):
+        """Raise FileNotFoundError for a missing RRD file.
+
+        The file is not known to exist anymore (e.g. it was deleted).
+        """
+        with self._lock:
+            self._known.discard(self.get_rrd(index))
+        msg = 'RRD for app {} and index {} not found'.format(self._app, index)
+        raise FileNotFoundError(msg)
+
+    def _fetch_hot(self, rrd, index, start, end, exists):
+        """Return the rows of :attr:`hot` and older ones from disk.
+
+        Return None if the range is not in memory or if the older rows
+        are not at full resolution on disk.
+        """
+        hot = self.hot.fetch(index, start, end)
+        if hot is None:
+            return None
+        tstamps, rows = hot
+        step = self.hot.step
+        first = start - start % step + step
+        n_old = (tstamps.start - first) // step
+        if n_old == 0:
+            return tstamps, tuple(self._ds), rows
+        if not exists:
+            old_rows = [(None,) * len(self._ds)] * n_old
+            return (range(first, tstamps.stop, step), tuple(self._ds),
+                    old_rows + rows)
+        args = [rrd, 'AVERAGE', '--start', str(start), '--end',
+                str(tstamps.start - step)]
+        with settings.rrd_lock:
+            (old_start, _, old_step), cols, old_rows = rrdtool.fetch(*args)
+        if old_step != step or old_start + step != first:
+            return None
+        return (range(first, tstamps.stop, step), cols,
+                list(old_rows[:n_old]) + rows)
+
     @staticmethod
     def _calc_start_end(start, end, n_points, rrd):
         """Calculate start and end values for fetch command."""
@@ -223,8 +447,56 @@ class RRD:
     def fetch_latest(self, index):
         """Fetch only the value for now.
 
-        Return zero values if there are no values recorded.
+        Return zero values if there are no values recorded. Results are
+        cached until the next write of the file or for
+        :data:`settings.STATS_INTERVAL`. They are not cached while an update
+        sent to :attr:`writers` is not written.
+        """
+        rrd = self.get_rrd(index)
+        now = time.time()
+        with self._lock:
+            # Popped and added again to be the most recently used
+            cached = self._latest.pop(rrd, None)
+            if cached is not None:
+                self._latest[rrd] = cached
+                if cached[1] is not None and \
+                        now - cached[0] < settings.STATS_INTERVAL:
+                    return dict(cached[1])
+            token = self._fetching[rrd] = object()
+        latest = self._fetch_latest(index)
+        # Written by a worker process?
+        written = cached is None or cached[1] is not None or \
+            self._get_last(rrd) >= cached[0]
+        with self._lock:
+            if self._fetching.get(rrd) is token:
+                del self._fetching[rrd]
+                if written:
+                    self._latest[rrd] = (now, latest)
+        return dict(latest)
+
+    def expect_update(self, index, tstamp):
+        """Don't cache latest values until an update of *tstamp* is written.
+
+        Called when the update is sent to another process.
+
+        Args:
+            index (list of str): Index for the RRD database.
+            tstamp (int): Unix timestamp in seconds of the update.
         """
+        rrd = self.get_rrd(index)
+        with self._lock:
+            self._latest.pop(rrd, None)
+            self._latest[rrd] = (int(tstamp), None)
+            self._fetching.pop(rrd, None)
+
+    def _get_last(self, rrd):
+        """Return the time of the last update of *rrd*, 0 if not created."""
+        if not Path(rrd).exists():
+            return 0
+        with settings.rrd_lock:
+            return rrdtool.last(rrd)
+
+    def _fetch_latest(self, index):
         start = 'end-{}s'.format(settings.STATS_INTERVAL * 3)  # two rows
         try:
             tstamps, cols, rows = self.fetch(index, start, end='now')
@@ -243,17 +515,88 @@ class RRD:
             latest = [0] * len(cols)
         return {k: v for k, v in zip(cols, latest)}
 
-    @classmethod
-    def _get_archives(cls):
-        """Averaged for all Data Sources."""
-        averages = []
-        # One month stats for the following periods:
-        for steps in ('1m', '2m', '4m', '8m', '15m', '30m', '1h', '2h', '4h'
-                      '8h', '12h', '1d', '2d', '3d', '6d', '10d', '15d'):
-            averages.append('RRA:AVERAGE:{}:{}:{}'.format(settings.XFF, steps,
-                                                          settings.PERIOD))
-        # averages = ['RRA:AVERAGE:0:1:1d']  # More samples for testing
-        return averages
+    def fetch_last_update(self, index):
+        """Return the last values given to :meth:`update`.
+
+        Return an empty dict if there is no RRD for *index*.
+        """
+        rrd = self.get_rrd(index)
+        if not Path(rrd).exists():
+            return {}
+        with settings.rrd_lock:
+            return rrdtool.lastupdate(rrd)['ds']
+
+    def warm_up(self):
+        """Index existing RRD files and cache their latest values.
+
+        After a restart, it avoids opening cold files in the first updates
+        and API requests. It is meant to run in the background: rrdtool is
+        locked for one file at a time and other threads run between files.
+        """
+        folder = settings.DIR / self._app
+        rrds = sorted(folder.glob('**/*.rrd'))
+        with self._lock:
+            self._known.update(str(rrd) for rrd in rrds)
+        for rrd in rrds:
+            index = rrd.relative_to(folder).with_suffix('').parts
+            self.fetch_latest(index)
+            # Let ingest and API threads take the rrdtool lock
+            time.sleep(0)
+
+    def get_nbytes(self):
+        """Return an estimate of the bytes of latest values and known files."""
+        with self._lock:
+            return get_size(self._latest) + get_size(self._known)
+
+    def evict(self, nbytes):
+        """Forget least recently used latest values, then known files.
+
+        Both are read from disk again when needed.
+
+        Returns:
+            int: Estimate of the bytes freed.
+        """
+        with self._lock:
+            freed = evict_items(nbytes, get_size(self._latest),
+                                len(self._latest), self._pop_latest)
+            if freed < nbytes:
+                freed += evict_items(nbytes - freed, get_size(self._known),
+                                     len(self._known), self._known.pop)
+        return freed
+
+    def _pop_latest(self):
+        self._latest.popitem(last=False)
+
+    def _uncache(self, rrd):
+        """Forget the latest values of *rrd*, which was written."""
+        with self._lock:
+            self._latest.pop(rrd, None)
+            self._fetching.pop(rrd, None)
+
+    def __len__(self):
+        """Return the number of cached latest values and known files."""
+        return len(self._latest) + len(self._known)
+
+    @staticmethod
+    def _get_archives(profile=None, consolidations=None):
+        """Return the archives of a retention profile for all Data Sources.
+
+        Args:
+            profile (str): Retention profile name. Defaults to
+                :data:`settings.RETENTION_PROFILE`.
+            consolidations (iterable): Consolidation functions. Defaults to
+                :data:`settings.CONSOLIDATIONS`.
+        """
+        if profile is None:
+            profile = settings.RETENTION_PROFILE
+        if consolidations is None:
+            consolidations = settings.CONSOLIDATIONS
+        archives = []
+        for steps, period in settings.RETENTION_PROFILES[profile]:
+            for function in consolidations:
+                archives.append('RRA:{}:{}:{}:{}'.format(
+                    function, settings.XFF, steps, period))
+        return archives
 
 
 class PortStats(Stats):
@@ -261,15 +604,28 @@ class PortStats(Stats):
 
     rrd = RRD('ports', [rt + 'x_' + stat for stat in
                         ('bytes', 'dropped', 'errors') for rt in 'rt'])
+    #: Rolling aggregates of port rates
+    summaries = SummaryStore('port_summaries', ('rx_bytes', 'tx_bytes'))
+    #: Switch, link and port group totals
+    rollups = RollupStore(RRD('rollups', rrd.data_sources))
 
-    def request(self, conn):
+    def request(self, conn, slot=0):  # pylint: disable=unused-argument
         """Ask for port stats."""
         request = self._get_versioned_request(conn.protocol.version)
-        self._send_event(request, conn)
-        log.debug('PortStats request for switch %s sent.', conn.switch.id)
+        if self._send_event(request, conn):
+            log.debug('PortStats request for switch %s sent.', conn.switch.id)
 
     @staticmethod
     def _get_versioned_request(of_version):
+        import pyof.v0x01.controller2switch.common as v0x01
+        from pyof.v0x01.common.phy_port import Port
+        from pyof.v0x01.controller2switch.stats_request import (StatsRequest,
+                                                                StatsType)
+        from pyof.v0x04.controller2switch import multipart_request as v0x04
+        from pyof.v0x04.controller2switch.common import MultipartType
+        from pyof.v0x04.controller2switch.multipart_request import \
+            MultipartRequest
+
         if of_version == 0x01:
             return StatsRequest(
                 body_type=StatsType.OFPST_PORT,
@@ -279,7 +635,7 @@ class PortStats(Stats):
             body=v0x04.PortStatsRequest())
 
     @classmethod
-    def listen(cls, switch, ports_stats):
+    def listen(cls, switch, ports_stats, tstamp=None, live=True):
         """Receive port stats."""
         debug_msg = 'Received port %s stats of switch %s: rx_bytes %s,' \
                     ' tx_bytes %s, rx_dropped %s, tx_dropped %s,' \
@@ -287,18 +643,27 @@ class PortStats(Stats):
 
         for ps in ports_stats:
             cls._update_controller_interface(switch, ps)
-            cls.rrd.update((switch.id, ps.port_no.value),
+            cls.rrd.update((switch.id, ps.port_no.value), tstamp,
                            rx_bytes=ps.rx_bytes.value,
                            tx_bytes=ps.tx_bytes.value,
                            rx_dropped=ps.rx_dropped.value,
                            tx_dropped=ps.tx_dropped.value,
                            rx_errors=ps.rx_errors.value,
                            tx_errors=ps.tx_errors.value)
+            if live:
+                cls.summaries.update(switch.id, ps.port_no.value, tstamp,
+                                     rx_bytes=ps.rx_bytes.value,
+                                     tx_bytes=ps.tx_bytes.value)
 
             log.debug(debug_msg, ps.port_no.value, switch.id,
                       ps.rx_bytes.value, ps.tx_bytes.value,
                       ps.rx_dropped.value, ps.tx_dropped.value,
                       ps.rx_errors.value, ps.tx_errors.value)
+        if live:
+            cls.summaries.save(switch.id)
+            cls.rollups.update(switch, ports_stats, tstamp)
+        cls.catalog.add_ports(switch.id,
+                              (ps.port_no.value for ps in ports_stats), tstamp)
 
     @staticmethod
     def _update_controller_interface(switch, port_stats):
@@ -306,7 +671,7 @@ class PortStats(Stats):
         iface = switch.get_interface_by_port_no(port_no)
         if iface is not None:
             if iface.stats is None:
-                iface.stats = OFCorePortStats()
+                iface.stats = of_core_flow.PortStats()
             iface.stats.update(port_stats)
 
 
@@ -315,16 +680,20 @@ class AggregateStats(Stats):
 
     _rrd = RRD('aggr', ('packet_count', 'byte_count', 'flow_count'))
 
-    def request(self, conn):
+    def request(self, conn, slot=0):  # pylint: disable=unused-argument
         """Ask for flow stats."""
+        from pyof.v0x01.controller2switch.common import AggregateStatsRequest
+        from pyof.v0x01.controller2switch.stats_request import (StatsRequest,
+                                                                StatsType)
+
         body = AggregateStatsRequest()  # Port.OFPP_NONE and All Tables
         req = StatsRequest(body_type=StatsType.OFPST_AGGREGATE, body=body)
-        self._send_event(req, conn)
-        log.debug('Aggregate Stats request for switch %s sent.',
-                  conn.switch.dpid)
+        if self._send_event(req, conn):
+            log.debug('Aggregate Stats request for switch %s sent.',
+                      conn.switch.dpid)
 
     @classmethod
-    def listen(cls, switch, aggregate_stats):
+    def listen(cls, switch, aggregate_stats, tstamp=None, live=True):
         """Receive flow stats."""
         debug_msg = 'Received aggregate stats from switch {}:' \
                     ' packet_count {}, byte_count {}, flow_count {}'
@@ -332,7 +701,7 @@ class AggregateStats(Stats):
         for ag in aggregate_stats:
             # need to choose the _id to aggregate_stats
             # this class isn't used yet.
-            cls.rrd.update((switch.id,),
+            cls.rrd.update((switch.id,), tstamp,
                            packet_count=ag.packet_count.value,
                            byte_count=ag.byte_count.value,
                            flow_count=ag.flow_count.value)
@@ -344,37 +713,123 @@ class AggregateStats(Stats):
 class FlowStats(Stats):
     """Deal with FlowStats message."""
 
-    rrd = RRD('flows', ('packet_count', 'byte_count'))
+    rrd = RRD('flows', ('packet_count', 'byte_count'), get_flow_timeout())
+    #: Flow ids by the fields that identify a flow
+    flow_ids = FlowIdCache()
+    #: Chooses the flows to store with 'heavy_hitters' flow sampling
+    sampler = HeavyHitterSampler(rrd)
+    #: Flows of each port and their current rates
+    port_flows = PortFlowIndex()
 
-    def request(self, conn):
-        """Ask for flow stats."""
-        request = self._get_versioned_request(conn.protocol.version)
-        self._send_event(request, conn)
-        log.debug('FlowStats request for switch %s sent.', conn.switch.id)
+    def __init__(self, msg_out_buffer):
+        """Split requests according to :data:`settings.FLOW_POLLING`."""
+        super().__init__(msg_out_buffer)
+        self._shards = self._get_shards()
+        self.slots = len(self._shards)
+        #: Timestamp of the current polling cycle by switch id
+        self._cycles = {}
+        #: Timestamp of the polling cycle by request xid
+        self._tstamps = {}
+        self._lock = Lock()
 
     @staticmethod
-    def _get_versioned_request(of_version):
+    def _get_shards():
+        """Return the request filters of each shard."""
+        if settings.FLOW_POLLING == 'table':
+            return [{'table_id': table_id}
+                    for table_id in settings.FLOW_SHARD_TABLES]
+        if settings.FLOW_POLLING == 'cookie':
+            return [{'cookie': cookie, 'cookie_mask': mask}
+                    for cookie, mask in settings.FLOW_SHARD_COOKIES]
+        return [{}]
+
+    def request(self, conn, slot=0):
+        """Ask for flow stats of one shard."""
+        version = conn.protocol.version
+        shard = self._shards[slot]
+        if version == 0x01 and 'cookie' in shard:
+            # OpenFlow 1.0 can't filter by cookie, so ask for all flows once
+            if slot > 0:
+                return
+            shard = {}
+        request = self._get_versioned_request(version, **shard)
+        if self.slots > 1:
+            self._add_cycle_tstamp(conn.switch.id, slot, request.header.xid)
+        if self._send_event(request, conn, slot):
+            log.debug('FlowStats request for switch %s sent.', conn.switch.id)
+
+    def _add_cycle_tstamp(self, switch_id, slot, xid):
+        """Remember the cycle timestamp for the reply of request *xid*."""
+        with self._lock:
+            if slot == 0:
+                now = int(time.time())
+                self._cycles[switch_id] = now
+                # Forget requests that were never replied
+                min_tstamp = now - 2 * settings.STATS_INTERVAL
+                self._tstamps = {old_xid: tstamp for old_xid, tstamp
+                                 in self._tstamps.items()
+                                 if tstamp >= min_tstamp}
+            if switch_id in self._cycles:
+                self._tstamps[xid] = self._cycles[switch_id]
+
+    def get_tstamp(self, xid, tstamp):
+        """Return the cycle timestamp if *xid* is a sharded request."""
+        with self._lock:
+            return self._tstamps.pop(xid, tstamp)
+
+    @staticmethod
+    def _get_versioned_request(of_version, table_id=None, cookie=None,
+                               cookie_mask=None):
+        """Return a request for all flows or only for a shard of them."""
+        import pyof.v0x01.controller2switch.common as v0x01
+        from pyof.v0x01.controller2switch.stats_request import (StatsRequest,
+                                                                StatsType)
+        from pyof.v0x04.common.flow_match import Match
+        from pyof.v0x04.common.port import PortNo
+        from pyof.v0x04.controller2switch import multipart_request as v0x04
+        from pyof.v0x04.controller2switch.common import MultipartType
+        from pyof.v0x04.controller2switch.group_mod import Group
+        from pyof.v0x04.controller2switch.multipart_request import \
+            MultipartRequest
+        from pyof.v0x04.controller2switch.table_mod import Table
+
         if of_version == 0x01:
+            if table_id is None:
+                table_id = 0xff  # All tables
             return StatsRequest(
                 body_type=StatsType.OFPST_FLOW,
-                body=v0x01.FlowStatsRequest())
-        return MultipartRequest(
-            multipart_type=MultipartType.OFPMP_FLOW,
-            body=v0x04.FlowStatsRequest())
+                body=v0x01.FlowStatsRequest(table_id=table_id))
+        if table_id is None and cookie is None:
+            body = v0x04.FlowStatsRequest()
+        else:
+            if table_id is None:
+                table_id = Table.OFPTT_ALL
+            body = v0x04.FlowStatsRequest(
+                table_id=table_id, out_port=PortNo.OFPP_ANY,
+                out_group=Group.OFPG_ANY, cookie=cookie or 0,
+                cookie_mask=cookie_mask or 0, match=Match())
+        return MultipartRequest(multipart_type=MultipartType.OFPMP_FLOW,
+                                body=body)
 
     @classmethod
-    def listen(cls, switch, flows_stats):
+    def listen(cls, switch, flows_stats, tstamp=None, live=True):
         """Receive flow stats."""
-        flow_class = FlowFactory.get_class(switch)
-        for fs in flows_stats:
-            flow = flow_class.from_of_flow_stats(fs, switch)
-
+        flow_class = of_core_flow.FlowFactory.get_class(switch)
+        samples = cls.flow_ids.get_samples(switch, flows_stats, flow_class)
+        for sample in samples:
             # Update controller's flow
-            controller_flow = switch.get_flow_by_id(flow.id)
+            controller_flow = switch.get_flow_by_id(sample.id)
             if controller_flow:
-                controller_flow.stats = flow.stats
-
+                sample.update_flow_stats(controller_flow)
+
+        stored = samples
+        if live:
+            cls.port_flows.update(switch.id, samples, tstamp)
+            if settings.FLOW_SAMPLING == 'heavy_hitters':
+                stored = cls.sampler.select(switch.id, samples, tstamp)
+        for sample in stored:
             # Update RRD database
-            cls.rrd.update((switch.id, flow.id),
-                           packet_count=flow.stats.packet_count,
-                           byte_count=flow.stats.byte_count)
+            cls.rrd.update((switch.id, sample.id), tstamp,
+                           packet_count=sample.packet_count,
+                           byte_count=sample.byte_count)
+        cls.catalog.add_flows(switch.id, samples, tstamp)
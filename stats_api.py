@@ -1,20 +1,27 @@
 """Module with Classes to handle statistics api."""
+import base64
+import heapq
+import inspect
 import json
 from abc import ABCMeta, abstractmethod
+from collections import namedtuple
+from functools import wraps
 from random import randint
 
 from flask import Response, request
 from kytos.core import log
 
-from napps.kytos.of_stats.stats import FlowStats, PortStats
+from napps.kytos.of_stats.downsample import lttb
+from napps.kytos.of_stats.fanout import STALE, FanOut
+from napps.kytos.of_stats.rollups import KINDS
+from napps.kytos.of_stats.stats import FlowStats, PortStats, Stats
 from napps.kytos.of_stats.user_speed import UserSpeed
 
 
-class StatsAPI(metaclass=ABCMeta):
-    """Class to answer REST API requests."""
+class PointsAPI:
+    """Class to answer REST API requests for the points of a series."""
 
     _rrd = None
-    controller = None
 
     def __init__(self):
         """Initialize instance attributes."""
@@ -29,25 +36,32 @@ class StatsAPI(metaclass=ABCMeta):
         return self._get_response(data)
 
     def _get_points_data(self, index, n_points):
-        start = request.args.get('start')
-        end = request.args.get('end')
-        return self._fetch(index, start, end, n_points)
+        """Return the points of *index*.
 
-    def get_latest(self, fn_items):
-        """Return latest stats for items obtained in a switch."""
-        switch = self._get_switch()
-        if switch is None:
-            data = []
-        else:
-            items = fn_items(switch)
-            data = list(self._get_latest_stats(items))
-        return self._get_response({'data': data})
+        Without the ``n_points`` query argument, *n_points* is only the
+        number of latest points if there is no ``start``, and all points
+        between ``start`` and ``end`` are returned.
+        """
+        start = self._get_tstamp_arg('start')
+        end = self._get_tstamp_arg('end')
+        requested = request.args.get('n_points', type=int)
+        if requested is not None:
+            n_points = max(requested, 1)
+        return self._fetch(index, start, end, n_points,
+                           downsample=requested is not None)
 
-    @abstractmethod
-    def _get_latest_stats(self, items):
-        pass
+    @staticmethod
+    def _get_tstamp_arg(name):
+        """Return Unix timestamps as integers or other rrdtool times as is.
+
+        Integers allow choosing the RRD resolution for the number of points.
+        """
+        value = request.args.get(name)
+        if value is not None and value.isdigit():
+            return int(value)
+        return value
 
-    def _fetch(self, index, start, end, n_points):
+    def _fetch(self, index, start, end, n_points, downsample=False):
         tstamps, cols, rows = self._rrd.fetch(index, start, end, n_points)
         self._stats = {col: [] for col in cols}
         self._stats['timestamps'] = list(tstamps)
@@ -55,13 +69,22 @@ class StatsAPI(metaclass=ABCMeta):
             for col, value in zip(cols, row):
                 self._stats[col].append(value)
         self._remove_null()
+        if downsample:
+            self._downsample(cols, n_points)
         return {'data': self._stats}
 
-    def _get_switch(self):
-        switch = self.controller.get_switch_by_dpid(self._dpid)
-        if switch is None:
-            log.warning('Switch %s not found in controller', self._dpid[-3:])
-        return switch
+    def _downsample(self, cols, n_points):
+        """Keep at most *n_points* rows, preserving peaks.
+
+        RRD may return more points than requested if there is no archive with
+        the matching resolution.
+        """
+        tstamps = self._stats['timestamps']
+        if len(tstamps) <= n_points:
+            return
+        indexes = lttb(tstamps, [self._stats[col] for col in cols], n_points)
+        for key, lst in self._stats.items():
+            self._stats[key] = [lst[i] for i in indexes]
 
     def _remove_null(self):
         """Remove a row if all its values are null."""
@@ -98,6 +121,50 @@ class StatsAPI(metaclass=ABCMeta):
             'detail': str(exception)}}
 
 
+class StatsAPI(PointsAPI, metaclass=ABCMeta):
+    """Class to answer REST API requests for the series of a switch."""
+
+    controller = None
+    #: :class:`~.partition.Partition` of this instance, if partitioned
+    partition = None
+    #: Fetches the series of list endpoints concurrently
+    fan_out = FanOut()
+
+    def get_latest(self, fn_items):
+        """Return latest stats for items obtained in a switch."""
+        switch = self._get_switch()
+        if switch is None:
+            data = []
+        else:
+            items = fn_items(switch)
+            data = list(self._get_latest_stats(items))
+        return self._get_response({'data': data})
+
+    @abstractmethod
+    def _get_latest_stats(self, items):
+        pass
+
+    def _fetch_latest_many(self, items, get_index):
+        """Yield items and their latest values, fetched concurrently.
+
+        Values are ``None`` for items not fetched before
+        :data:`settings.API_DEADLINE`.
+        """
+        items = list(items)
+        indexes = (get_index(item) for item in items)
+        results = self.fan_out.map(self._rrd.fetch_latest, indexes,
+                                   name='{} of {}'.format(
+                                       type(self).__name__, self._dpid))
+        for item, (_, result) in zip(items, results):
+            yield item, None if result is STALE else result
+
+    def _get_switch(self):
+        switch = self.controller.get_switch_by_dpid(self._dpid)
+        if switch is None:
+            log.warning('Switch %s not found in controller', self._dpid[-3:])
+        return switch
+
+
 class PortStatsAPI(StatsAPI):
     """REST API for port statistics."""
 
@@ -134,6 +201,29 @@ class PortStatsAPI(StatsAPI):
         api = cls(dpid, port)
         return api.get_stats()
 
+    @classmethod
+    def get_port_summary(cls, dpid, port):
+        """Return rate aggregates of a port updated at every sample.
+
+        For received and transmitted bytes, return the latest rate, its
+        moving average and the peak and 95th percentile of the current and
+        previous day and month (UTC).
+
+        Args:
+            dpid (str): Switch dpid.
+            port (str, int): Switch port number.
+        """
+        summary = PortStats.summaries.get_summary(dpid, port)
+        if summary is None:
+            data = {'errors': {
+                'status': '404',
+                'title': 'Summary not found.',
+                'detail': 'No summary for port {} of switch {}'.format(
+                    port, dpid)}}
+        else:
+            data = {'data': summary}
+        return cls._get_response(data)
+
     @classmethod
     def get_ports_list(cls, dpid):
         """List all ports that have statistics and their latest stats.
@@ -161,10 +251,13 @@ class PortStatsAPI(StatsAPI):
                                               for k in sorted(sw.interfaces)))
 
     def _get_latest_stats(self, ifaces):
-        for iface in ifaces:
+        rows = self._fetch_latest_many(
+            ifaces, lambda iface: (self._dpid, iface.port_number))
+        for iface, row in rows:
             self._port = iface.port_number
-            index = (self._dpid, self._port)
-            row = self._rrd.fetch_latest(index)
+            if row is None:
+                row = dict.fromkeys(self._rrd.data_sources)
+                row['stale'] = True
             row['port'] = self._port
             row['name'] = iface.name
             row['mac'] = iface.address
@@ -209,7 +302,10 @@ class PortStatsAPI(StatsAPI):
             log.warning('No speed, port %s, dpid %s', self._port, dpid)
         else:
             for bytes_col, util_col in self._util_cols.items():
-                row[util_col] = row[bytes_col] / speed  # bytes/sec
+                if row[bytes_col] is None:
+                    row[util_col] = None
+                else:
+                    row[util_col] = row[bytes_col] / speed  # bytes/sec
         return row
 
 
@@ -226,7 +322,12 @@ class FlowStatsAPI(StatsAPI):
 
     @classmethod
     def get_flow_list(cls, dpid):
-        """List all flows that have statistics and their latest stats.
+        """List flows and their latest stats, optionally filtered and paged.
+
+        Query arguments: table_id, cookie, match fields prefixed by "match."
+        (e.g. "match.in_port=1"), min_rate (bytes per second), sort ("id" or
+        "rate", highest first), limit and cursor (the "next" value of the
+        previous page). Only the page is serialized and it is streamed.
 
         Args:
             dpid (str): Switch dpid.
@@ -252,25 +353,340 @@ class FlowStatsAPI(StatsAPI):
         api = cls(dpid, flow_hash)
         return api.get_stats()
 
+    @classmethod
+    def get_port_flows(cls, dpid, port):
+        """Return the flows of a port sorted by byte rate, highest first.
+
+        Flows match the port as in_port or output to it. Query arguments:
+        direction ("in" or "out", defaults to both) and limit.
+
+        Args:
+            dpid (str): Switch dpid.
+            port (int): Port number.
+        """
+        direction = request.args.get('direction')
+        limit = request.args.get('limit')
+        try:
+            if direction not in (None, 'in', 'out'):
+                raise ValueError('direction must be "in" or "out"')
+            if limit is not None:
+                limit = int(limit)
+                if limit < 1:
+                    raise ValueError('limit must be positive')
+        except ValueError as error:
+            return cls._get_response({'errors': {
+                'status': '400',
+                'title': 'Invalid argument.',
+                'detail': str(error)}})
+        flows = FlowStats.port_flows.get_flows(dpid, port, direction, limit)
+        return cls._get_response({'data': flows})
+
     def get_list(self):
         """See :meth:`get_flow_list`."""
-        return super().get_latest(lambda sw: sorted(sw.flows,
-                                                    key=lambda f: f.id))
+        switch = self._get_switch()
+        if switch is None:
+            return self._get_response({'data': []})
+        try:
+            args = self._get_list_args()
+        except ValueError as error:
+            return self._get_response({'errors': {
+                'status': '400',
+                'title': 'Invalid argument.',
+                'detail': str(error)}})
+
+        flows = (flow for flow in switch.flows if self._filter(flow, args))
+        rated = args['sort'] == 'rate' or args['min_rate'] is not None
+        if rated:
+            flows = self._filter_rate(flows, args['min_rate'])
+            get_key = self._get_rate_key
+        else:
+            get_key = self._get_id_key
+        if args['cursor'] is not None:
+            cursor = args['cursor']
+            flows = (flow for flow in flows if get_key(flow) > cursor)
+
+        limit = args['limit']
+        if limit is None:
+            page, next_cursor = sorted(flows, key=get_key), None
+        else:
+            # Only the page (plus one to know if there is more) is sorted
+            page = heapq.nsmallest(limit + 1, flows, key=get_key)
+            next_cursor = None
+            if len(page) > limit:
+                page = page[:limit]
+                next_cursor = self._encode_cursor(get_key(page[-1]))
+        if rated:
+            # Values were fetched to sort them
+            stats = (self._get_flow_stats(rated_flow.flow, rated_flow.row)
+                     for rated_flow in page)
+        else:
+            stats = self._get_latest_stats(page)
+        json_ = self._stream_list(stats, next_cursor)
+        return Response(json_, mimetype='application/json')
+
+    def _get_list_args(self):
+        """Return filters, sorting and pagination of the flow list."""
+        args = {}
+        for arg, type_ in (('table_id', int), ('cookie', int),
+                           ('min_rate', float), ('limit', int)):
+            value = request.args.get(arg)
+            args[arg] = None if value is None else type_(value)
+        if args['limit'] is not None and args['limit'] < 1:
+            raise ValueError('limit must be positive')
+        args['sort'] = request.args.get('sort', 'id')
+        if args['sort'] not in ('id', 'rate'):
+            raise ValueError('sort must be "id" or "rate"')
+        cursor = request.args.get('cursor')
+        args['cursor'] = None if cursor is None else self._decode_cursor(
+            cursor, args['sort'])
+        args['match'] = {arg[len('match.'):]: parse_match_value(value)
+                         for arg, value in request.args.items()
+                         if arg.startswith('match.')}
+        return args
+
+    @staticmethod
+    def _filter(flow, args):
+        """Return whether *flow* has the table, cookie and match fields."""
+        if args['table_id'] is not None and flow.table_id != args['table_id']:
+            return False
+        if args['cookie'] is not None and flow.cookie != args['cookie']:
+            return False
+        if args['match']:
+            match = flow.match.as_dict()
+            return all(match.get(field) == value
+                       for field, value in args['match'].items())
+        return True
+
+    def _filter_rate(self, flows, min_rate):
+        """Yield flows with their latest values and byte rate.
+
+        Values are fetched like in :meth:`_fetch_latest_many`. Stale flows
+        have no rate: they are sorted after the others and left out if
+        there is *min_rate*.
+        """
+        rows = self._fetch_latest_many(flows,
+                                       lambda flow: (self._dpid, flow.id))
+        for flow, rrd_data in rows:
+            if rrd_data is None:
+                if min_rate is None:
+                    yield _RatedFlow(flow, None, None)
+                continue
+            rate = rrd_data.get('byte_count') or 0
+            if min_rate is None or rate >= min_rate:
+                yield _RatedFlow(flow, rate, rrd_data)
+
+    @staticmethod
+    def _get_id_key(flow):
+        return flow.id
+
+    @staticmethod
+    def _get_rate_key(rated_flow):
+        """Highest rates first and stale flows last."""
+        if rated_flow.rate is None:
+            return (1, rated_flow.flow.id)
+        return (-rated_flow.rate, rated_flow.flow.id)
+
+    @staticmethod
+    def _encode_cursor(key):
+        json_ = json.dumps(key).encode()
+        return base64.urlsafe_b64encode(json_).decode()
+
+    @staticmethod
+    def _decode_cursor(cursor, sort):
+        """Return the sorting key of the last flow of the previous page."""
+        try:
+            key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except (ValueError, TypeError):
+            raise ValueError('Invalid cursor.')
+        if sort == 'rate':
+            if not isinstance(key, list) or len(key) != 2:
+                raise ValueError('Invalid cursor for sort=rate.')
+            return tuple(key)
+        return str(key)
+
+    @staticmethod
+    def _stream_list(items, next_cursor):
+        """Yield the JSON response piece by piece."""
+        yield '{"data": ['
+        for i, item in enumerate(items):
+            yield (', ' if i else '') + json.dumps(item, sort_keys=True)
+        yield '], "next": {}}}'.format(json.dumps(next_cursor))
 
     def _get_latest_stats(self, flows):
-        for flow in flows:
-            index = (self._dpid, flow.id)
-            rrd_data = self._rrd.fetch_latest(index)
-            stats = {}
+        """Return a generator of flows with their latest stats.
+
+        Latest values are all fetched before returning. Thus, the deadline
+        doesn't count the time the streamed response waits for the client.
+        """
+        rrd_rows = list(self._fetch_latest_many(
+            flows, lambda flow: (self._dpid, flow.id)))
+        return (self._get_flow_stats(flow, rrd_data)
+                for flow, rrd_data in rrd_rows)
+
+    @staticmethod
+    def _get_flow_stats(flow, rrd_data):
+        stats = {}
+        if rrd_data is None:
+            stats['Bps'] = stats['pps'] = None
+            stats['stale'] = True
+        else:
             stats['Bps'] = rrd_data.get('byte_count', 0)
             stats['pps'] = rrd_data.get('packet_count', 0)
-            dct = flow.as_dict()
-            # Make it JS friendly
-            dct['id'] = dct.pop('id')
-            dct['stats'] = stats
-            yield dct
+        dct = flow.as_dict()
+        # Make it JS friendly
+        dct['id'] = dct.pop('id')
+        dct['stats'] = stats
+        return dct
 
     def get_stats(self):
         """See :meth:`get_flow_stats`."""
         index = (self._dpid, self._flow)
         return super().get_points(index)
+
+
+class RollupStatsAPI(PointsAPI):
+    """REST API for switch, link and port group rollups."""
+
+    _rrd = PortStats.rollups.rrd
+
+    @classmethod
+    def get_rollup_stats(cls, kind, rollup_id):
+        """Return points of the totals of a switch, link or port group.
+
+        Same columns and query arguments as the port statistics.
+
+        Args:
+            kind (str): One of "switches", "links" or "groups".
+            rollup_id (str): Switch dpid, link id or group name.
+        """
+        if kind not in KINDS:
+            return cls._get_response({'errors': {
+                'status': '404',
+                'title': 'Rollup kind not found.',
+                'detail': 'Kind must be one of {}'.format(', '.join(KINDS))}})
+        api = cls()
+        return api.get_points((kind, rollup_id))
+
+    @classmethod
+    def get_rollups_list(cls):
+        """List rollups updated since the start and their member ports."""
+        data = {'data': PortStats.rollups.get_rollups()}
+        return cls._get_response(data)
+
+
+class RequestsAPI:
+    """REST API for the status of stats requests."""
+
+    #: :class:`~.stats.Stats` instances, set by the NApp setup
+    stats_list = ()
+
+    @classmethod
+    def get_status(cls, dpid):
+        """Return pending requests and reply latency of a switch.
+
+        For each statistics type: the shards whose requests were not replied
+        yet, the moving average of the reply latency in seconds and the number
+        of requests that timed out.
+
+        Args:
+            dpid (str): Switch dpid.
+        """
+        data = {type(stats).__name__: stats.outstanding.get_status(dpid)
+                for stats in cls.stats_list}
+        return StatsAPI._get_response({'data': data})
+
+
+class MemoryAPI:
+    """REST API for the memory used by caches and buffers."""
+
+    @staticmethod
+    def get_usage():
+        """Return the budget, the total and the usage of each component.
+
+        For each component: estimated bytes, number of items, eviction
+        priority (lowest evicted first) and bytes evicted since setup.
+        """
+        usage = Stats.memory.get_usage()
+        data = {'budget': Stats.memory.budget,
+                'total': sum(item['bytes'] for item in usage.values()),
+                'components': usage}
+        return StatsAPI._get_response({'data': data})
+
+
+class CatalogAPI:
+    """REST API for the catalog of all series."""
+
+    #: Query arguments and their types
+    _ARGS = {'kind': str, 'id': str, 'table_id': int, 'cookie': int,
+             'seen_after': int, 'seen_before': int, 'limit': int,
+             'offset': int}
+
+    @classmethod
+    def search(cls, dpid=None):
+        """Search series of switches even if they are not connected.
+
+        Filters are given in the query string: kind (port or flow), id,
+        table_id, cookie, seen_after and seen_before (Unix timestamps) and
+        flow match fields prefixed by "match." (e.g. "match.in_port=1").
+        Use limit and offset for pagination.
+
+        Args:
+            dpid (str): Switch dpid. Defaults to all switches.
+        """
+        try:
+            kwargs = cls._get_filters()
+        except ValueError as error:
+            data = {'errors': {'status': '400',
+                               'title': 'Invalid filter.',
+                               'detail': str(error)}}
+        else:
+            data = {'data': Stats.catalog.search(dpid, **kwargs)}
+        return StatsAPI._get_response(data)
+
+    @classmethod
+    def _get_filters(cls):
+        kwargs = {}
+        match = {}
+        for arg, value in request.args.items():
+            if arg.startswith('match.'):
+                match[arg[len('match.'):]] = parse_match_value(value)
+            elif arg in cls._ARGS:
+                name = 'series_id' if arg == 'id' else arg
+                kwargs[name] = cls._ARGS[arg](value)
+        kwargs['match'] = match
+        return kwargs
+
+
+#: Flow, its latest byte rate and values, for filtering and sorting. Rate and
+#: values are None if stale.
+_RatedFlow = namedtuple('_RatedFlow', 'flow rate row')
+
+
+def parse_match_value(value):
+    """Return a match field value of the query string.
+
+    Match values are stored as numbers or strings.
+    """
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
+
+def routed(function):
+    """Answer requests for dpids of other partition members by their owner.
+
+    The decorated function must have a ``dpid`` argument. See
+    :meth:`.Partition.route`.
+    """
+    signature = inspect.signature(function)
+
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        partition = StatsAPI.partition
+        if partition is not None:
+            dpid = signature.bind(*args, **kwargs).arguments['dpid']
+            if not partition.is_local(dpid):
+                return partition.route(dpid)
+        return function(*args, **kwargs)
+    return wrapper
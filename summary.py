@@ -0,0 +1,413 @@
+"""Rolling aggregates of port rates computed as samples arrive.
+
+Peaks, averages and percentiles would otherwise require fetching the whole
+RRD archive. Here, they are updated with every sample and cost O(1) to read.
+"""
+import json
+import math
+import time
+from collections import OrderedDict
+from threading import Lock
+
+from kytos.core import log
+
+from napps.kytos.of_stats import settings
+from napps.kytos.of_stats.memory import evict_items, get_size
+
+
+class QuantileSketch:
+    """Mergeable quantile sketch with bounded relative error.
+
+    Values are counted in logarithmic buckets so any quantile is returned
+    with relative error up to *accuracy*. Sketches with the same accuracy can
+    be merged by adding bucket counts.
+    """
+
+    __slots__ = ('accuracy', '_gamma', '_log_gamma', 'buckets', 'zeros',
+                 'count')
+
+    def __init__(self, accuracy=None):
+        """Start with no values.
+
+        Args:
+            accuracy (float): Relative error, e.g. 0.01 for 1%. Defaults to
+                :data:`settings.SUMMARY_ACCURACY`.
+        """
+        self.accuracy = accuracy or settings.SUMMARY_ACCURACY
+        self._gamma = (1 + self.accuracy) / (1 - self.accuracy)
+        self._log_gamma = math.log(self._gamma)
+        #: key is bucket index, value is count
+        self.buckets = {}
+        #: Values that are not positive
+        self.zeros = 0
+        self.count = 0
+
+    def add(self, value):
+        """Count a non-negative value."""
+        if value <= 0:
+            self.zeros += 1
+        else:
+            index = math.ceil(math.log(value) / self._log_gamma)
+            self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+
+    def merge(self, other):
+        """Add the counts of *other*, which must have the same accuracy."""
+        if other.accuracy != self.accuracy:
+            raise ValueError('Cannot merge sketches of different accuracy.')
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        self.zeros += other.zeros
+        self.count += other.count
+
+    def quantile(self, q):
+        """Return the estimated value of quantile *q* (0 to 1).
+
+        Returns None if there are no values.
+        """
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zeros
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if rank < seen:
+                # Bucket mid-point in terms of relative error
+                return 2 * self._gamma ** index / (self._gamma + 1)
+        return 2 * self._gamma ** max(self.buckets) / (self._gamma + 1)
+
+    def as_dict(self):
+        """Return a JSON-serializable representation."""
+        return {'accuracy': self.accuracy, 'zeros': self.zeros,
+                'buckets': self.buckets}
+
+    @classmethod
+    def from_dict(cls, dct):
+        """Create a sketch from :meth:`as_dict` output."""
+        sketch = cls(dct['accuracy'])
+        sketch.zeros = dct['zeros']
+        sketch.buckets = {int(index): count
+                          for index, count in dct['buckets'].items()}
+        sketch.count = sketch.zeros + sum(sketch.buckets.values())
+        return sketch
+
+
+class Period:
+    """Peak and percentile sketch of a day or month."""
+
+    __slots__ = ('name', 'peak', 'peak_tstamp', 'sketch')
+
+    def __init__(self, name):
+        """Start an empty period.
+
+        Args:
+            name (str): Period identification, e.g. '2018-04' or '2018-04-20'.
+        """
+        self.name = name
+        self.peak = None
+        self.peak_tstamp = None
+        self.sketch = QuantileSketch()
+
+    def add(self, rate, tstamp):
+        """Account for a new rate."""
+        if self.peak is None or rate > self.peak:
+            self.peak = rate
+            self.peak_tstamp = tstamp
+        self.sketch.add(rate)
+
+    def as_dict(self):
+        """Return a JSON-serializable representation."""
+        return {'name': self.name, 'peak': self.peak,
+                'peak_tstamp': self.peak_tstamp,
+                'sketch': self.sketch.as_dict()}
+
+    @classmethod
+    def from_dict(cls, dct):
+        """Create a period from :meth:`as_dict` output."""
+        period = cls(dct['name'])
+        period.peak = dct['peak']
+        period.peak_tstamp = dct['peak_tstamp']
+        period.sketch = QuantileSketch.from_dict(dct['sketch'])
+        return period
+
+    def get_summary(self):
+        """Return period name, peak and 95th percentile."""
+        return {'period': self.name, 'peak': self.peak,
+                'peak_timestamp': self.peak_tstamp,
+                'p95': self.sketch.quantile(0.95),
+                'samples': self.sketch.count}
+
+
+class SeriesSummary:
+    """Rolling aggregates of a counter.
+
+    Keep the latest rate, its exponentially weighted moving average and the
+    peaks and percentile sketches of the current and previous day and month.
+    """
+
+    #: (period type, time format) in UTC
+    _PERIODS = (('day', '%Y-%m-%d'), ('month', '%Y-%m'))
+
+    __slots__ = ('counter', 'tstamp', 'rate', 'ewma', 'periods')
+
+    def __init__(self):
+        """Start without samples."""
+        self.counter = None
+        self.tstamp = None
+        self.rate = None
+        self.ewma = None
+        #: key is period type, value is (current, previous) periods
+        self.periods = {}
+
+    def update(self, counter, tstamp):
+        """Calculate the rate since the last counter value and aggregate it.
+
+        Samples that are not newer than the last one (e.g. a delayed reply)
+        are ignored.
+
+        Args:
+            counter (int): Counter value.
+            tstamp (int): Unix timestamp in seconds.
+        """
+        last_counter, last_tstamp = self.counter, self.tstamp
+        if last_tstamp is not None and tstamp <= last_tstamp:
+            return
+        self.counter, self.tstamp = counter, tstamp
+        if last_counter is None or counter < last_counter:
+            # No previous sample or the counter was reset
+            return
+        elapsed = tstamp - last_tstamp
+        self.rate = (counter - last_counter) / elapsed
+        if self.ewma is None:
+            self.ewma = self.rate
+        else:
+            alpha = 1 - math.exp(-elapsed / settings.SUMMARY_EWMA_WINDOW)
+            self.ewma += alpha * (self.rate - self.ewma)
+        for period_type, fmt in self._PERIODS:
+            name = time.strftime(fmt, time.gmtime(tstamp))
+            current, previous = self.periods.get(period_type, (None, None))
+            if current is None or current.name != name:
+                current, previous = Period(name), current
+                self.periods[period_type] = (current, previous)
+            current.add(self.rate, tstamp)
+
+    def get_summary(self):
+        """Return the aggregates as a dictionary."""
+        summary = {'rate': self.rate, 'ewma': self.ewma}
+        for period_type, _ in self._PERIODS:
+            current, previous = self.periods.get(period_type, (None, None))
+            summary[period_type] = current and current.get_summary()
+            summary['previous_' + period_type] = \
+                previous and previous.get_summary()
+        return summary
+
+    def as_dict(self):
+        """Return a JSON-serializable representation."""
+        return {'counter': self.counter, 'tstamp': self.tstamp,
+                'rate': self.rate, 'ewma': self.ewma,
+                'periods': {period_type: [period and period.as_dict()
+                                          for period in periods]
+                            for period_type, periods in self.periods.items()}}
+
+    @classmethod
+    def from_dict(cls, dct):
+        """Create a summary from :meth:`as_dict` output."""
+        summary = cls()
+        summary.counter = dct['counter']
+        summary.tstamp = dct['tstamp']
+        summary.rate = dct['rate']
+        summary.ewma = dct['ewma']
+        summary.periods = {
+            period_type: tuple(period and Period.from_dict(period)
+                               for period in periods)
+            for period_type, periods in dct['periods'].items()}
+        return summary
+
+
+class SummaryStore:
+    """Summaries of all series of an app, persisted in one file per dpid.
+
+    Files are written at most every :data:`settings.SUMMARY_SAVE_INTERVAL`
+    seconds and when the NApp is shut down.
+    """
+
+    def __init__(self, app_folder, data_sources):
+        """Specify where to save summaries and which data sources to keep.
+
+        Args:
+            app_folder (str): Folder inside :data:`settings.DIR` for the
+                summary files.
+            data_sources (iterable): Data source names (e.g. rx_bytes).
+        """
+        self._app = app_folder
+        self._ds = data_sources
+        #: key is dpid, value is a dict with series id as key and dict of
+        #: :class:`SeriesSummary` by data source as value. Least recently used
+        #: first.
+        self._dpids = OrderedDict()
+        #: last time the file of a dpid was saved
+        self._saved = {}
+        #: Serialize the writes of each dpid file. Key is dpid.
+        self._write_locks = {}
+        #: Content versions, so older content doesn't overwrite newer one
+        self._version = 0
+        #: key is dpid, value is the version in its file
+        self._written = {}
+        self._lock = Lock()
+
+    def update(self, dpid, series_id, tstamp=None, **ds_values):
+        """Update the summaries of a series.
+
+        Args:
+            dpid (str): Switch dpid.
+            series_id (int, str): Series id inside the switch (e.g. port
+                number).
+            tstamp (int): Unix timestamp in seconds. Defaults to now.
+            ds_values: Counter value of each data source.
+        """
+        if tstamp is None:
+            tstamp = int(time.time())
+        with self._lock:
+            series = self._get_dpid(dpid).setdefault(str(series_id), {})
+            for ds in self._ds:
+                if ds not in series:
+                    series[ds] = SeriesSummary()
+                series[ds].update(ds_values[ds], tstamp)
+
+    def get_summary(self, dpid, series_id):
+        """Return the aggregates of each data source of a series.
+
+        Returns None if there are no aggregates for the series.
+        """
+        with self._lock:
+            series = self._find_dpid(dpid).get(str(series_id))
+            if series is None:
+                return None
+            return {ds: summary.get_summary()
+                    for ds, summary in series.items()}
+
+    def save(self, dpid, force=False):
+        """Save the summaries of *dpid* if they were not saved recently.
+
+        Args:
+            dpid (str): Switch dpid.
+            force (bool): Save regardless of the last time it was saved.
+        """
+        now = time.time()
+        with self._lock:
+            elapsed = now - self._saved.get(dpid, 0)
+            if not force and elapsed < settings.SUMMARY_SAVE_INTERVAL:
+                return
+            series = self._dpids.get(dpid)
+            if series is None:
+                return
+            snapshot = self._get_snapshot(dpid, series)
+            self._saved[dpid] = now
+        self._write(dpid, *snapshot)
+
+    def save_all(self):
+        """Save the summaries of all dpids."""
+        with self._lock:
+            dpids = list(self._dpids)
+        for dpid in dpids:
+            self.save(dpid, force=True)
+
+    def __len__(self):
+        """Return the number of dpids in memory."""
+        return len(self._dpids)
+
+    def get_nbytes(self):
+        """Return an estimate of the bytes of the summaries in memory."""
+        with self._lock:
+            return get_size(self._dpids)
+
+    def evict(self, nbytes):
+        """Save and unload the summaries of the least recently used dpids.
+
+        They are loaded again when needed.
+
+        Returns:
+            int: Estimate of the bytes freed.
+        """
+        evicted = []
+        with self._lock:
+            freed = evict_items(nbytes, get_size(self._dpids),
+                                len(self._dpids),
+                                lambda: evicted.append(
+                                    self._dpids.popitem(last=False)))
+            # Written before releasing the lock, so they are not loaded
+            # again before being saved
+            for dpid, series in evicted:
+                self._write(dpid, *self._get_snapshot(dpid, series))
+                self._saved.pop(dpid, None)
+        return freed
+
+    def _get_dpid(self, dpid):
+        """Return the summaries of *dpid*, loading them from disk once."""
+        if dpid not in self._dpids:
+            self._dpids[dpid] = self._load(dpid)
+            self._saved[dpid] = time.time()
+        self._dpids.move_to_end(dpid)
+        return self._dpids[dpid]
+
+    def _find_dpid(self, dpid):
+        """Return the summaries of *dpid* without adding unknown dpids.
+
+        Summaries saved to disk are loaded like in :meth:`_get_dpid`.
+        """
+        if dpid not in self._dpids:
+            series = self._load(dpid)
+            if not series:
+                return series
+            self._dpids[dpid] = series
+            self._saved[dpid] = time.time()
+        self._dpids.move_to_end(dpid)
+        return self._dpids[dpid]
+
+    def _get_snapshot(self, dpid, series):
+        """Return the version and JSON content of the summaries of a dpid.
+
+        It must be called with the lock.
+        """
+        self._version += 1
+        self._write_locks.setdefault(dpid, Lock())
+        content = {series_id: {ds: summary.as_dict()
+                               for ds, summary in summaries.items()}
+                   for series_id, summaries in series.items()}
+        return self._version, content
+
+    def _write(self, dpid, version, content):
+        """Write the content of a dpid unless a newer one was written.
+
+        Only one thread writes the file (and its temporary file) of a dpid
+        at a time.
+        """
+        with self._write_locks[dpid]:
+            if version < self._written.get(dpid, 0):
+                return
+            path = self._get_path(dpid)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix('.tmp')
+            with tmp_path.open('w') as summary_file:
+                json.dump(content, summary_file, separators=(',', ':'))
+            tmp_path.replace(path)
+            self._written[dpid] = version
+
+    def _load(self, dpid):
+        path = self._get_path(dpid)
+        if not path.exists():
+            return {}
+        try:
+            with path.open() as summary_file:
+                content = json.load(summary_file)
+        except ValueError:
+            log.warning('Ignoring corrupted summary file %s.', path)
+            return {}
+        return {series_id: {ds: SeriesSummary.from_dict(dct)
+                            for ds, dct in summaries.items()}
+                for series_id, summaries in content.items()}
+
+    def _get_path(self, dpid):
+        return settings.DIR / self._app / '{}.json'.format(dpid)
@@ -0,0 +1,135 @@
+"""Test the replay of recorded stats replies."""
+import io
+import struct
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest.mock import Mock, patch
+
+from pyof.foundation.basic_types import BinaryData, FixedTypeList
+from pyof.v0x04.controller2switch import multipart_reply as reply04
+from pyof.v0x04.controller2switch.common import MultipartType
+
+from napps.kytos.of_stats import settings
+from napps.kytos.of_stats.backfill import (SampleCollector, read_pcap,
+                                           read_records, replay_file,
+                                           write_record)
+from napps.kytos.of_stats.stats import RRD, FlowStats, Stats
+
+DPID = '00:00:00:00:00:00:00:2a'
+
+
+def get_port_stats_reply(xid, counter, more=False):
+    """Return a packed OpenFlow 1.3 port stats reply with ports 1 and 2."""
+    body = [reply04.PortStats(
+        port_no=port_no, rx_packets=counter, tx_packets=counter,
+        rx_bytes=counter * port_no, tx_bytes=counter, rx_dropped=0,
+        tx_dropped=0, rx_errors=0, tx_errors=0, rx_frame_err=0,
+        rx_over_err=0, rx_crc_err=0, collisions=0, duration_sec=0,
+        duration_nsec=0) for port_no in (1, 2)]
+    msg = reply04.MultipartReply(
+        xid=xid, multipart_type=MultipartType.OFPMP_PORT_STATS,
+        flags=1 if more else 0,
+        body=BinaryData(FixedTypeList(reply04.PortStats, body).pack()))
+    return msg.pack()
+
+
+def get_features_reply():
+    """Return a packed OpenFlow 1.3 features reply of :data:`DPID`."""
+    return struct.pack('!BBHIQIBBHII', 4, 6, 32, 1, 42, 0, 0, 0, 0, 0, 0)
+
+
+def get_pcap(segments):
+    """Return a pcap with Ethernet/IPv4/TCP packets to the controller.
+
+    Args:
+        segments (list): (timestamp, TCP sequence, flags, payload) tuples.
+    """
+    pcap = struct.pack('<IHHiIII', 0xa1b2c3d4, 2, 4, 0, 0, 65535, 1)
+    for tstamp, seq, flags, payload in segments:
+        tcp = struct.pack('!HHIIBBHHH', 40000, 6653, seq, 0, 5 << 4, flags,
+                          0, 0, 0)
+        ip_length = 20 + len(tcp) + len(payload)
+        ip = struct.pack('!BBHHHBBH4s4s', 0x45, 0, ip_length, 0, 0, 64, 6,
+                         0, b'\x0a\x00\x00\x02', b'\x0a\x00\x00\x01')
+        frame = b'\x00' * 12 + b'\x08\x00' + ip + tcp + payload
+        pcap += struct.pack('<IIII', tstamp, 0, len(frame), len(frame))
+        pcap += frame
+    return pcap
+
+
+class TestReaders(unittest.TestCase):
+    """Test reading recorded messages."""
+
+    def test_records(self):
+        """Records are read back with timestamp and dpid."""
+        stream = io.BytesIO()
+        messages = [get_port_stats_reply(1, 10), get_port_stats_reply(2, 20)]
+        for tstamp, message in enumerate(messages, 100):
+            write_record(stream, tstamp, DPID, message)
+        stream.seek(0)
+        self.assertEqual([(100, DPID, messages[0]), (101, DPID, messages[1])],
+                         list(read_records(stream)))
+
+    def test_pcap(self):
+        """TCP segments are reassembled in order, without retransmissions."""
+        reply = get_port_stats_reply(1, 10)
+        data = get_features_reply() + reply
+        seq = 1000
+        cut = len(data) - 20
+        pcap = get_pcap([(100, seq, 0x02, b''),  # SYN
+                         (101, seq + 1 + cut, 0x18, data[cut:]),
+                         (102, seq + 1, 0x18, data[:cut]),
+                         (103, seq + 1, 0x18, data[:cut])])
+        messages = list(read_pcap(io.BytesIO(pcap)))
+        self.assertEqual([(102, DPID, reply)], messages)
+
+    def test_pcap_without_handshake(self):
+        """Connections without the features reply are ignored."""
+        pcap = get_pcap([(100, 1, 0x18, get_port_stats_reply(1, 10))])
+        self.assertEqual([], list(read_pcap(io.BytesIO(pcap))))
+
+
+class TestReplay(unittest.TestCase):
+    """Test replay_file."""
+
+    def test_multipart_replay(self):
+        """Parts are joined and listen gets the first part timestamp."""
+        with TemporaryDirectory() as folder, \
+                patch.object(settings, 'DIR', Path(folder)), \
+                patch.object(Stats, 'catalog') as catalog_mock:
+            path = Path(folder) / 'replies'
+            with path.open('wb') as stream:
+                write_record(stream, 100, DPID,
+                             get_port_stats_reply(7, 10, more=True))
+                write_record(stream, 101, DPID, get_port_stats_reply(7, 20))
+                write_record(stream, 160, DPID, get_port_stats_reply(8, 30))
+            samples, (new, _) = replay_file(str(path))
+            catalog_mock.close.assert_not_called()
+            self.assertIs(catalog_mock, Stats.catalog)
+            self.assertIsNone(RRD.writers)
+
+        data_sources = ('rx_bytes', 'tx_bytes', 'rx_dropped', 'tx_dropped',
+                        'rx_errors', 'tx_errors')
+        port2 = samples[('ports', data_sources, settings.TIMEOUT, (DPID, 2))]
+        self.assertEqual([100, 100, 160], [tstamp for tstamp, _ in port2])
+        self.assertEqual([20, 40, 60], [row['rx_bytes'] for _, row in port2])
+        self.assertNotIn('rollups', {key[0] for key in samples})
+        self.assertEqual([(DPID, 'port', '1'), (DPID, 'port', '2')],
+                         [row[:3] for row in new])
+
+    def test_flow_heartbeat(self):
+        """Backfilled flow RRDs are created with FLOW_TIMEOUT."""
+        collector = SampleCollector()
+        collector.submit(FlowStats.rrd, (DPID, 'abc'), 100, packet_count=1,
+                         byte_count=2)
+        # Not the default heartbeat
+        custom = RRD('flows', FlowStats.rrd.data_sources, 999)
+        collector.submit(custom, (DPID, 'def'), 100, packet_count=1,
+                         byte_count=2)
+        writers = Mock()
+        self.assertEqual(2, SampleCollector.write(collector.samples,
+                                                  writers))
+        self.assertEqual([settings.FLOW_TIMEOUT, 999],
+                         [call[0][0].timeout for call in
+                          writers.submit_many.call_args_list])
@@ -0,0 +1,57 @@
+"""Test benchmark baselines."""
+import unittest
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+from napps.kytos.of_stats.benchmarks import __main__ as cli
+from napps.kytos.of_stats.benchmarks import baseline
+
+
+def results(samples_per_sec=1000.0, p50_ms=1.0, p99_ms=2.0, rss=1000):
+    """Return results in the same format as the benchmark runner."""
+    return {'scenarios': {'port_listen': {'calls': 10,
+                                          'samples_per_sec': samples_per_sec,
+                                          'p50_ms': p50_ms,
+                                          'p99_ms': p99_ms}},
+            'peak_rss_kb': rss}
+
+
+class TestBaseline(unittest.TestCase):
+    """Test regression detection."""
+
+    def test_no_regression(self):
+        """Small variations are accepted."""
+        current = results(samples_per_sec=900, p99_ms=2.2)
+        self.assertEqual([], baseline.compare(current, results(), 0.2))
+
+    def test_regressions(self):
+        """Throughput, latency and memory regressions are reported."""
+        current = results(samples_per_sec=500, p50_ms=3, rss=2000)
+        regressions = baseline.compare(current, results(), 0.2)
+        self.assertEqual(3, len(regressions))
+
+    def test_save_and_load(self):
+        """Baselines of different configurations are kept side by side."""
+        with TemporaryDirectory() as folder:
+            path = folder + '/baseline.json'
+            self.assertEqual({}, baseline.load(path))
+            baseline.save('a', results(), path)
+            baseline.save('b', results(rss=5), path)
+            loaded = baseline.load(path)
+            self.assertEqual(results(), loaded['a'])
+            self.assertEqual(5, loaded['b']['peak_rss_kb'])
+
+    @patch.object(cli, 'print_results')
+    @patch.object(cli, 'run', return_value=results())
+    def test_missing_baseline(self, *_):
+        """A missing baseline fails unless the comparison is skipped."""
+        with TemporaryDirectory() as folder:
+            argv = ['benchmarks', '--baseline', folder + '/baseline.json']
+            with patch('sys.argv', argv):
+                self.assertEqual(1, cli.main())
+            with patch('sys.argv', argv + ['--no-baseline']):
+                self.assertEqual(0, cli.main())
+            with patch('sys.argv', argv + ['--save-baseline']):
+                self.assertEqual(0, cli.main())
+            with patch('sys.argv', argv):
+                self.assertEqual(0, cli.main())
@@ -0,0 +1,77 @@
+"""Test the series catalog."""
+import sqlite3
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest.mock import Mock, patch
+
+from napps.kytos.of_stats.catalog import Catalog
+
+
+def get_flow(flow_id, cookie=0, in_port=1):
+    """Return a flow mock."""
+    flow = Mock(id=flow_id, table_id=0, cookie=cookie)
+    flow.match.as_dict.return_value = {'in_port': in_port}
+    return flow
+
+
+class TestCatalog(unittest.TestCase):
+    """Test Catalog."""
+
+    def setUp(self):
+        """Create a catalog in a temporary folder."""
+        folder = TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        self.path = Path(folder.name) / 'catalog.sqlite'
+        self.catalog = Catalog(self.path)
+        self.addCleanup(self.catalog.close)
+
+    def test_ports(self):
+        """First and last seen are kept."""
+        self.catalog.add_ports('sw1', [1, 2], 100)
+        self.catalog.add_ports('sw1', [1], 10000)
+        ports = self.catalog.search('sw1', 'port')
+        self.assertEqual([1, 2], [port['id'] for port in ports])
+        self.assertEqual((100, 10000),
+                         (ports[0]['first_seen'], ports[0]['last_seen']))
+        self.assertEqual(100, ports[1]['last_seen'])
+
+    def test_persistence(self):
+        """Series are found after reopening the catalog."""
+        self.catalog.add_flows('sw1', [get_flow('abc', cookie=2**64 - 1)],
+                               100)
+        self.catalog.close()
+        catalog = Catalog(self.path)
+        catalog.add_flows('sw1', [get_flow('abc')], 10000)
+        flows = catalog.search(kind='flow')
+        catalog.close()
+        self.assertEqual(1, len(flows))
+        self.assertEqual(2**64 - 1, flows[0]['cookie'])
+        self.assertEqual({'in_port': 1}, flows[0]['match'])
+        self.assertEqual(10000, flows[0]['last_seen'])
+
+    def test_locked(self):
+        """Rows not written while the database is locked are kept."""
+        locked = sqlite3.OperationalError('database is locked')
+        with patch.object(Catalog, '_write', side_effect=locked):
+            self.catalog.add_ports('sw1', [1], 100)
+            self.catalog.add_flows('sw1', [get_flow('a')], 100)
+        self.catalog.add_ports('sw1', [2], 200)
+        self.assertEqual(['1', '2', 'a'],
+                         sorted(str(series['id'])
+                                for series in self.catalog.search('sw1')))
+
+    def test_search(self):
+        """Filters are combined."""
+        self.catalog.add_flows('sw1', [get_flow('a', 1, 1),
+                                       get_flow('b', 2, 2)], 100)
+        self.catalog.add_flows('sw2', [get_flow('c', 1, 2)], 200)
+        self.catalog.add_ports('sw2', [1], 200)
+
+        def ids(**kwargs):
+            return [series['id'] for series in self.catalog.search(**kwargs)]
+
+        self.assertEqual(['a', 'c'], ids(cookie=1))
+        self.assertEqual(['b', 'c'], ids(match={'in_port': 2}))
+        self.assertEqual(['c', 1], ids(seen_after=150))
+        self.assertEqual(['b'], ids(kind='flow', limit=1, offset=1))
@@ -0,0 +1,78 @@
+"""Test series downsampling."""
+import json
+from unittest import TestCase
+from unittest.mock import patch
+
+from flask import Flask
+
+from napps.kytos.of_stats.downsample import lttb
+from napps.kytos.of_stats.stats_api import RollupStatsAPI
+
+
+class TestLTTB(TestCase):
+    """Test Largest-Triangle-Three-Buckets."""
+
+    def test_few_points(self):
+        """Keep all points if there are no more than requested."""
+        self.assertEqual([0, 1, 2], lttb([1, 2, 3], [[5, 6, 7]], 3))
+        self.assertEqual([0, 1, 2], lttb([1, 2, 3], [[5, 6, 7]], 10))
+
+    def test_n_points(self):
+        """Return exactly n_points indexes, including first and last."""
+        tstamps = list(range(1000))
+        values = [i % 7 for i in tstamps]
+        indexes = lttb(tstamps, [values], 300)
+        self.assertEqual(300, len(indexes))
+        self.assertEqual(0, indexes[0])
+        self.assertEqual(999, indexes[-1])
+        self.assertEqual(sorted(set(indexes)), indexes)
+
+    def test_small_n_points(self):
+        """Keep the edges for less than 3 points."""
+        tstamps = list(range(10))
+        self.assertEqual([0, 9], lttb(tstamps, [tstamps], 2))
+        self.assertEqual([9], lttb(tstamps, [tstamps], 1))
+
+    def test_keep_spike(self):
+        """A single spike must survive downsampling."""
+        tstamps = list(range(1000))
+        values = [0] * 1000
+        values[437] = 100
+        indexes = lttb(tstamps, [values], 30)
+        self.assertIn(437, indexes)
+
+    def test_spike_in_any_column(self):
+        """Spikes in small-valued columns are not hidden by larger ones."""
+        tstamps = list(range(1000))
+        big = [10 ** 9 + (i % 2) * 10 ** 6 for i in tstamps]
+        small = [0] * 1000
+        small[611] = 5
+        indexes = lttb(tstamps, [big, small], 60)
+        self.assertIn(611, indexes)
+
+    def test_none_values(self):
+        """Do not fail with missing values."""
+        tstamps = list(range(100))
+        values = [None if i % 3 else i for i in tstamps]
+        self.assertEqual(10, len(lttb(tstamps, [values], 10)))
+
+
+class TestPointsAPI(TestCase):
+    """Test downsampling of graph endpoints."""
+
+    def _get_timestamps(self, query):
+        rows = [(float(i),) for i in range(100)]
+        with patch.object(RollupStatsAPI, '_rrd') as rrd_mock, \
+                Flask(__name__).test_request_context('/' + query):
+            rrd_mock.fetch.return_value = (range(100), ['rx_bytes'], rows)
+            response = RollupStatsAPI.get_rollup_stats('switches', 'a')
+        return json.loads(response.get_data(as_text=True))['data'][
+            'timestamps']
+
+    def test_all_points(self):
+        """All points are returned without n_points."""
+        self.assertEqual(100, len(self._get_timestamps('?start=0&end=99')))
+
+    def test_n_points(self):
+        """Points are downsampled to an explicit n_points."""
+        self.assertEqual(10, len(self._get_timestamps('?n_points=10')))
@@ -0,0 +1,173 @@
+"""Test concurrent fetches of list endpoints."""
+import json
+import time
+import unittest
+from threading import Event
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
+
+from flask import Flask
+
+from napps.kytos.of_stats import settings
+from napps.kytos.of_stats.fanout import STALE, FanOut
+from napps.kytos.of_stats.stats_api import (FlowStatsAPI, PortStatsAPI,
+                                            StatsAPI)
+
+
+class TestFanOut(unittest.TestCase):
+    """Test FanOut.map."""
+
+    def setUp(self):
+        """Use four threads."""
+        self.fan_out = FanOut(4)
+        self.addCleanup(self.fan_out.shutdown)
+        self.release = Event()
+        self.addCleanup(self.release.set)
+
+    def _fetch(self, item):
+        """Items 'slow*' wait for :attr:`release`."""
+        if item.startswith('slow'):
+            self.release.wait(5)
+        return item.upper()
+
+    def test_concurrent(self):
+        """Calls run in parallel and results keep the item order."""
+        def fetch(item):
+            time.sleep(0.2)
+            return item * 2
+
+        start = time.perf_counter()
+        results = list(self.fan_out.map(fetch, range(8), deadline=5))
+        self.assertLess(time.perf_counter() - start, 1)
+        self.assertEqual([(i, i * 2) for i in range(8)], results)
+
+    def test_deadline(self):
+        """Slow items and the ones not submitted in time are stale."""
+        items = ['a', 'slow1', 'b', 'c', 'd', 'e']
+        start = time.perf_counter()
+        results = dict(self.fan_out.map(self._fetch, items, deadline=0.2))
+        self.assertLess(time.perf_counter() - start, 1)
+        self.assertEqual('A', results['a'])
+        self.assertIs(STALE, results['slow1'])
+
+    def test_sequential(self):
+        """Without threads, items after the deadline are stale."""
+        fan_out = FanOut(0)
+
+        def fetch(item):
+            time.sleep(0.1)
+            return item
+
+        results = [result for _, result in
+                   fan_out.map(fetch, range(5), deadline=0.15)]
+        self.assertEqual([0, 1, STALE, STALE, STALE], results)
+
+
+class TestPortList(unittest.TestCase):
+    """Test stale ports in the port list."""
+
+    def setUp(self):
+        """Create a switch with three ports, the second one slow to read."""
+        ifaces = {i: SimpleNamespace(port_number=i, name='eth%d' % i,
+                                     address=None, speed=1000)
+                  for i in (1, 2, 3)}
+        switch = SimpleNamespace(interfaces=ifaces)
+        controller = Mock(**{'get_switch_by_dpid.return_value': switch})
+        self.release = Event()
+        self.addCleanup(self.release.set)
+        fan_out = FanOut(2)
+        self.addCleanup(fan_out.shutdown)
+        for obj, name, value in ((StatsAPI, 'controller', controller),
+                                 (StatsAPI, 'fan_out', fan_out),
+                                 (settings, 'API_DEADLINE', 0.2),
+                                 (PortStatsAPI, '_get_speed',
+                                  lambda self, iface: iface.speed)):
+            patcher = patch.object(obj, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = patch.object(PortStatsAPI._rrd, 'fetch_latest',
+                               side_effect=self._fetch_latest)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _fetch_latest(self, index):
+        if index[1] == 2:
+            self.release.wait(5)
+        return dict.fromkeys(PortStatsAPI._rrd.data_sources, 100)
+
+    def test_stale(self):
+        """The slow port is returned without values and marked stale."""
+        with Flask(__name__).test_request_context('/'):
+            response = PortStatsAPI.get_ports_list('dpid')
+        ports = json.loads(response.get_data(as_text=True))['data']
+        self.assertEqual([1, 2, 3], [port['port'] for port in ports])
+        self.assertEqual([False, True, False],
+                         [port.get('stale', False) for port in ports])
+        self.assertEqual(0.1, ports[0]['rx_util'])
+        self.assertIsNone(ports[1]['rx_bytes'])
+        self.assertIsNone(ports[1]['rx_util'])
+
+
+class TestFlowList(unittest.TestCase):
+    """Test the deadline of the streamed flow list."""
+
+    def setUp(self):
+        """Create a switch with flows and a short deadline."""
+        flows = []
+        for number in range(5):
+            flow = SimpleNamespace(id='flow{}'.format(number))
+            flow.as_dict = lambda flow=flow: {'id': flow.id}
+            flows.append(flow)
+        controller = Mock(**{'get_switch_by_dpid.return_value':
+                             SimpleNamespace(flows=flows)})
+        fan_out = FanOut(2)
+        self.addCleanup(fan_out.shutdown)
+        for obj, name, value in ((StatsAPI, 'controller', controller),
+                                 (StatsAPI, 'fan_out', fan_out),
+                                 (settings, 'API_DEADLINE', 0.2)):
+            patcher = patch.object(obj, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = patch.object(FlowStatsAPI._rrd, 'fetch_latest',
+                               return_value={'byte_count': 1,
+                                             'packet_count': 1})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_slow_client(self):
+        """Reading the response slowly doesn't make flows stale."""
+        with Flask(__name__).test_request_context('/'):
+            response = FlowStatsAPI.get_flow_list('dpid')
+        chunks = []
+        for chunk in response.response:
+            time.sleep(0.1)
+            chunks.append(chunk)
+        flows = json.loads(''.join(chunks))['data']
+        self.assertEqual(5, len(flows))
+        self.assertEqual([{'Bps': 1, 'pps': 1}] * 5,
+                         [flow['stats'] for flow in flows])
+
+    def test_sort_by_rate(self):
+        """Rates are fetched with the deadline and stale flows go last."""
+        release = Event()
+        self.addCleanup(release.set)
+
+        def fetch_latest(index):
+            number = int(index[1][4:])
+            if number == 4:
+                release.wait(5)
+            elif number == 3:
+                time.sleep(0.05)
+            return {'byte_count': number, 'packet_count': number}
+
+        with patch.object(FlowStatsAPI._rrd, 'fetch_latest',
+                          side_effect=fetch_latest), \
+                Flask(__name__).test_request_context('/?sort=rate'):
+            start = time.perf_counter()
+            response = FlowStatsAPI.get_flow_list('dpid')
+            flows = json.loads(response.get_data(as_text=True))['data']
+        self.assertLess(time.perf_counter() - start, 1)
+        self.assertEqual(['flow3', 'flow2', 'flow1', 'flow0', 'flow4'],
+                         [flow['id'] for flow in flows])
+        self.assertEqual({'Bps': 3, 'pps': 3}, flows[0]['stats'])
+        self.assertTrue(flows[-1]['stats']['stale'])
@@ -0,0 +1,133 @@
+"""Test the index of the flows of each port."""
+import json
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from flask import Flask
+from pyof.v0x01.common.action import ActionOutput as ActionOutput01
+from pyof.v0x01.common.action import ListOfActions as ListOfActions01
+from pyof.v0x01.common.flow_match import Match as Match01
+from pyof.v0x01.controller2switch.common import FlowStats as FlowStats01
+from pyof.v0x04.common.action import ActionOutput, ListOfActions
+from pyof.v0x04.common.flow_instructions import (InstructionApplyAction,
+                                                 ListOfInstruction)
+from pyof.v0x04.common.flow_match import Match, OxmOfbMatchField, OxmTLV
+from pyof.v0x04.controller2switch.multipart_reply import FlowStats
+
+from napps.kytos.of_stats.flow_index import PortFlowIndex
+from napps.kytos.of_stats.flow_sample import FlowSample
+from napps.kytos.of_stats.stats import FlowStats as FlowStatsListener
+from napps.kytos.of_stats.stats_api import FlowStatsAPI
+
+
+def get_sample_01(**match):
+    """Return a sample of an OpenFlow 1.0 flow with output to port 3."""
+    kwargs = dict(table_id=0, match=Match01(**match), duration_sec=0,
+                  duration_nsec=0, priority=1, idle_timeout=0,
+                  hard_timeout=0, cookie=0, packet_count=0, byte_count=0,
+                  actions=ListOfActions01([ActionOutput01(port=3)]))
+    flow_stats = FlowStats01()
+    flow_stats.unpack(FlowStats01(length=96, **kwargs).pack())
+    return FlowSample('id', flow_stats)
+
+
+def get_sample_04():
+    """Return a sample of an OpenFlow 1.3 flow matching in_port 2."""
+    in_port = OxmTLV(oxm_field=OxmOfbMatchField.OFPXMT_OFB_IN_PORT,
+                     oxm_value=(2).to_bytes(4, 'big'))
+    actions = ListOfActions([ActionOutput(port=3),
+                             ActionOutput(port=0xfffffff8),
+                             ActionOutput(port=0xfffffffd)])
+    kwargs = dict(table_id=0, duration_sec=0, duration_nsec=0, priority=1,
+                  idle_timeout=0, hard_timeout=0, flags=0, cookie=0,
+                  packet_count=0, byte_count=0,
+                  match=Match(oxm_match_fields=[in_port]),
+                  instructions=ListOfInstruction([
+                      InstructionApplyAction(actions=actions)]))
+    length = len(FlowStats(length=0, **kwargs).pack())
+    flow_stats = FlowStats()
+    flow_stats.unpack(FlowStats(length=length, **kwargs).pack())
+    return FlowSample('id', flow_stats)
+
+
+def get_sample(flow_id, in_port, out_ports, rate, tstamp):
+    """Return a sample mock with counters growing at *rate* bytes/s."""
+    return SimpleNamespace(id=flow_id, byte_count=rate * tstamp,
+                           packet_count=tstamp,
+                           get_ports=lambda: (in_port, set(out_ports)))
+
+
+class TestPorts(unittest.TestCase):
+    """Test FlowSample.get_ports."""
+
+    def test_v0x01(self):
+        """Matched in_port and output ports."""
+        self.assertEqual((1, {3}), get_sample_01(in_port=1).get_ports())
+        self.assertEqual((None, {3}), get_sample_01().get_ports())
+
+    def test_v0x04(self):
+        """Output to in_port is the in_port, the controller is ignored."""
+        self.assertEqual((2, {2, 3}), get_sample_04().get_ports())
+
+
+class TestPortFlowIndex(unittest.TestCase):
+    """Test PortFlowIndex."""
+
+    def setUp(self):
+        """Index flows from port 1 to ports 2 and 3 in two cycles."""
+        self.index = PortFlowIndex()
+        for tstamp in (60, 120):
+            self.index.update('sw', [
+                get_sample('a', 1, [2], 100, tstamp),
+                get_sample('b', 1, [3], 300, tstamp),
+                get_sample('c', None, [2, 3], 200, tstamp)], tstamp)
+
+    def _get_ids(self, port, direction=None, limit=None):
+        return [flow['id'] for flow in
+                self.index.get_flows('sw', port, direction, limit)]
+
+    def test_sorted_by_rate(self):
+        """Highest byte rates first."""
+        flows = self.index.get_flows('sw', 2)
+        self.assertEqual(['c', 'a'], [flow['id'] for flow in flows])
+        self.assertEqual({'id': 'c', 'Bps': 200, 'pps': 1, 'in_port': False,
+                          'output': True}, flows[0])
+        self.assertEqual(['b', 'a'], self._get_ids(1))
+
+    def test_direction_and_limit(self):
+        """Filter by direction and keep the heaviest flows."""
+        self.assertEqual([], self._get_ids(1, 'out'))
+        self.assertEqual(['b', 'c'], self._get_ids(3, 'out'))
+        self.assertEqual(['b'], self._get_ids(3, limit=1))
+
+    def test_removed_flows(self):
+        """Flows not seen for two intervals leave the index."""
+        self.index.update('sw', [get_sample('a', 1, [2], 100, 300)], 300)
+        self.assertEqual(['a'], self._get_ids(1))
+        self.assertEqual([], self._get_ids(3))
+
+
+class TestPortFlowsAPI(unittest.TestCase):
+    """Test FlowStatsAPI.get_port_flows."""
+
+    def setUp(self):
+        """Use an index with a single flow."""
+        index = PortFlowIndex()
+        index.update('sw', [get_sample('a', 1, [2], 100, 60)], 60)
+        patcher = patch.object(FlowStatsListener, 'port_flows', index)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def _get(query):
+        with Flask(__name__).test_request_context('/?' + query):
+            response = FlowStatsAPI.get_port_flows('sw', 2)
+        return json.loads(response.get_data(as_text=True))
+
+    def test_response(self):
+        """Flows are in data and invalid arguments return an error."""
+        self.assertEqual(['a'], [flow['id']
+                                 for flow in self._get('')['data']])
+        for query in 'direction=both', 'limit=0':
+            self.assertEqual('400', self._get(query)['errors']['status'])
@@ -0,0 +1,99 @@
+"""Test filters and pagination of the flow list."""
+import json
+import unittest
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
+
+from flask import Flask
+
+from napps.kytos.of_stats.stats_api import FlowStatsAPI, StatsAPI
+
+
+def get_flow(number):
+    """Return a flow with two tables, two cookies and in_port = number."""
+    match = {'in_port': number}
+    flow = SimpleNamespace(id='flow{:03d}'.format(number),
+                           table_id=number % 2, cookie=number % 3,
+                           match=Mock(**{'as_dict.return_value': match}))
+    flow.as_dict = lambda: {'id': flow.id, 'table_id': flow.table_id}
+    return flow
+
+
+def fetch_latest(index):
+    """Byte rate is ten times the flow number."""
+    number = int(index[1][4:])
+    return {'byte_count': 10 * number, 'packet_count': number}
+
+
+class TestFlowList(unittest.TestCase):
+    """Test FlowStatsAPI.get_list."""
+
+    def setUp(self):
+        """Create a switch with 100 flows."""
+        switch = SimpleNamespace(flows=[get_flow(i) for i in range(100)])
+        controller = Mock(**{'get_switch_by_dpid.return_value': switch})
+        patcher = patch.object(StatsAPI, 'controller', controller)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch.object(FlowStatsAPI._rrd, 'fetch_latest',
+                               side_effect=fetch_latest)
+        self.fetch_mock = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def _get(query):
+        """Return the JSON of the flow list with *query* string."""
+        with Flask(__name__).test_request_context('/?' + query):
+            response = FlowStatsAPI.get_flow_list('dpid')
+        return json.loads(response.get_data(as_text=True))
+
+    def test_all(self):
+        """Without arguments, all flows are returned sorted by id."""
+        data = self._get('')
+        self.assertEqual(100, len(data['data']))
+        self.assertEqual('flow000', data['data'][0]['id'])
+        self.assertEqual({'Bps': 0, 'pps': 0}, data['data'][0]['stats'])
+        self.assertIsNone(data['next'])
+
+    def test_pages(self):
+        """Pages follow the cursor until there is no next one."""
+        ids, query, pages = [], 'limit=30', 0
+        while True:
+            data = self._get(query)
+            pages += 1
+            ids.extend(flow['id'] for flow in data['data'])
+            if data['next'] is None:
+                break
+            query = 'limit=30&cursor=' + data['next']
+        self.assertEqual(4, pages)
+        self.assertEqual(sorted(flow.id for flow in
+                                [get_flow(i) for i in range(100)]), ids)
+
+    def test_only_page_stats(self):
+        """Latest stats are read only for the flows of the page."""
+        self._get('limit=5')
+        self.assertEqual(5, self.fetch_mock.call_count)
+
+    def test_filters(self):
+        """Table, cookie and match filters are combined."""
+        data = self._get('table_id=1&cookie=0')
+        self.assertEqual(['flow003', 'flow009'],
+                         [flow['id'] for flow in data['data']][:2])
+        data = self._get('match.in_port=42')
+        self.assertEqual(['flow042'], [flow['id'] for flow in data['data']])
+
+    def test_sort_by_rate(self):
+        """Highest rates first, with minimum rate and pagination."""
+        data = self._get('sort=rate&min_rate=500&limit=20')
+        self.assertEqual(20, len(data['data']))
+        self.assertEqual('flow099', data['data'][0]['id'])
+        data = self._get('sort=rate&min_rate=500&limit=40&cursor=' +
+                         data['next'])
+        self.assertEqual(30, len(data['data']))
+        self.assertEqual('flow050', data['data'][-1]['id'])
+        self.assertIsNone(data['next'])
+
+    def test_invalid(self):
+        """Invalid arguments return an error."""
+        for query in 'sort=cookie', 'limit=0', 'cursor=x', 'table_id=a':
+            self.assertEqual('400', self._get(query)['errors']['status'])
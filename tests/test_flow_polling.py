@@ -0,0 +1,67 @@
+"""Test sharded flow polling."""
+import unittest
+from unittest.mock import Mock, patch
+
+from napps.kytos.of_stats import settings
+from napps.kytos.of_stats.stats import FlowStats
+
+
+def get_conn(version=0x04):
+    """Return a switch connection mock."""
+    conn = Mock()
+    conn.protocol.version = version
+    conn.switch.id = 'sw'
+    return conn
+
+
+class TestFlowPolling(unittest.TestCase):
+    """Test FlowStats shards."""
+
+    def test_all_flows(self):
+        """Default mode asks for all flows in a single slot."""
+        stats = FlowStats(Mock())
+        self.assertEqual(1, stats.slots)
+        stats.request(get_conn())
+        self.assertEqual(1, stats._buffer.put.call_count)
+
+    @patch.object(settings, 'FLOW_SHARD_TABLES', (0, 1, 2))
+    @patch.object(settings, 'FLOW_POLLING', 'table')
+    def test_table_shards(self):
+        """One request per table."""
+        stats = FlowStats(Mock())
+        self.assertEqual(3, stats.slots)
+        stats.request(get_conn(), 2)
+        event = stats._buffer.put.call_args[0][0]
+        self.assertEqual(2, event.content['message'].body.table_id)
+
+    @patch.object(settings, 'FLOW_SHARD_COOKIES', ((0, 1), (1, 1)))
+    @patch.object(settings, 'FLOW_POLLING', 'cookie')
+    def test_cookie_shards(self):
+        """OpenFlow 1.0 switches get all flows in the first slot."""
+        stats = FlowStats(Mock())
+        stats.request(get_conn(0x04), 1)
+        body = stats._buffer.put.call_args[0][0].content['message'].body
+        self.assertEqual((1, 1), (body.cookie, body.cookie_mask))
+
+        stats._buffer.reset_mock()
+        stats.request(get_conn(0x01), 1)
+        stats._buffer.put.assert_not_called()
+        stats.request(get_conn(0x01), 0)
+        stats._buffer.put.assert_called_once()
+
+    @patch('napps.kytos.of_stats.stats.time.time')
+    @patch.object(settings, 'FLOW_SHARD_TABLES', (0, 1))
+    @patch.object(settings, 'FLOW_POLLING', 'table')
+    def test_cycle_tstamp(self, time_mock):
+        """All shards of a cycle have the cycle start timestamp."""
+        stats = FlowStats(Mock())
+        xids = []
+        for slot, now in enumerate((100, 130)):
+            time_mock.return_value = now
+            stats.request(get_conn(), slot)
+            event = stats._buffer.put.call_args[0][0]
+            xids.append(event.content['message'].header.xid)
+        self.assertEqual([100, 100],
+                         [stats.get_tstamp(xid, 999) for xid in xids])
+        # Unknown or already used xid
+        self.assertEqual(999, stats.get_tstamp(xids[0], 999))
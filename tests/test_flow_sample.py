@@ -0,0 +1,103 @@
+"""Test lean flow samples and memoized flow ids."""
+import unittest
+from types import SimpleNamespace
+from unittest.mock import Mock
+
+from pyof.v0x01.common.action import ActionOutput, ListOfActions
+from pyof.v0x01.common.flow_match import Match
+from pyof.v0x01.controller2switch.common import FlowStats
+
+from napps.kytos.of_stats.flow_sample import FlowIdCache
+
+
+def get_flow_stats(cookie=1, port=1, counter=10):
+    """Return an unpacked OpenFlow 1.0 flow stats entry."""
+    packed = FlowStats(
+        length=96, table_id=0, match=Match(in_port=1), duration_sec=5,
+        duration_nsec=0, priority=1000, idle_timeout=0, hard_timeout=0,
+        cookie=cookie, packet_count=counter, byte_count=counter * 64,
+        actions=ListOfActions([ActionOutput(port=port)])).pack()
+    flow_stats = FlowStats()
+    flow_stats.unpack(packed)
+    return flow_stats
+
+
+def get_flow_class():
+    """Return an of_core Flow class mock whose ids count the calls."""
+    flow_class = Mock()
+    flow_class.from_of_flow_stats.side_effect = lambda fs, switch: \
+        SimpleNamespace(id='id{}'.format(
+            flow_class.from_of_flow_stats.call_count), match=None)
+    return flow_class
+
+
+class TestFlowIdCache(unittest.TestCase):
+    """Test FlowIdCache."""
+
+    def setUp(self):
+        """Create a small cache."""
+        self.cache = FlowIdCache(size=2)
+        self.switch = SimpleNamespace(id='sw')
+        self.flow_class = get_flow_class()
+
+    def _get_ids(self, flows_stats):
+        samples = self.cache.get_samples(self.switch, flows_stats,
+                                         self.flow_class)
+        return [sample.id for sample in samples]
+
+    def test_memoized(self):
+        """of_core is not called again for the same flow."""
+        first = self._get_ids([get_flow_stats(counter=10)])
+        second = self._get_ids([get_flow_stats(counter=20)])
+        self.assertEqual(first, second)
+        self.assertEqual(1, self.flow_class.from_of_flow_stats.call_count)
+        self.assertEqual((1, 1), (self.cache.hits, self.cache.misses))
+
+    def test_identity_fields(self):
+        """Cookie and actions are part of the key, counters are not."""
+        ids = self._get_ids([get_flow_stats(), get_flow_stats(cookie=2),
+                             get_flow_stats(port=2)])
+        self.assertEqual(3, len(set(ids)))
+
+    def test_lru(self):
+        """The least recently used id is dropped."""
+        self._get_ids([get_flow_stats(cookie=1), get_flow_stats(cookie=2)])
+        self._get_ids([get_flow_stats(cookie=1), get_flow_stats(cookie=3)])
+        self.assertEqual(2, len(self.cache))
+        self._get_ids([get_flow_stats(cookie=1)])
+        self.assertEqual(3, self.flow_class.from_of_flow_stats.call_count)
+        self._get_ids([get_flow_stats(cookie=2)])
+        self.assertEqual(4, self.flow_class.from_of_flow_stats.call_count)
+
+    def test_sample(self):
+        """Samples have the counters and update controller flows."""
+        sample = self.cache.get_samples(
+            self.switch, [get_flow_stats(cookie=7, counter=3)],
+            self.flow_class)[0]
+        self.assertEqual((0, 7, 3, 192), (sample.table_id, sample.cookie,
+                                          sample.packet_count,
+                                          sample.byte_count))
+        flow = SimpleNamespace(stats=SimpleNamespace())
+        sample.update_flow_stats(flow)
+        self.assertEqual((3, 192, 5), (flow.stats.packet_count,
+                                       flow.stats.byte_count,
+                                       flow.stats.duration_sec))
+        with self.assertRaises(AttributeError):
+            sample.extra = 1
+        self.assertFalse(hasattr(sample, '__dict__'))
+
+    def test_no_references(self):
+        """Samples don't keep the pyof entry, the switch or the flow class."""
+        flow_stats = get_flow_stats()
+        sample = self.cache.get_samples(self.switch, [flow_stats],
+                                        self.flow_class)[0]
+        ids = {id(getattr(sample, name)) for name in sample.__slots__}
+        for obj in (flow_stats, self.switch, self.flow_class):
+            self.assertNotIn(id(obj), ids)
+        self.assertEqual((1, {1}), sample.get_ports())
+
+    def test_key_bytes(self):
+        """Keys of separately unpacked entries are equal bytes."""
+        first = self.cache.get_key('sw', get_flow_stats())
+        self.assertEqual(first, self.cache.get_key('sw', get_flow_stats()))
+        self.assertIsInstance(first[-1], bytes)
@@ -0,0 +1,103 @@
+"""Test heavy-hitter-aware flow sampling."""
+import unittest
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
+
+from napps.kytos.of_stats import settings
+from napps.kytos.of_stats.heavy_hitters import (TAIL_ID, HeavyHitterSampler,
+                                                get_flow_timeout)
+
+
+def get_samples(cycle, n_flows=20):
+    """Return flow samples. Flows 0 and 1 send 1000 times more bytes."""
+    samples = []
+    for number in range(n_flows):
+        rate = 1000 if number < 2 else 1
+        samples.append(SimpleNamespace(id='flow{}'.format(number),
+                                       packet_count=cycle,
+                                       byte_count=cycle * rate))
+    return samples
+
+
+class TestHeavyHitterSampler(unittest.TestCase):
+    """Test HeavyHitterSampler."""
+
+    def setUp(self):
+        """Keep two heavy hitters and write tail flows every 5 minutes."""
+        self.rrd = Mock()
+        self.rrd.fetch_last_update.return_value = {}
+        self.sampler = HeavyHitterSampler(self.rrd, n_heavy=2,
+                                          tail_interval=300)
+
+    def _select(self, cycle):
+        """Return the selected flow ids of a cycle every minute."""
+        samples = get_samples(cycle)
+        selected = self.sampler.select('dpid', samples, cycle * 60)
+        return {sample.id for sample in selected}
+
+    def test_selection(self):
+        """New and heavy flows every cycle, tail flows at their interval."""
+        self.assertEqual(20, len(self._select(0)))
+        self.assertEqual({'flow0', 'flow1'}, self._select(1))
+        for cycle in range(2, 5):
+            self.assertEqual({'flow0', 'flow1'}, self._select(cycle))
+        self.assertEqual(20, len(self._select(5)))
+        self.assertEqual({'flow0', 'flow1'}, self._select(6))
+
+    def test_tail_aggregate(self):
+        """Increments of tail flows are written when a cycle ends."""
+        for cycle in range(4):
+            self._select(cycle)
+        self.sampler.flush()
+        calls = self.rrd.update.call_args_list
+        self.assertEqual([(('dpid', TAIL_ID), 60), (('dpid', TAIL_ID), 120),
+                          (('dpid', TAIL_ID), 180)],
+                         [call[0] for call in calls])
+        # 18 tail flows with one byte and one packet per cycle
+        self.assertEqual({'packet_count': 54, 'byte_count': 54},
+                         calls[-1][1])
+
+    def test_tail_only_aggregate(self):
+        """Without tail interval, tail flows are only seen once."""
+        self.sampler = HeavyHitterSampler(self.rrd, n_heavy=2,
+                                          tail_interval=0)
+        self._select(0)
+        for cycle in range(1, 20):
+            self.assertEqual({'flow0', 'flow1'}, self._select(cycle))
+
+    def test_continue_from_rrd(self):
+        """Tail totals continue from the last values written."""
+        self.rrd.fetch_last_update.return_value = {'packet_count': 1000,
+                                                   'byte_count': 5000}
+        self._select(0)
+        self._select(1)
+        self.sampler.flush()
+        self.assertEqual({'packet_count': 1018, 'byte_count': 5018},
+                         self.rrd.update.call_args[1])
+
+    def test_recent_rates(self):
+        """Flows that stop sending leave the heavy hitters."""
+        self._select(0)
+        self._select(1)
+        for cycle in range(2, 8):
+            samples = get_samples(cycle)
+            # flow0 stops, flow2 becomes heavy
+            samples[0].byte_count = 1000
+            samples[2].byte_count = cycle * 500
+            selected = self.sampler.select('dpid', samples, cycle * 60)
+        self.assertEqual({'flow1', 'flow2'},
+                         {sample.id for sample in selected})
+
+
+class TestFlowTimeout(unittest.TestCase):
+    """Test get_flow_timeout."""
+
+    def test_tail_interval(self):
+        """Tail flows are written before the heartbeat expires."""
+        for sampling, tail_interval, expected in (('all', 600, 120),
+                                                  ('heavy_hitters', 600, 720),
+                                                  ('heavy_hitters', 0, 120)):
+            with patch.multiple(settings, FLOW_SAMPLING=sampling,
+                                FLOW_TAIL_INTERVAL=tail_interval,
+                                FLOW_TIMEOUT=120, TIMEOUT=120):
+                self.assertEqual(expected, get_flow_timeout())
@@ -0,0 +1,128 @@
+"""Test the in-memory window of the latest rows."""
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+from napps.kytos.of_stats import settings, stats
+from napps.kytos.of_stats.hot_window import HotWindow
+from napps.kytos.of_stats.stats import RRD
+
+#: 20 seconds after a step boundary
+START = 1000040
+INDEX = ('dpid', 1)
+
+
+def get_window(rates=(10,) * 20, window=3600):
+    """Return a window with an update each step at the given rates."""
+    hot = HotWindow(('rx', 'tx'), window, 120)
+    counter = 0
+    for i, rate in enumerate((0,) + tuple(rates)):
+        counter += rate * 60
+        hot.update(INDEX, START + i * 60, rx=counter, tx=2 * counter)
+    return hot
+
+
+class TestHotWindow(unittest.TestCase):
+    """Test HotWindow rows."""
+
+    def test_rates(self):
+        """Rows have rates at step boundaries, None after the last one."""
+        tstamps, rows = get_window().fetch(INDEX, 1000199, 1001279)
+        self.assertEqual(range(1000200, 1001281, 60), tstamps)
+        self.assertEqual([(10.0, 20.0)] * 18 + [(None, None)], rows)
+
+    def test_first_rows(self):
+        """Rows before the first complete PDP are not in memory."""
+        tstamps, _ = get_window().fetch(INDEX, 999999, 1001219)
+        self.assertEqual(1000140, tstamps.start)
+
+    def test_interpolation(self):
+        """Rates are weighted by the seconds they last in each PDP."""
+        _, rows = get_window((10, 10, 40, 40)).fetch(INDEX, 1000199,
+                                                     1000259)
+        # PDP (1000140, 1000200]: 20 s at 10 and 40 s at 40
+        self.assertEqual((30.0, 60.0), rows[0])
+
+    def test_unknown(self):
+        """Gaps longer than the heartbeat are unknown, as in rrdtool."""
+        hot = HotWindow(('rx', 'tx'), 3600, 120)
+        for tstamp, counter in ((START, 0), (START + 60, 600),
+                                (START + 240, 2400), (START + 300, 3000)):
+            hot.update(INDEX, tstamp, rx=counter, tx=counter)
+        _, rows = hot.fetch(INDEX, 1000139, 1000319)
+        # 40 s unknown in the first PDP and all of the second and third
+        self.assertEqual([(None, None)] * 3, rows[:3])
+
+    def test_counter_wrap(self):
+        """Decreasing counters wrap at 32 bits."""
+        hot = HotWindow(('rx', 'tx'), 3600, 120)
+        for i, counter in enumerate((2 ** 32 - 600, 0, 600, 1200)):
+            hot.update(INDEX, START + i * 60, rx=counter, tx=counter)
+        _, rows = hot.fetch(INDEX, 1000139, 1000199)
+        self.assertEqual((10.0, 10.0), rows[0])
+
+    def test_window(self):
+        """Only the last window is kept."""
+        hot = get_window(window=600)
+        tstamps, _ = hot.fetch(INDEX, 999999, 1001219)
+        self.assertEqual(range(1000680, 1001221, 60), tstamps)
+
+
+class TestFetch(unittest.TestCase):
+    """Test RRD.fetch with a hot window."""
+
+    def setUp(self):
+        """Create an empty RRD file for :data:`INDEX`."""
+        folder = TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        patcher = patch.object(settings, 'DIR', Path(folder.name))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch.object(stats, 'rrdtool')
+        self.rrdtool = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.rrd = RRD('test', ('rx', 'tx'))
+        self.rrd.hot = get_window()
+        path = Path(self.rrd.get_rrd(INDEX))
+        path.parent.mkdir(parents=True)
+        path.touch()
+
+    def test_memory_only(self):
+        """Ranges in the window are not read from disk."""
+        tstamps, cols, rows = self.rrd.fetch(INDEX, 1000200, 1001220)
+        self.assertEqual(range(1000200, 1001221, 60), tstamps)
+        self.assertEqual(('rx', 'tx'), cols)
+        self.assertEqual(18, len(rows))
+        self.rrdtool.fetch.assert_not_called()
+
+    def test_merge(self):
+        """Rows older than the window are read from disk."""
+        self.rrdtool.fetch.return_value = (
+            (999960, 1000140, 60), ('rx', 'tx'), [(1.0, 2.0), (3.0, 4.0),
+                                                  (None, None)])
+        tstamps, _, rows = self.rrd.fetch(INDEX, 1000000, 1001220)
+        self.assertEqual(range(1000020, 1001221, 60), tstamps)
+        self.assertEqual([(1.0, 2.0), (3.0, 4.0), (10.0, 20.0)], rows[:3])
+        self.assertEqual(len(tstamps), len(rows))
+        args = self.rrdtool.fetch.call_args[0]
+        self.assertEqual(['--start', '999999', '--end', '1000080'],
+                         list(args[2:]))
+
+    def test_coarse_resolution(self):
+        """Consolidated rows are read from disk."""
+        self.rrdtool.fetch.return_value = ((999960, 1001400, 720),
+                                           ('rx', 'tx'), [(1.0, 2.0)] * 2)
+        self.rrd.fetch(INDEX, 1000000, 1001220, n_points=2)
+        self.rrdtool.fetch.assert_called_once()
+
+    def test_not_written(self):
+        """Missing files raise FileNotFoundError if memory can't answer."""
+        Path(self.rrd.get_rrd(INDEX)).unlink()
+        for start, end, n_points in ((900000, 960000, None),
+                                     (1000000, 1001220, 2),
+                                     ('first', 1001220, None)):
+            with self.assertRaises(FileNotFoundError):
+                self.rrd.fetch(INDEX, start, end, n_points)
+        self.rrdtool.fetch.assert_not_called()
+        self.rrdtool.first.assert_not_called()
@@ -0,0 +1,157 @@
+"""Test the append-only journal of RRD updates."""
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from threading import current_thread
+from unittest.mock import Mock, patch
+
+from napps.kytos.of_stats import settings
+from napps.kytos.of_stats.journal import (RECORD_HEADER, Journal,
+                                          pack_record, read_segment,
+                                          unpack_record)
+
+DPID = '00:00:00:00:00:00:00:01'
+
+
+def get_rrd(app='ports'):
+    """Return an RRD mock that writes in this process."""
+    return Mock(app=app, data_sources=('rx_bytes', 'tx_bytes'), writers=None)
+
+
+class TestRecords(unittest.TestCase):
+    """Test the binary records."""
+
+    def test_round_trip(self):
+        """Records keep app, index types, timestamp and values."""
+        record = pack_record('ports', (DPID, 3), 1234567890, [2 ** 64 - 1, 0])
+        self.assertEqual(('ports', (DPID, 3), 1234567890, (2 ** 64 - 1, 0)),
+                         unpack_record(record[6:]))
+
+    def test_long_strings(self):
+        """Strings are not limited to 255 bytes."""
+        name = 'group' * 60
+        record = pack_record(name, (name, 1), 1, [1, 2])
+        self.assertEqual((name, (name, 1), 1, (1, 2)),
+                         unpack_record(record[RECORD_HEADER.size:]))
+        with self.assertRaises(ValueError):
+            pack_record('ports', ('x' * 70000,), 1, [1])
+
+    def test_truncated(self):
+        """Records after a truncated or corrupted one are not read."""
+        records = [pack_record('flows', (DPID, 'abc'), tstamp, [1, 2])
+                   for tstamp in (1, 2, 3)]
+        with TemporaryDirectory() as folder:
+            path = Path(folder) / 'segment'
+            path.write_bytes(records[0] + records[1][:-1])
+            self.assertEqual(1, len(list(read_segment(path))))
+            corrupted = bytearray(records[1])
+            corrupted[-1] ^= 1
+            path.write_bytes(records[0] + bytes(corrupted) + records[2])
+            self.assertEqual(1, len(list(read_segment(path))))
+
+
+class TestJournal(unittest.TestCase):
+    """Test Journal."""
+
+    def setUp(self):
+        """Use a temporary folder and large batches."""
+        folder = TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        self.folder = Path(folder.name)
+        for name, value in (('JOURNAL_BATCH_SIZE', 1000),
+                            ('JOURNAL_FLUSH_INTERVAL', 3600),
+                            ('JOURNAL_SYNC_INTERVAL', None)):
+            patcher = patch.object(settings, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.rrd = get_rrd()
+
+    def _append(self, journal, n_updates):
+        for tstamp in range(n_updates):
+            journal.append(self.rrd, (DPID, 1), tstamp, rx_bytes=tstamp,
+                           tx_bytes=2 * tstamp)
+
+    def test_lazy_batch(self):
+        """Updates are written in a single call per file when flushed."""
+        journal = Journal(self.folder)
+        self._append(journal, 10)
+        self.rrd.update_many.assert_not_called()
+        journal.flush()
+        self.rrd.update_many.assert_called_once()
+        index, rows = self.rrd.update_many.call_args[0]
+        self.assertEqual((DPID, 1), index)
+        self.assertEqual((9, {'rx_bytes': 9, 'tx_bytes': 18}), rows[-1])
+        self.assertEqual(1, len(list(self.folder.glob('*.journal'))))
+
+    def test_batch_size(self):
+        """Reaching the batch size writes the updates in another thread."""
+        threads = []
+        self.rrd.update_many.side_effect = \
+            lambda index, rows: threads.append(current_thread())
+        with patch.object(settings, 'JOURNAL_BATCH_SIZE', 4):
+            journal = Journal(self.folder)
+            self._append(journal, 10)
+            journal.close()
+        self.assertNotEqual(current_thread(), threads[0])
+        self.assertEqual(10, sum(len(call[0][1]) for call in
+                                 self.rrd.update_many.call_args_list))
+
+    def test_replay_after_crash(self):
+        """Segments not flushed are replayed by the next journal."""
+        with patch.object(settings, 'JOURNAL_SEGMENT_SIZE', 100):
+            self._append(Journal(self.folder), 10)
+        self.assertGreater(len(list(self.folder.glob('*.journal'))), 1)
+        rrd = get_rrd()
+        self.assertEqual(10, Journal(self.folder).replay([rrd, get_rrd(
+            'flows')]))
+        index, rows = rrd.update_many.call_args[0]
+        self.assertEqual((DPID, 1), index)
+        self.assertEqual(list(range(10)), [row[0] for row in rows])
+        self.assertEqual([], list(self.folder.glob('*.journal')))
+
+    def test_close(self):
+        """Closing writes pending updates and leaves no segment."""
+        journal = Journal(self.folder)
+        self._append(journal, 3)
+        journal.close()
+        self.rrd.update_many.assert_called_once()
+        self.assertEqual([], list(self.folder.glob('*.journal')))
+
+    def test_failed_write(self):
+        """Segments of a failed write are kept for the next setup."""
+        journal = Journal(self.folder)
+        self.rrd.update_many.side_effect = OSError('disk full')
+        self._append(journal, 3)
+        journal.flush()
+        self.rrd.update_many.side_effect = None
+        self._append(journal, 3)
+        journal.close()
+        self.assertEqual(1, len(list(self.folder.glob('*.journal'))))
+        rrd = get_rrd()
+        self.assertEqual(3, Journal(self.folder).replay([rrd]))
+        self.assertEqual([], list(self.folder.glob('*.journal')))
+
+    def test_writer_confirmation(self):
+        """With writer processes, segments wait for their confirmation."""
+        writers = Mock(**{'sync.return_value': 7,
+                          'get_sync.return_value': None})
+        self.rrd.writers = writers
+        journal = Journal(self.folder)
+        self._append(journal, 3)
+        journal.flush()
+        writers.submit_many.assert_called_once()
+        self.assertEqual(2, len(list(self.folder.glob('*.journal'))))
+        writers.get_sync.return_value = True
+        journal.flush()
+        writers.get_sync.assert_called_with(7, 0)
+        self.assertEqual(1, len(list(self.folder.glob('*.journal'))))
+
+    def test_writer_failure(self):
+        """Segments are kept if a writer process fails to write them."""
+        writers = Mock(**{'sync.return_value': 1,
+                          'get_sync.return_value': False})
+        self.rrd.writers = writers
+        journal = Journal(self.folder)
+        self._append(journal, 3)
+        journal.close()
+        self.assertEqual(1, len(list(self.folder.glob('*.journal'))))
@@ -0,0 +1,232 @@
+"""Test memory accounting and the memory budget."""
+import json
+import os
+import sys
+import tracemalloc
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest.mock import Mock, patch
+
+from flask import Flask
+
+from napps.kytos.of_stats import settings
+from napps.kytos.of_stats.flow_index import PortFlowIndex
+from napps.kytos.of_stats.hot_window import HotWindow
+from napps.kytos.of_stats.memory import MemoryBudget, get_size
+from napps.kytos.of_stats.stats import RRD, Stats
+from napps.kytos.of_stats.stats_api import MemoryAPI
+from napps.kytos.of_stats.summary import SummaryStore
+
+MB = 2 ** 20
+
+
+class FlowSample:
+    """Flow stats sample with the attributes the port index reads."""
+
+    __slots__ = ('id', 'packet_count', 'byte_count', 'in_port')
+
+    def __init__(self, number):
+        """Flow from port number % 48 to the next port."""
+        self.id = 'flow{:04d}'.format(number)
+        self.packet_count = self.byte_count = 0
+        self.in_port = number % 48
+
+    def get_ports(self):
+        """Return in_port and output ports."""
+        return self.in_port, {(self.in_port + 1) % 48}
+
+
+def get_component(nbytes):
+    """Return a component of *nbytes* that evicts everything."""
+    component = Mock()
+    component.get_nbytes.return_value = nbytes
+    component.__len__ = Mock(return_value=1)
+
+    def evict(_):
+        freed = component.get_nbytes.return_value
+        component.get_nbytes.return_value = 0
+        return freed
+
+    component.evict.side_effect = evict
+    return component
+
+
+class TestGetSize(unittest.TestCase):
+    """Test get_size estimates."""
+
+    def test_slots(self):
+        """Objects with slots are measured with what they hold."""
+        sample = FlowSample(1)
+        expected = sum(sys.getsizeof(obj) for obj in (
+            sample, sample.id, sample.packet_count, sample.byte_count,
+            sample.in_port))
+        self.assertEqual(expected, get_size(sample))
+
+    def test_extrapolation(self):
+        """Big containers are estimated from their first items."""
+        dct = {number: 'value{:06d}'.format(number)
+               for number in range(100_000)}
+        exact = sys.getsizeof(dct) + sum(
+            sys.getsizeof(key) + sys.getsizeof(value)
+            for key, value in dct.items())
+        self.assertAlmostEqual(exact, get_size(dct), delta=exact * 0.05)
+
+    def test_references(self):
+        """Objects with a dict, like RRDs, are not measured inside."""
+        rrd = RRD('test', ('rx',))
+        self.assertEqual(sys.getsizeof(rrd), get_size(rrd))
+
+
+class TestMemoryBudget(unittest.TestCase):
+    """Test MemoryBudget.check."""
+
+    def setUp(self):
+        """Check on every call."""
+        patcher = patch.object(settings, 'MEMORY_CHECK_INTERVAL', 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_priorities(self):
+        """Lowest priorities are evicted first, only as needed."""
+        memory = MemoryBudget(150)
+        components = [get_component(60), get_component(60),
+                      get_component(60)]
+        for name, component, priority in zip('abc', components, (2, 0, 1)):
+            memory.register(name, component, priority)
+        self.assertEqual(60, memory.check())
+        components[0].evict.assert_not_called()
+        components[2].evict.assert_not_called()
+        self.assertEqual(60, memory.get_usage()['b']['evicted'])
+
+    def test_under_budget(self):
+        """Nothing is evicted under the budget or without one."""
+        for budget in 200, None:
+            memory = MemoryBudget(budget)
+            component = get_component(150)
+            memory.register('a', component)
+            with patch.object(settings, 'MEMORY_BUDGET', None):
+                self.assertEqual(0, memory.check())
+            component.evict.assert_not_called()
+
+    def test_interval(self):
+        """Checks are skipped during the check interval unless forced."""
+        memory = MemoryBudget(100)
+        memory.register('a', get_component(60))
+        memory.check()
+        memory.register('b', get_component(60))
+        with patch.object(settings, 'MEMORY_CHECK_INTERVAL', 60):
+            self.assertEqual(0, memory.check())
+            self.assertEqual(60, memory.check(force=True))
+
+
+class TestEviction(unittest.TestCase):
+    """Test LRU eviction of components."""
+
+    def test_latest_values(self):
+        """Least recently used latest values are evicted first."""
+        rrd = RRD('test', ('rx',))
+        with patch.object(RRD, '_fetch_latest', return_value={'rx': 1}):
+            for port in range(100):
+                rrd.fetch_latest(('dpid', port))
+            rrd.fetch_latest(('dpid', 0))
+        rrd.evict(rrd.get_nbytes() // 2)
+        self.assertLess(len(rrd), 60)
+        with patch.object(RRD, '_fetch_latest',
+                          return_value={'rx': 2}) as fetch_mock:
+            self.assertEqual({'rx': 1}, rrd.fetch_latest(('dpid', 0)))
+            self.assertEqual({'rx': 2}, rrd.fetch_latest(('dpid', 1)))
+        fetch_mock.assert_called_once()
+
+    def test_hot_window(self):
+        """Series updated least recently are evicted first."""
+        hot = HotWindow(('rx',), 600, 120)
+        for port in range(10):
+            hot.update(('dpid', port), 1000000, rx=0)
+        hot.update(('dpid', 0), 1000060, rx=600)
+        hot.evict(1)
+        self.assertNotIn(('dpid', 1), hot)
+        self.assertIn(('dpid', 0), hot)
+
+    def test_summaries(self):
+        """Evicted summaries are saved and loaded again."""
+        with TemporaryDirectory() as folder, \
+                patch.object(settings, 'DIR', Path(folder)):
+            store = SummaryStore('summaries', ('rx_bytes',))
+            store.update('dpid', 1, 100, rx_bytes=0)
+            store.update('dpid', 1, 160, rx_bytes=600)
+            self.assertGreater(store.evict(store.get_nbytes()), 0)
+            self.assertEqual(0, len(store))
+            summary = store.get_summary('dpid', 1)
+        self.assertEqual(10, summary['rx_bytes']['rate'])
+
+
+class TestManySeries(unittest.TestCase):
+    """Ingest 100k synthetic series under a budget."""
+
+    BUDGET = 2 * MB
+    SWITCHES = 100
+    PORTS = 48
+    FLOWS = 1000
+    #: Replies between budget checks, like MEMORY_CHECK_INTERVAL does
+    REPLIES_PER_CHECK = 10
+
+    def test_budget(self):
+        """Traced memory is under the budget after each check."""
+        samples = [FlowSample(number) for number in range(self.FLOWS)]
+        hot = HotWindow(('rx_bytes', 'tx_bytes'), 600, 120)
+        index = PortFlowIndex()
+        memory = MemoryBudget(self.BUDGET)
+        memory.register('port_hot', hot, 2)
+        memory.register('port_flows', index, 1)
+        tracemalloc.start()
+        self.addCleanup(tracemalloc.stop)
+        baseline = tracemalloc.get_traced_memory()[0]
+        maximum = estimated = 0
+        for switch in range(self.SWITCHES):
+            dpid = '00:00:00:00:00:00:{:02x}:{:02x}'.format(switch // 256,
+                                                            switch % 256)
+            for port in range(self.PORTS):
+                hot.update((dpid, port), 1000000, rx_bytes=0, tx_bytes=0)
+            index.update(dpid, samples, 1000000)
+            if switch % self.REPLIES_PER_CHECK == 0:
+                memory.check(force=True)
+                traced = tracemalloc.get_traced_memory()[0] - baseline
+                maximum = max(maximum, traced)
+                usage = memory.get_usage()
+                estimated = max(estimated, sum(item['bytes']
+                                               for item in usage.values()))
+        self.assertLessEqual(maximum, self.BUDGET,
+                             'Used {:.1f} MB'.format(maximum / MB))
+        # Both were evicted: the index first and the hot window too
+        self.assertGreater(usage['port_flows']['evicted'], usage['port_hot'][
+            'evicted'])
+        self.assertGreater(usage['port_hot']['evicted'], 0)
+        self.assertLessEqual(estimated, self.BUDGET)
+
+
+@unittest.skipUnless(os.environ.get('OF_STATS_SLOW_TESTS'),
+                     'Set OF_STATS_SLOW_TESTS=1 to run it (about 25 s)')
+class TestMillionSeries(TestManySeries):
+    """Ingest 1M synthetic series under a budget."""
+
+    BUDGET = 16 * MB
+    SWITCHES = 1000
+
+
+class TestMemoryAPI(unittest.TestCase):
+    """Test MemoryAPI.get_usage."""
+
+    def test_usage(self):
+        """Budget, total and components are returned."""
+        memory = MemoryBudget(1000)
+        memory.register('a', get_component(300), 1)
+        memory.register('b', get_component(200), 0)
+        with patch.object(Stats, 'memory', memory), \
+                Flask(__name__).test_request_context('/'):
+            response = MemoryAPI.get_usage()
+        data = json.loads(response.get_data(as_text=True))['data']
+        self.assertEqual(1000, data['budget'])
+        self.assertEqual(500, data['total'])
+        self.assertEqual({'bytes': 300, 'items': 1, 'priority': 1,
+                          'evicted': 0}, data['components']['a'])
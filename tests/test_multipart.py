@@ -0,0 +1,47 @@
+"""Test multipart reply reassembly."""
+import unittest
+from unittest.mock import patch
+
+from napps.kytos.of_stats.multipart import MultipartBuffer
+
+
+class TestMultipartBuffer(unittest.TestCase):
+    """Test MultipartBuffer."""
+
+    def setUp(self):
+        """Create an empty buffer."""
+        self.buffer = MultipartBuffer(timeout=60)
+
+    def test_single_part(self):
+        """A reply without more parts is returned at once."""
+        tstamp, stats = self.buffer.add('sw', 1, [1, 2], more=False)
+        self.assertEqual([1, 2], stats)
+        self.assertIsInstance(tstamp, int)
+        self.assertEqual(0, len(self.buffer))
+
+    @patch('napps.kytos.of_stats.multipart.time.time')
+    def test_several_parts(self, time_mock):
+        """Parts are joined and get the timestamp of the first one."""
+        time_mock.return_value = 100
+        self.assertIsNone(self.buffer.add('sw', 1, [1], more=True))
+        time_mock.return_value = 101
+        self.assertIsNone(self.buffer.add('sw', 1, [2], more=True))
+        self.assertEqual((100, [1, 2, 3]),
+                         self.buffer.add('sw', 1, [3], more=False))
+
+    def test_switches_and_xids(self):
+        """Replies of other switches or xids are not mixed."""
+        self.buffer.add('sw1', 1, [1], more=True)
+        self.buffer.add('sw2', 1, [2], more=True)
+        self.buffer.add('sw1', 2, [3], more=True)
+        self.assertEqual([1, 4], self.buffer.add('sw1', 1, [4], False)[1])
+        self.assertEqual(2, len(self.buffer))
+
+    @patch('napps.kytos.of_stats.multipart.time.time')
+    def test_expired(self, time_mock):
+        """Incomplete replies are dropped after the timeout."""
+        time_mock.return_value = 100
+        self.buffer.add('sw', 1, [1], more=True)
+        time_mock.return_value = 161
+        self.assertEqual([2], self.buffer.add('sw', 1, [2], False)[1])
+        self.assertEqual(0, len(self.buffer))
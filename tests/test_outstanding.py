@@ -0,0 +1,88 @@
+"""Test outstanding stats requests."""
+import json
+import unittest
+from unittest.mock import Mock, patch
+
+from flask import Flask
+
+from napps.kytos.of_stats.main import Main
+from napps.kytos.of_stats.outstanding import OutstandingRequests
+from napps.kytos.of_stats.stats import PortStats
+from napps.kytos.of_stats.stats_api import RequestsAPI
+
+
+class TestOutstandingRequests(unittest.TestCase):
+    """Test OutstandingRequests."""
+
+    def setUp(self):
+        """Create a tracker without pending requests."""
+        self.requests = OutstandingRequests(timeout=60)
+
+    @patch('napps.kytos.of_stats.outstanding.time.time')
+    def test_pending(self, time_mock):
+        """Do not send while the previous request is pending."""
+        time_mock.return_value = 100
+        self.assertTrue(self.requests.add('sw', 1))
+        self.assertFalse(self.requests.add('sw', 2))
+        # Other switches and shards are independent
+        self.assertTrue(self.requests.add('sw2', 3))
+        self.assertTrue(self.requests.add('sw', 4, shard=1))
+
+        time_mock.return_value = 103
+        self.assertEqual(3, self.requests.remove('sw', 1))
+        self.assertTrue(self.requests.add('sw', 5))
+
+    @patch('napps.kytos.of_stats.outstanding.time.time')
+    def test_timeout(self, time_mock):
+        """Send again after the timeout and ignore the late reply."""
+        time_mock.return_value = 100
+        self.requests.add('sw', 1)
+        time_mock.return_value = 160
+        self.assertTrue(self.requests.add('sw', 2))
+        self.assertIsNone(self.requests.remove('sw', 1))
+        self.assertTrue(self.requests.is_pending('sw'))
+        status = self.requests.get_status('sw')
+        self.assertEqual({'pending': [0], 'latency': None, 'timeouts': 1},
+                         status)
+
+    @patch('napps.kytos.of_stats.outstanding.time.time')
+    def test_latency_average(self, time_mock):
+        """The latency is a moving average."""
+        for xid, latency in enumerate((10, 20)):
+            time_mock.return_value = 100
+            self.requests.add('sw', xid)
+            time_mock.return_value = 100 + latency
+            self.requests.remove('sw', xid)
+        self.assertAlmostEqual(12, self.requests.get_status('sw')['latency'])
+
+    def test_unknown_reply(self):
+        """Replies to requests of other NApps are ignored."""
+        self.assertIsNone(self.requests.remove('sw', 1))
+
+    def test_skip_request(self):
+        """Stats are not requested while the previous reply is pending."""
+        stats = PortStats(Mock())
+        conn = Mock()
+        conn.protocol.version = 0x04
+        conn.switch.id = 'sw'
+        stats.request(conn)
+        stats.request(conn)
+        stats._buffer.put.assert_called_once()
+        xid = stats._buffer.put.call_args[0][0].content['message'].header.xid
+        stats.outstanding.remove('sw', xid)
+        stats.request(conn)
+        self.assertEqual(2, stats._buffer.put.call_count)
+
+
+class TestRequestsAPI(unittest.TestCase):
+    """Test the requests status endpoint."""
+
+    def test_status(self):
+        """Each stats type given at setup is listed."""
+        stats = PortStats(Mock())
+        stats.outstanding.add('sw', 1)
+        with patch.object(RequestsAPI, 'stats_list', (stats,)), \
+                Flask(__name__).test_request_context('/'):
+            response = Main.get_requests_status('sw')
+        data = json.loads(response.get_data(as_text=True))['data']
+        self.assertEqual([0], data['PortStats']['pending'])
@@ -0,0 +1,147 @@
+"""Test partitioned collection across several instances."""
+import unittest
+from collections import Counter
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest.mock import MagicMock, Mock, patch
+
+from flask import Flask
+
+from napps.kytos.of_stats import settings
+from napps.kytos.of_stats.main import Main
+from napps.kytos.of_stats.partition import (ROUTED_ARG, ROUTED_HEADER,
+                                            HashRing, Partition)
+from napps.kytos.of_stats.stats import PortStats
+from napps.kytos.of_stats.stats_api import PortStatsAPI, StatsAPI
+
+DPIDS = ['00:00:00:00:00:00:{:02x}:{:02x}'.format(i // 256, i % 256)
+         for i in range(600)]
+
+MEMBERS = {'a': {'url': 'http://10.0.0.1:8181'},
+           'b': {'url': 'http://10.0.0.2:8181'},
+           'c': {'url': 'http://10.0.0.3:8181', 'weight': 2}}
+
+
+class TestHashRing(unittest.TestCase):
+    """Test HashRing."""
+
+    def test_weights(self):
+        """Members own slices proportional to their weights."""
+        ring = HashRing({'a': 1, 'b': 1, 'c': 2, 'd': 0})
+        owners = Counter(ring.get_owner(dpid) for dpid in DPIDS)
+        self.assertNotIn('d', owners)
+        self.assertGreater(owners['c'], owners['a'])
+        self.assertGreater(owners['c'], owners['b'])
+
+    def test_new_member(self):
+        """A new member only takes dpids, the others keep their owners."""
+        before = HashRing({'a': 1, 'b': 1})
+        after = HashRing({'a': 1, 'b': 1, 'c': 1})
+        moved = [dpid for dpid in DPIDS
+                 if before.get_owner(dpid) != after.get_owner(dpid)]
+        self.assertTrue(moved)
+        self.assertEqual({'c'}, {after.get_owner(dpid) for dpid in moved})
+
+
+class TestInstances(unittest.TestCase):
+    """Run several instances sharing a temporary folder."""
+
+    def setUp(self):
+        """Use a temporary RRD folder and connected switches."""
+        folder = TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        for obj, name, value in ((settings, 'DIR', Path(folder.name)),
+                                 (settings, 'PARTITION_MEMBERS', MEMBERS),
+                                 (StatsAPI, 'partition', None),
+                                 (PortStats.rollups, 'owns', None)):
+            patcher = patch.object(obj, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.switches = {}
+        for dpid in DPIDS[:30]:
+            switch = Mock(dpid=dpid, id=dpid)
+            switch.is_connected.return_value = True
+            switch.connection.switch = switch
+            switch.connection.protocol.version = 0x01
+            self.switches[dpid] = switch
+
+    def start_napp(self, name):
+        """Run Main.setup of instance *name*, except for the loop."""
+        main = Main.__new__(Main)
+        main.controller = Mock(switches=self.switches)
+        with patch.object(Main, 'execute_as_loop'), \
+                patch.object(settings, 'PARTITION_NAME', name):
+            main.setup()
+        self.addCleanup(main.shutdown)
+        return main
+
+    def test_poll_owned(self):
+        """Each switch is polled by exactly one instance."""
+        polled = Counter()
+        for name in MEMBERS:
+            main = self.start_napp(name)
+            main.execute()
+            for call in main.controller.buffers.msg_out.put.call_args_list:
+                polled[call[0][0].content['destination'].switch.id] += 1
+        # Port and flow requests
+        self.assertEqual(dict.fromkeys(self.switches, 2), dict(polled))
+
+
+class TestRouting(unittest.TestCase):
+    """Test answers for dpids of other instances."""
+
+    def setUp(self):
+        """Make this instance 'a' and find a dpid of 'b'."""
+        partition = Partition(MEMBERS, 'a')
+        patcher = patch.object(StatsAPI, 'partition', partition)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.dpid = next(dpid for dpid in DPIDS
+                         if partition.get_owner(dpid) == 'b')
+        self.path = '/api/kytos/of_stats/v1/{}/ports'.format(self.dpid)
+
+    def _get(self, query='', headers=None):
+        with Flask(__name__).test_request_context(self.path + query,
+                                                  headers=headers):
+            return Main.get_ports_list(self.dpid)
+
+    def test_redirect(self):
+        """Redirect to the same path and query in the owner."""
+        response = self._get('?limit=5')
+        self.assertEqual(307, response.status_code)
+        self.assertEqual('http://10.0.0.2:8181' + self.path
+                         + '?limit=5&routed_by=a',
+                         response.headers['Location'])
+
+    @patch('napps.kytos.of_stats.partition.urlopen')
+    def test_proxy(self, urlopen_mock):
+        """Return the response of the owner, marked as routed."""
+        reply = MagicMock(status=200, headers={'Content-Type': 'text/plain'})
+        reply.read.return_value = b'owner'
+        urlopen_mock.return_value.__enter__.return_value = reply
+        with patch.object(settings, 'PARTITION_ROUTING', 'proxy'):
+            response = self._get()
+        self.assertEqual(b'owner', response.get_data())
+        proxied = urlopen_mock.call_args[0][0]
+        self.assertEqual('http://10.0.0.2:8181' + self.path,
+                         proxied.full_url)
+        self.assertEqual('a', proxied.get_header(ROUTED_HEADER.capitalize()))
+
+    @patch('napps.kytos.of_stats.partition.urlopen',
+           side_effect=OSError('unreachable'))
+    def test_proxy_error(self, _):
+        """Unavailable owners return a JSON error."""
+        with patch.object(settings, 'PARTITION_ROUTING', 'proxy'):
+            response = self._get()
+        self.assertEqual(502, response.status_code)
+        self.assertIn(b'unreachable', response.get_data())
+
+    @patch.object(PortStatsAPI, 'get_ports_list', return_value='local')
+    def test_routed_request(self, _):
+        """Requests routed by another instance are answered locally."""
+        self.assertEqual('local', self._get(headers={ROUTED_HEADER: 'b'}))
+
+    @patch.object(PortStatsAPI, 'get_ports_list', return_value='local')
+    def test_redirected_request(self, _):
+        """Requests redirected by another instance are answered locally."""
+        self.assertEqual('local', self._get('?{}=b'.format(ROUTED_ARG)))
@@ -0,0 +1,68 @@
+"""Test retention profiles and their migration."""
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+from napps.kytos.of_stats import migrate, settings
+from napps.kytos.of_stats.stats import RRD
+
+
+class TestRetention(unittest.TestCase):
+    """Test RRD archives of retention profiles."""
+
+    def test_legacy_profile(self):
+        """Each of the 17 steps has its own archive."""
+        archives = RRD._get_archives('legacy', ['AVERAGE'])
+        self.assertEqual(17, len(archives))
+        self.assertIn('RRA:AVERAGE:0.5:4h:30d', archives)
+        self.assertIn('RRA:AVERAGE:0.5:8h:30d', archives)
+
+    def test_consolidations(self):
+        """Each step has one archive per consolidation function."""
+        archives = RRD._get_archives('tiered', ['AVERAGE', 'MIN', 'MAX'])
+        self.assertEqual(9, len(archives))
+        self.assertIn('RRA:MAX:0.5:1d:2y', archives)
+
+    @patch.object(settings, 'RETENTION_PROFILE', 'tiered')
+    def test_default_profile(self):
+        """Settings define the profile of new files."""
+        self.assertEqual(['RRA:AVERAGE:0.5:1m:2d', 'RRA:AVERAGE:0.5:1h:90d',
+                          'RRA:AVERAGE:0.5:1d:2y'], RRD._get_archives())
+
+    def test_find_rrds(self):
+        """Only RRD files are migrated."""
+        with TemporaryDirectory() as folder:
+            for name in ('ports/sw/1.rrd', 'flows/sw/abc.rrd', 'sw.json'):
+                path = Path(folder, name)
+                path.parent.mkdir(parents=True, exist_ok=True)
+                path.touch()
+            rrds = migrate.find_rrds(folder)
+        self.assertEqual(['flows/sw/abc.rrd', 'ports/sw/1.rrd'],
+                         [rrd[len(folder) + 1:] for rrd in rrds])
+
+    @patch('napps.kytos.of_stats.stats.rrdtool')
+    @patch.object(migrate, 'rrdtool')
+    def test_migrate_file(self, rrdtool_mock, stats_rrdtool_mock):
+        """Data source definitions are kept in the migrated file."""
+        rrdtool_mock.info.return_value = {
+            'ds[packet_count].index': 1, 'ds[packet_count].type': 'COUNTER',
+            'ds[packet_count].minimal_heartbeat': 660,
+            'ds[packet_count].min': 0.0, 'ds[packet_count].max': None,
+            'ds[byte_count].index': 0, 'ds[byte_count].type': 'COUNTER',
+            'ds[byte_count].minimal_heartbeat': 660,
+            'ds[byte_count].min': 0.0, 'ds[byte_count].max': 1e+20}
+        with TemporaryDirectory() as folder:
+            rrd = str(Path(folder, 'abc.rrd'))
+            Path(rrd).touch()
+            stats_rrdtool_mock.create.side_effect = \
+                lambda path, *args: Path(path).touch()
+            self.assertIsNone(migrate.migrate_file(rrd, 'tiered',
+                                                   ['AVERAGE']))
+            self.assertEqual(['abc.rrd'], [path.name for path in
+                                           Path(folder).iterdir()])
+        args = stats_rrdtool_mock.create.call_args[0]
+        self.assertEqual(['DS:byte_count:COUNTER:660:0.0:1e+20',
+                          'DS:packet_count:COUNTER:660:0.0:U'],
+                         [arg for arg in args if arg.startswith('DS:')])
+        self.assertEqual(rrd, args[args.index('--source') + 1])
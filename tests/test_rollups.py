@@ -0,0 +1,157 @@
+"""Test switch, link and group rollups."""
+import json
+import unittest
+from unittest.mock import MagicMock, Mock, patch
+
+from flask import Flask
+
+from napps.kytos.of_stats.rollups import RollupStore
+from napps.kytos.of_stats.stats_api import RollupStatsAPI
+
+DATA_SOURCES = ('rx_bytes', 'tx_bytes', 'rx_dropped', 'tx_dropped',
+                'rx_errors', 'tx_errors')
+
+
+def get_port_stats(port_no, **counters):
+    """Return a port stats mock with zero for missing counters."""
+    stats = Mock()
+    stats.port_no.value = port_no
+    for ds in DATA_SOURCES:
+        getattr(stats, ds).value = counters.get(ds, 0)
+    return stats
+
+
+def get_switch(dpid, n_ports=2):
+    """Return a switch mock with interfaces not in links."""
+    switch = MagicMock()
+    switch.id = dpid
+    ifaces = {}
+    for port_no in range(1, n_ports + 1):
+        iface = Mock(link=None, id='{}:{}'.format(dpid, port_no))
+        ifaces[port_no] = iface
+    switch.get_interface_by_port_no.side_effect = ifaces.get
+    return switch
+
+
+class TestRollupStore(unittest.TestCase):
+    """Test RollupStore."""
+
+    def setUp(self):
+        """Use an RRD mock without previous values."""
+        self.rrd = Mock(data_sources=DATA_SOURCES, writers=None)
+        self.rrd.fetch_last_update.return_value = {}
+        self.store = RollupStore(self.rrd)
+
+    def _get_written(self, key):
+        """Return the last values written for rollup *key*."""
+        self.store.flush()
+        calls = [call for call in self.rrd.update.call_args_list
+                 if call[0][0] == key]
+        return calls[-1][1]
+
+    def test_switch_total(self):
+        """Sum the increments of all ports except the local one."""
+        switch = get_switch('dpid')
+        self.store.update(switch, [get_port_stats(1, rx_bytes=10),
+                                   get_port_stats(2, rx_bytes=100),
+                                   get_port_stats(0xfffe, rx_bytes=50)], 1)
+        self.store.update(switch, [get_port_stats(1, rx_bytes=15),
+                                   get_port_stats(2, rx_bytes=120),
+                                   get_port_stats(0xfffe, rx_bytes=90)], 61)
+        self.assertEqual(25, self._get_written(('switches', 'dpid'))
+                         ['rx_bytes'])
+
+    def test_counter_reset(self):
+        """A port counter reset doesn't decrease the total."""
+        switch = get_switch('dpid', 1)
+        for tstamp, value in ((1, 100), (61, 200), (121, 30)):
+            self.store.update(switch, [get_port_stats(1, tx_bytes=value)],
+                              tstamp)
+        self.assertEqual(130, self._get_written(('switches', 'dpid'))
+                         ['tx_bytes'])
+
+    def test_continue_from_rrd(self):
+        """Totals continue from the last values written before a restart."""
+        self.rrd.fetch_last_update.return_value = dict.fromkeys(DATA_SOURCES,
+                                                                1000)
+        switch = get_switch('dpid', 1)
+        self.store.update(switch, [get_port_stats(1, rx_bytes=5)], 1)
+        self.store.update(switch, [get_port_stats(1, rx_bytes=8)], 61)
+        self.assertEqual(1003, self._get_written(('switches', 'dpid'))
+                         ['rx_bytes'])
+
+    def test_continue_after_writers(self):
+        """Totals are loaded after writers confirm the previous updates."""
+        calls = []
+        self.rrd.writers = Mock()
+        self.rrd.writers.get_sync.side_effect = \
+            lambda token, timeout: calls.append('sync') or True
+        self.rrd.fetch_last_update.side_effect = \
+            lambda key: calls.append('load') or {}
+        self.store.update(get_switch('a', 1), [get_port_stats(1)], 1)
+        self.store.update(get_switch('b', 1), [get_port_stats(1)], 1)
+        self.assertEqual(['sync', 'load', 'load'], calls)
+
+    def test_write_cycle(self):
+        """Write the totals of a timestamp only when a newer one arrives."""
+        switch = get_switch('dpid', 1)
+        self.store.update(switch, [get_port_stats(1)], 1)
+        self.store.update(switch, [get_port_stats(1)], 1)
+        self.rrd.update.assert_not_called()
+        self.store.update(switch, [get_port_stats(1)], 61)
+        self.rrd.update.assert_called_once()
+        self.assertEqual(1, self.rrd.update.call_args[0][1])
+
+    def test_link(self):
+        """Bytes from endpoint A, drops from both with swapped directions."""
+        sw_a, sw_b = get_switch('a', 1), get_switch('b', 1)
+        iface_a = sw_a.get_interface_by_port_no(1)
+        iface_b = sw_b.get_interface_by_port_no(1)
+        link = Mock(endpoint_a=iface_b, endpoint_b=iface_a)
+        iface_a.link = iface_b.link = link
+        for tstamp in (1, 61):
+            mult = tstamp // 60 + 1
+            self.store.update(sw_a, [get_port_stats(
+                1, tx_bytes=10 * mult, rx_bytes=20 * mult,
+                tx_dropped=mult)], tstamp)
+            self.store.update(sw_b, [get_port_stats(
+                1, rx_bytes=1000 * mult, rx_dropped=2 * mult)], tstamp + 1)
+        link_id = RollupStore.get_link_id('a:1', 'b:1')
+        written = self._get_written(('links', link_id))
+        self.assertEqual(10, written['tx_bytes'])
+        self.assertEqual(20, written['rx_bytes'])
+        self.assertEqual(3, written['tx_dropped'])
+        self.assertEqual(0, written['rx_dropped'])
+
+    def test_groups(self):
+        """Groups sum ports of different switches."""
+        sw_a, sw_b = get_switch('a', 2), get_switch('b', 2)
+        groups = {'uplinks': [('a', 1), ('b', 2)]}
+        with patch('napps.kytos.of_stats.settings.PORT_GROUPS', groups):
+            for tstamp in (1, 61):
+                for switch in sw_a, sw_b:
+                    self.store.update(switch, [
+                        get_port_stats(1, rx_bytes=tstamp),
+                        get_port_stats(2, rx_bytes=2 * tstamp)], tstamp)
+        self.assertEqual(180, self._get_written(('groups', 'uplinks'))
+                         ['rx_bytes'])
+        rollups = self.store.get_rollups()
+        self.assertIn({'kind': 'groups', 'id': 'uplinks',
+                       'members': ['a:1', 'b:2']}, rollups)
+
+
+class TestRollupStatsAPI(unittest.TestCase):
+    """Test RollupStatsAPI.get_rollup_stats."""
+
+    @patch.object(RollupStatsAPI, '_rrd')
+    def test_points(self, rrd_mock):
+        """Points of a rollup are returned without a switch lookup."""
+        rrd_mock.fetch.return_value = ([60, 120], ['rx_bytes'],
+                                       [(1.0,), (2.0,)])
+        with Flask(__name__).test_request_context('/'):
+            response = RollupStatsAPI.get_rollup_stats('switches', 'a')
+        data = json.loads(response.get_data(as_text=True))['data']
+        self.assertEqual({'timestamps': [60, 120], 'rx_bytes': [1.0, 2.0]},
+                         data)
+        rrd_mock.fetch.assert_called_once_with(('switches', 'a'), None, None,
+                                               30)
@@ -1,9 +1,11 @@
 """Test of.stats app."""
 import os
 import unittest
-from tempfile import mkstemp
+from pathlib import Path
+from tempfile import TemporaryDirectory, mkstemp
 from unittest.mock import patch  # noqa (isort conflict)
 
+from napps.kytos.of_stats import settings
 from napps.kytos.of_stats.settings import STATS_INTERVAL
 from napps.kytos.of_stats.stats import RRD
 
@@ -57,3 +59,88 @@ class TestRRD(unittest.TestCase):
         rrd = RRD('app_folder', ['data_source'])
         row = rrd.fetch_latest('index')
         self.assertEqual(row, {})
+
+    @patch.object(RRD, '_fetch_latest', return_value={'rx': 1})
+    def test_latest_cache(self, fetch_mock):
+        """Latest values are read from disk again only after an update."""
+        rrd = RRD('app_folder', ['rx'])
+        self.assertEqual({'rx': 1}, rrd.fetch_latest(('dpid', 1)))
+        rrd.fetch_latest(('dpid', 1))
+        self.assertEqual(1, fetch_mock.call_count)
+
+        with patch('napps.kytos.of_stats.stats.rrdtool'), \
+                patch.object(RRD, 'get_or_create_rrd',
+                             return_value=rrd.get_rrd(('dpid', 1))):
+            rrd.update(('dpid', 1), 1234567890, rx=2)
+        rrd.fetch_latest(('dpid', 1))
+        self.assertEqual(2, fetch_mock.call_count)
+
+    def test_latest_written_meanwhile(self):
+        """Values read while the file is written are not cached."""
+        rrd = RRD('app_folder', ['rx'])
+        path = rrd.get_rrd(('dpid', 1))
+
+        def fetch_latest(index):  # pylint: disable=unused-argument
+            # Written right after it was read
+            rrd._uncache(path)  # pylint: disable=protected-access
+            return {'rx': 1}
+
+        with patch.object(RRD, '_fetch_latest',
+                          side_effect=fetch_latest) as fetch_mock:
+            rrd.fetch_latest(('dpid', 1))
+            rrd.fetch_latest(('dpid', 1))
+        self.assertEqual(2, fetch_mock.call_count)
+
+    @patch.object(RRD, '_fetch_latest', return_value={'rx': 1})
+    def test_latest_writer_pending(self, fetch_mock):
+        """Values are cached only after a writer process wrote the update."""
+        rrd = RRD('app_folder', ['rx'])
+        rrd.expect_update(('dpid', 1), 200)
+        with patch.object(RRD, '_get_last', return_value=100):
+            rrd.fetch_latest(('dpid', 1))
+            rrd.fetch_latest(('dpid', 1))
+        self.assertEqual(2, fetch_mock.call_count)
+        with patch.object(RRD, '_get_last', return_value=200):
+            rrd.fetch_latest(('dpid', 1))
+            rrd.fetch_latest(('dpid', 1))
+        self.assertEqual(3, fetch_mock.call_count)
+
+    @patch('napps.kytos.of_stats.stats.time.sleep')
+    @patch.object(RRD, '_fetch_latest', return_value={'rx': 1})
+    def test_warm_up(self, fetch_mock, sleep_mock):
+        """Files are indexed and other threads run between their reads."""
+        with TemporaryDirectory() as folder, \
+                patch.object(settings, 'DIR', Path(folder)):
+            rrd = RRD('app_folder', ['rx'])
+            for port in (1, 2):
+                path = Path(rrd.get_rrd(('dpid', port)))
+                path.parent.mkdir(parents=True, exist_ok=True)
+                path.touch()
+            rrd.warm_up()
+            self.assertEqual(2, fetch_mock.call_count)
+            self.assertEqual(2, sleep_mock.call_count)
+            self.assertEqual(4, len(rrd))
+
+    def test_deleted_file(self):
+        """Deleted files are not known to exist anymore."""
+        rrd = RRD('app_folder', ['rx'])
+        # pylint: disable=protected-access
+        rrd._known.add(rrd.get_rrd(('dpid', 1)))
+        with self.assertRaises(FileNotFoundError):
+            rrd.fetch(('dpid', 1))
+        self.assertEqual(0, len(rrd))
+
+    @patch('napps.kytos.of_stats.stats.rrdtool')
+    def test_update_many(self, rrdtool_mock):
+        """Rows are sorted, batched and skipped if not newer than the file."""
+        rrdtool_mock.last.return_value = 100
+        rrd = RRD('app_folder', ['rx', 'tx'])
+        rows = [(130, {'rx': 3, 'tx': 4}), (90, {'rx': 0, 'tx': 0}),
+                (120, {'rx': 1, 'tx': 2}), (140, {'rx': 5, 'tx': 6})]
+        with patch.object(RRD, 'get_or_create_rrd',
+                          return_value='file.rrd') as create_mock:
+            rrd.update_many(('dpid', 1), rows, batch_size=2)
+        create_mock.assert_called_once_with(('dpid', 1), 89)
+        self.assertEqual([('file.rrd', '120:1:2', '130:3:4'),
+                          ('file.rrd', '140:5:6')],
+                         [call[1] for call in rrdtool_mock.update.mock_calls])
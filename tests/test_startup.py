@@ -0,0 +1,82 @@
+"""Test NApp startup time."""
+import os
+import subprocess
+import sys
+import time
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest.mock import Mock, patch
+
+from flask import Flask
+
+from napps.kytos.of_stats import settings
+from napps.kytos.of_stats.main import Main
+from napps.kytos.of_stats.stats_api import PortStatsAPI
+
+#: Maximum seconds from setup to the first poll or API response
+MAX_STARTUP_TIME = 1
+
+DPID = '00:00:00:00:00:00:00:01'
+
+
+class TestStartup(unittest.TestCase):
+    """Measure time to first poll and to first API response."""
+
+    def setUp(self):
+        """Use a temporary RRD folder and a switch with one port."""
+        folder = TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        patcher = patch.object(settings, 'DIR', Path(folder.name))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        switch = Mock(dpid=DPID, id=DPID)
+        switch.is_connected.return_value = True
+        switch.connection.protocol.version = 0x01
+        iface = Mock(port_number=1, address='00:00:00:00:00:01', speed=None)
+        iface.name = 'eth1'
+        switch.interfaces = {1: iface}
+        self.controller = Mock()
+        self.controller.switches = {DPID: switch}
+        self.controller.get_switch_by_dpid.return_value = switch
+
+    def start_napp(self):
+        """Run Main.setup as Kytos does, except for the loop."""
+        main = Main.__new__(Main)
+        main.controller = self.controller
+        with patch.object(Main, 'execute_as_loop'):
+            main.setup()
+        self.addCleanup(main.shutdown)
+        return main
+
+    def test_lazy_imports(self):
+        """rrdtool and of_core are not imported with the stats module."""
+        code = ('import sys; import napps.kytos.of_stats.stats; '
+                'print([m for m in ("rrdtool", "napps.kytos.of_core.flow") '
+                'if m in sys.modules])')
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+        output = subprocess.check_output([sys.executable, '-c', code],
+                                         env=env)
+        self.assertEqual(b'[]', output.strip())
+
+    def test_time_to_first_poll(self):
+        """Stats requests are sent right after setup."""
+        start = time.perf_counter()
+        main = self.start_napp()
+        main.execute()
+        elapsed = time.perf_counter() - start
+        self.assertEqual(2, self.controller.buffers.msg_out.put.call_count)
+        self.assertLess(elapsed, MAX_STARTUP_TIME,
+                        'Time to first poll: {:.3f}s'.format(elapsed))
+
+    def test_time_to_first_api_response(self):
+        """The REST API answers right after setup."""
+        start = time.perf_counter()
+        self.start_napp()
+        with Flask(__name__).test_request_context('/'):
+            response = PortStatsAPI.get_ports_list(DPID)
+        elapsed = time.perf_counter() - start
+        self.assertEqual(200, response.status_code)
+        self.assertLess(elapsed, MAX_STARTUP_TIME,
+                        'Time to first API response: {:.3f}s'.format(elapsed))
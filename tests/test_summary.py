@@ -0,0 +1,169 @@
+"""Test rolling aggregates."""
+import json
+import time
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from threading import Thread
+from unittest.mock import patch
+
+from napps.kytos.of_stats import settings
+from napps.kytos.of_stats.summary import (QuantileSketch, SeriesSummary,
+                                          SummaryStore)
+
+
+class TestQuantileSketch(unittest.TestCase):
+    """Test QuantileSketch."""
+
+    def test_relative_error(self):
+        """Quantiles are within the relative error."""
+        sketch = QuantileSketch(0.01)
+        for value in range(1, 10001):
+            sketch.add(value)
+        self.assertAlmostEqual(9500, sketch.quantile(0.95), delta=95)
+        self.assertAlmostEqual(5000, sketch.quantile(0.5), delta=50)
+
+    def test_merge(self):
+        """Merging is the same as adding all values to one sketch."""
+        first, second, both = (QuantileSketch(0.01) for _ in range(3))
+        for value in range(100):
+            (first if value % 2 else second).add(value)
+            both.add(value)
+        first.merge(second)
+        self.assertEqual(both.as_dict(), first.as_dict())
+        self.assertEqual(both.quantile(0.95), first.quantile(0.95))
+
+    def test_serialization(self):
+        """A sketch can be restored from its dictionary."""
+        sketch = QuantileSketch(0.01)
+        for value in (0, 1, 10, 100):
+            sketch.add(value)
+        restored = QuantileSketch.from_dict(sketch.as_dict())
+        self.assertEqual(4, restored.count)
+        self.assertEqual(sketch.quantile(0.9), restored.quantile(0.9))
+
+
+class TestSeriesSummary(unittest.TestCase):
+    """Test SeriesSummary."""
+
+    def test_rates_and_peaks(self):
+        """Rates come from counters and the peak is kept."""
+        summary = SeriesSummary()
+        # 2018-04-20 00:00:00 UTC
+        start = 1524182400
+        for i, counter in enumerate((0, 600, 3600, 4200)):
+            summary.update(counter, start + i * 60)
+        result = summary.get_summary()
+        self.assertEqual(10, result['rate'])
+        self.assertEqual(50, result['day']['peak'])
+        self.assertEqual('2018-04-20', result['day']['period'])
+        self.assertEqual('2018-04', result['month']['period'])
+        self.assertEqual(3, result['month']['samples'])
+        self.assertIsNone(result['previous_day'])
+
+    def test_counter_reset(self):
+        """No rate is calculated when the counter goes backwards."""
+        summary = SeriesSummary()
+        summary.update(1000, 100)
+        summary.update(10, 160)
+        self.assertIsNone(summary.rate)
+        summary.update(70, 220)
+        self.assertEqual(1, summary.rate)
+
+    def test_older_sample(self):
+        """Samples that are not newer than the last one are ignored."""
+        summary = SeriesSummary()
+        summary.update(0, 100)
+        summary.update(600, 160)
+        summary.update(300, 130)
+        summary.update(900, 160)
+        self.assertEqual((600, 160, 10), (summary.counter, summary.tstamp,
+                                          summary.rate))
+        summary.update(1200, 220)
+        self.assertEqual(10, summary.rate)
+
+    def test_new_day(self):
+        """The current day becomes the previous one."""
+        summary = SeriesSummary()
+        midnight = 1524182400
+        for tstamp in (midnight - 120, midnight - 60, midnight + 60):
+            summary.update(tstamp, tstamp)
+        result = summary.get_summary()
+        self.assertEqual('2018-04-19', result['previous_day']['period'])
+        self.assertEqual('2018-04-20', result['day']['period'])
+
+
+class TestSummaryStore(unittest.TestCase):
+    """Test SummaryStore persistence."""
+
+    def test_save_and_load(self):
+        """Summaries survive a new store instance."""
+        with TemporaryDirectory() as folder, \
+                patch.object(settings, 'DIR', Path(folder)):
+            store = SummaryStore('summaries', ('rx_bytes',))
+            store.update('dpid', 1, 100, rx_bytes=0)
+            store.update('dpid', 1, 160, rx_bytes=600)
+            store.save_all()
+
+            loaded = SummaryStore('summaries', ('rx_bytes',))
+            self.assertEqual(10,
+                             loaded.get_summary('dpid', 1)['rx_bytes']['rate'])
+            self.assertIsNone(loaded.get_summary('dpid', 2))
+
+    def test_unknown_dpid(self):
+        """Reading unknown dpids doesn't add them."""
+        with TemporaryDirectory() as folder, \
+                patch.object(settings, 'DIR', Path(folder)):
+            store = SummaryStore('summaries', ('rx_bytes',))
+            self.assertIsNone(store.get_summary('unknown', 1))
+            self.assertEqual(0, len(store))
+            store.save_all()
+            self.assertFalse(Path(folder, 'summaries').exists())
+
+    def test_concurrent_saves(self):
+        """Threads saving the same dpid don't share the temporary file."""
+        dump = json.dump
+
+        def slow_dump(*args, **kwargs):
+            time.sleep(0.05)
+            dump(*args, **kwargs)
+
+        with TemporaryDirectory() as folder, \
+                patch.object(settings, 'DIR', Path(folder)), \
+                patch('napps.kytos.of_stats.summary.json.dump', slow_dump):
+            store = SummaryStore('summaries', ('rx_bytes',))
+            store.update('dpid', 1, 100, rx_bytes=0)
+            errors = []
+
+            def save():
+                try:
+                    store.save('dpid', force=True)
+                except OSError as error:
+                    errors.append(error)
+
+            threads = [Thread(target=save) for _ in range(2)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual([], errors)
+            self.assertEqual(['dpid.json'],
+                             [path.name for path in
+                              Path(folder, 'summaries').iterdir()])
+
+    def test_older_content(self):
+        """Older content doesn't overwrite a newer file."""
+        with TemporaryDirectory() as folder, \
+                patch.object(settings, 'DIR', Path(folder)):
+            store = SummaryStore('summaries', ('rx_bytes',))
+            store.update('dpid', 1, 100, rx_bytes=0)
+            # pylint: disable=protected-access
+            series = store._dpids['dpid']
+            older = store._get_snapshot('dpid', series)
+            store.update('dpid', 1, 160, rx_bytes=600)
+            store._write('dpid', *store._get_snapshot('dpid', series))
+            store._write('dpid', *older)
+
+            loaded = SummaryStore('summaries', ('rx_bytes',))
+            self.assertEqual(10,
+                             loaded.get_summary('dpid', 1)['rx_bytes']['rate'])
@@ -0,0 +1,90 @@
+"""Test RRD writer processes."""
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest.mock import Mock, patch
+
+from napps.kytos.of_stats import settings
+from napps.kytos.of_stats.stats import RRD
+from napps.kytos.of_stats.writers import WriterPool
+
+
+class TestWriterPool(unittest.TestCase):
+    """Test WriterPool."""
+
+    def test_partition(self):
+        """A dpid is always written by the same worker."""
+        pool = WriterPool(4)
+        workers = {pool.get_worker('00:00:00:00:00:00:00:{:02x}'.format(i))
+                   for i in range(64)}
+        self.assertEqual({0, 1, 2, 3}, workers)
+        self.assertEqual(pool.get_worker('dpid'), pool.get_worker('dpid'))
+
+    def test_drain_on_stop(self):
+        """All submitted updates are written before the workers stop."""
+        with TemporaryDirectory() as folder, \
+                patch.object(settings, 'DIR', Path(folder)):
+            rrd = RRD('test', ('rx', 'tx'))
+            pool = WriterPool(2)
+            pool.start()
+            dpids = ['dpid{}'.format(i) for i in range(8)]
+            tstamp = 1234567800
+            for dpid in dpids:
+                pool.submit(rrd, (dpid, 1), tstamp, rx=1, tx=2)
+            pool.stop()
+            for dpid in dpids:
+                self.assertTrue(Path(rrd.get_rrd((dpid, 1))).exists())
+
+    def test_submit_many(self):
+        """Rows of an index are written in a single message."""
+        with TemporaryDirectory() as folder, \
+                patch.object(settings, 'DIR', Path(folder)):
+            rrd = RRD('test', ('rx', 'tx'))
+            pool = WriterPool(1)
+            pool.start()
+            rows = [(1234567800 + i, {'rx': i, 'tx': i}) for i in range(3)]
+            pool.submit_many(rrd, ('dpid', 1), rows)
+            pool.stop()
+            self.assertTrue(Path(rrd.get_rrd(('dpid', 1))).exists())
+
+    def test_sync(self):
+        """Syncs confirm whether all previous updates were written."""
+        with TemporaryDirectory() as folder, \
+                patch.object(settings, 'DIR', Path(folder)):
+            rrd = RRD('test', ('rx', 'tx'))
+            pool = WriterPool(2)
+            pool.start()
+            self.addCleanup(pool.stop)
+            for dpid in 'ab':
+                pool.submit(rrd, (dpid, 1), 1234567800, rx=1, tx=2)
+            self.assertTrue(pool.get_sync(pool.sync(), timeout=30))
+            # Missing data source
+            pool.submit(rrd, ('a', 1), 1234567860, rx=1)
+            self.assertFalse(pool.get_sync(pool.sync(), timeout=30))
+            self.assertTrue(pool.get_sync(pool.sync(), timeout=30))
+
+    def test_batch(self):
+        """Updates of a batch are sent in one message per worker."""
+        with TemporaryDirectory() as folder, \
+                patch.object(settings, 'DIR', Path(folder)):
+            rrd = RRD('test', ('rx', 'tx'))
+            pool = WriterPool(2)
+            pool.start()
+            self.addCleanup(pool.stop)
+            dpids = ['dpid{}'.format(i) for i in range(8)]
+            # pylint: disable=protected-access
+            with patch.object(pool, '_queues',
+                              [Mock(wraps=queue) for queue in pool._queues]):
+                with pool.batch():
+                    for dpid in dpids:
+                        for port in (1, 2):
+                            pool.submit(rrd, (dpid, port), 1234567800, rx=1,
+                                        tx=2)
+                    for queue in pool._queues:
+                        queue.put.assert_not_called()
+                for queue in pool._queues:
+                    queue.put.assert_called_once()
+                    self.assertEqual('batch', queue.put.call_args[0][0][0])
+            self.assertTrue(pool.get_sync(pool.sync(), timeout=30))
+            for dpid in dpids:
+                self.assertTrue(Path(rrd.get_rrd((dpid, 2))).exists())
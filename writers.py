@@ -0,0 +1,230 @@
+"""Write RRD files in worker processes, each owning a partition of dpids.
+
+The rrdtool calls then run outside the controller process and ingest scales
+across CPU cores. All files of a dpid are written by the same worker, so
+updates of a file are never concurrent nor reordered.
+"""
+import multiprocessing
+import time
+import zlib
+from contextlib import contextmanager
+from queue import Empty
+from threading import Lock, local
+
+from kytos.core import log
+
+from napps.kytos.of_stats import settings
+from napps.kytos.of_stats.stats import RRD
+
+#: Settings used to create and update RRD files, passed to the workers
+WORKER_SETTINGS = ('DIR', 'STATS_INTERVAL', 'TIMEOUT', 'MIN', 'MAX', 'XFF',
+                   'RETENTION_PROFILE', 'RETENTION_PROFILES',
+                   'CONSOLIDATIONS')
+
+
+class WriterPool:
+    """Worker processes that receive RRD updates through queues."""
+
+    def __init__(self, n_workers, folder=None):
+        """Configure, but don't start, the workers.
+
+        Args:
+            n_workers (int): Number of processes.
+            folder (Path): Folder for RRD files. Defaults to
+                :data:`settings.DIR`.
+        """
+        self._n_workers = n_workers
+        self._folder = folder or settings.DIR
+        # Forking the multi-threaded controller could copy locks held by
+        # other threads, so workers start from a fresh interpreter
+        self._context = multiprocessing.get_context('spawn')
+        self._queues = []
+        self._workers = []
+        #: Confirmations of :meth:`sync` from the workers
+        self._acks = None
+        #: key is a sync token, value is [workers yet to confirm, whether
+        #: all updates were written]
+        self._syncs = {}
+        self._token = 0
+        self._lock = Lock()
+        #: ``batches`` attribute is a dict of messages to send by worker
+        #: while the thread is in a :meth:`batch` block
+        self._local = local()
+
+    def start(self):
+        """Start the worker processes."""
+        self._acks = self._context.Queue()
+        config = {name: getattr(settings, name) for name in WORKER_SETTINGS}
+        config['DIR'] = self._folder
+        for _ in range(self._n_workers):
+            queue = self._context.Queue()
+            worker = self._context.Process(target=_write_loop,
+                                           args=(queue, self._acks, config),
+                                           daemon=True)
+            worker.start()
+            self._queues.append(queue)
+            self._workers.append(worker)
+        log.info('Started %d RRD writer processes.', self._n_workers)
+
+    def get_worker(self, dpid):
+        """Return the index of the worker that owns *dpid*."""
+        return zlib.crc32(str(dpid).encode()) % self._n_workers
+
+    def submit(self, rrd, index, tstamp=None, **ds_values):
+        """Send an update to the worker that owns the dpid of *index*.
+
+        Args:
+            rrd (RRD): RRD object that would write the update.
+            index (list of str): RRD index. The first element is the dpid.
+            tstamp (int): Unix timestamp in seconds. Defaults to now.
+            ds_values: Value of each data source.
+        """
+        if tstamp is None:
+            # Workers may write it later
+            tstamp = int(time.time())
+        rrd.expect_update(index, tstamp)
+        self._put(index, (rrd.app, tuple(rrd.data_sources), rrd.timeout,
+                          tuple(index), tstamp, ds_values))
+
+    def submit_many(self, rrd, index, rows):
+        """Send several rows of an index to be written at once.
+
+        Args:
+            rrd (RRD): RRD object that would write the rows.
+            index (list of str): RRD index. The first element is the dpid.
+            rows (list): (timestamp, dict of data source values) tuples as in
+                :meth:`.RRD.update_many`.
+        """
+        rows = list(rows)
+        if rows:
+            rrd.expect_update(index, max(row[0] for row in rows))
+        self._put(index, (rrd.app, tuple(rrd.data_sources), rrd.timeout,
+                          tuple(index), None, rows))
+
+    @contextmanager
+    def batch(self):
+        """Send the updates this thread submits in the block at its end.
+
+        Each worker gets a single message with all of its updates instead of
+        one message per update, e.g. for all the ports of a stats reply.
+        Nested blocks are part of the outermost one.
+        """
+        if getattr(self._local, 'batches', None) is not None:
+            yield
+            return
+        self._local.batches = batches = {}
+        try:
+            yield
+        finally:
+            self._local.batches = None
+            for worker, items in batches.items():
+                self._queues[worker].put(('batch', items))
+
+    def _put(self, index, item):
+        """Send or, in a :meth:`batch` block, keep an update message."""
+        worker = self.get_worker(index[0])
+        batches = getattr(self._local, 'batches', None)
+        if batches is None:
+            self._queues[worker].put(('update', item))
+        else:
+            batches.setdefault(worker, []).append(item)
+
+    def sync(self):
+        """Ask the workers to confirm the updates submitted so far.
+
+        Returns:
+            int: Token for :meth:`get_sync`.
+        """
+        with self._lock:
+            self._token += 1
+            token = self._token
+            self._syncs[token] = [len(self._queues), True]
+            for queue in self._queues:
+                queue.put(('sync', token))
+        return token
+
+    def get_sync(self, token, timeout=0):
+        """Return whether the updates submitted before a sync were written.
+
+        Args:
+            token (int): Returned by :meth:`sync`.
+            timeout (float): Seconds to wait for the confirmations.
+
+        Returns:
+            bool: True if all workers wrote them without errors, False if
+            some write failed and None if not confirmed by all workers yet.
+        """
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            while self._syncs[token][0] > 0:
+                try:
+                    ack, written = self._acks.get(
+                        True, max(0, deadline - time.monotonic()))
+                except Empty:
+                    return None
+                self._syncs[ack][0] -= 1
+                self._syncs[ack][1] &= written
+            return self._syncs.pop(token)[1]
+
+    def stop(self):
+        """Write all pending updates and stop the workers."""
+        for queue in self._queues:
+            queue.put(None)
+        for worker in self._workers:
+            worker.join()
+        for queue in self._queues + [self._acks]:
+            queue.close()
+        self._queues.clear()
+        self._workers.clear()
+        log.info('RRD writer processes stopped.')
+
+
+def _write_loop(queue, acks, config):
+    """Write updates received from *queue* until ``None`` is received.
+
+    A sync message is confirmed in *acks* with whether all updates since the
+    previous one were written without errors.
+
+    Args:
+        queue (Queue): Update, batch and sync messages.
+        acks (Queue): Sync confirmations.
+        config (dict): Values of :data:`WORKER_SETTINGS` in the controller.
+    """
+    for name, value in config.items():
+        setattr(settings, name, value)
+
+    rrds = {}
+    written = True
+    for kind, item in iter(queue.get, None):
+        if kind == 'sync':
+            acks.put((item, written))
+            written = True
+            continue
+        for update in item if kind == 'batch' else [item]:
+            written &= _write(rrds, update)
+
+
+def _write(rrds, update):
+    """Write an update message and return whether it had no errors.
+
+    Args:
+        rrds (dict): RRD objects by app, data sources and timeout, created as
+            needed.
+        update (tuple): Message of :meth:`WriterPool.submit` or
+            :meth:`WriterPool.submit_many`.
+    """
+    app, data_sources, timeout, index, tstamp, ds_values = update
+    key = (app, data_sources, timeout)
+    rrd = rrds.get(key)
+    if rrd is None:
+        rrd = rrds[key] = RRD(app, data_sources, timeout)
+    try:
+        if tstamp is None:
+            # Rows from submit_many
+            rrd.update_many(index, ds_values)
+        else:
+            rrd.update(index, tstamp, **ds_values)
+    except Exception:  # pylint: disable=broad-except
+        log.exception('Error writing %s for index %s.', app, index)
+        return False
+    return True